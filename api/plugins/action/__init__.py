@@ -4,7 +4,7 @@ import re
 
 from ..module_utils.argspec import auth_argument_spec, generate_argspec_from_mutation
 from ..module_utils.display import Display
-from ..module_utils.gql import GetClientInstance, ProxyLookup, input_args_to_field_list
+from ..module_utils.gql import GetClientInstance, ProxyLookup, client_options, input_args_to_field_list
 from ..module_utils.gqlEnvironment import Environment
 from ..module_utils.gqlProject import Project
 from ansible.errors import AnsibleError
@@ -35,7 +35,9 @@ class LagoonActionBase(ActionBase):
       self._templar.template(task_vars.get('lagoon_api_endpoint')).strip(),
       self._templar.template(task_vars.get('lagoon_api_token')).strip(),
       self._task.args.get('headers', {}),
-      self._task.check_mode
+      self._task.check_mode,
+      client_options(lambda name: self._templar.template(
+        task_vars.get(f"lagoon_{name}"))),
     )
 
   def sanitiseName(self, name: str) -> str:
@@ -32,18 +32,21 @@ def get_facts(client: GqlClient, environment_id):
         return dict()
 
 
+DELETE_FACT_MUTATION = """
+    mutation df(
+        $environment_id: Int!
+        $name: String!
+    ) {
+        deleteFact(input: {
+            environment: $environment_id
+            name: $name
+        })
+    }"""
+
+
 def delete_fact(client: GqlClient, environment_id, name):
     res = client.execute_query(
-        """
-        mutation df(
-            $environment_id: Int!
-            $name: String!
-        ) {
-            deleteFact(input: {
-                environment: $environment_id
-                name: $name
-            })
-        }""",
+        DELETE_FACT_MUTATION,
         {
             "environment_id": environment_id,
             "name": name
@@ -56,7 +59,31 @@ def delete_fact(client: GqlClient, environment_id, name):
         return False
 
 
-def add_fact(client: GqlClient, environment_id, name, category, value, source="ansible", type="TEXT", description="Provided by Lagoon Ansible collection") -> dict:
+ADD_FACT_MUTATION = """
+    mutation addFact(
+        $environment_id: Int!
+        $name: String!
+        $category: String!
+        $value: String!
+        $source: String!
+        $type: FactType!
+        $description: String!
+    ) {
+        addFact(input: {
+            environment: $environment_id
+            name: $name
+            category: $category
+            value: $value
+            source: $source
+            type: $type
+            description: $description
+        }) {
+            id
+        }
+    }"""
+
+
+def add_fact_variables(environment_id, name, category, value, source="ansible", type="TEXT", description="Provided by Lagoon Ansible collection") -> dict:
 
     if type is None:
         type = "TEXT"
@@ -71,43 +98,35 @@ def add_fact(client: GqlClient, environment_id, name, category, value, source="a
     if type == "TEXT" and not isinstance(value, str):
         value = f"{value}"
 
+    return {
+        "environment_id": environment_id,
+        "name": name,
+        "category": category,
+        "value": value,
+        "source": source,
+        "type": type,
+        "description": description
+    }
+
+
+def add_fact(client: GqlClient, environment_id, name, category, value, source="ansible", type="TEXT", description="Provided by Lagoon Ansible collection") -> dict:
     res = client.execute_query(
-        """
-        mutation addFact(
-            $environment_id: Int!
-            $name: String!
-            $category: String!
-            $value: String!
-            $source: String!
-            $type: FactType!
-            $description: String!
-        ) {
-            addFact(input: {
-                environment: $environment_id
-                name: $name
-                category: $category
-                value: $value
-                source: $source
-                type: $type
-                description: $description
-            }) {
-                id
-            }
-        }""",
-        {
-            "environment_id": environment_id,
-            "name": name,
-            "category": category,
-            "value": value,
-            "source": source,
-            "type": type,
-            "description": description
-        }
+        ADD_FACT_MUTATION,
+        add_fact_variables(environment_id, name, category, value, source, type, description)
     )
 
     return res["addFact"]
 
 
+def replace_fact(client: GqlClient, environment_id, name, category, value, source="ansible", type="TEXT", description="Provided by Lagoon Ansible collection") -> dict:
+    # The add depends on the delete, so they are not batched: the server
+    # would still run a merged addFact after deleteFact failed.
+    if not delete_fact(client, environment_id, name):
+        raise AnsibleError(f"Unable to delete fact {name} before replacing it")
+
+    return add_fact(client, environment_id, name, category, value, source, type, description)
+
+
 class ActionModule(LagoonActionBase):
 
     def run(self, tmp=None, task_vars=None):
@@ -151,8 +170,7 @@ class ActionModule(LagoonActionBase):
         elif found_fact:
             if value != found_fact["value"]:
                 result["changed"] = True
-                delete_fact(self.client, environment_id, name)
-                result["result"] = add_fact(
+                result["result"] = replace_fact(
                     self.client, environment_id, name, category, value, source, type, description)
             else:
                 result["changed"] = False
@@ -74,7 +74,7 @@ class ActionModule(LagoonActionBase):
             result['notFound'] = True
             return result
 
-        lagoonEnvironment.withCluster().withProject()
+        lagoonEnvironment.withSubresources({'cluster': None, 'project': None})
         if len(lagoonEnvironment.errors):
             self._display.warning(
                 f"The query partially succeeded, but the following errors were encountered:\n{ lagoonEnvironment.errors }")
@@ -1,4 +1,5 @@
 from . import LagoonActionBase
+from ..module_utils.collection import plain
 from ..module_utils.gqlEnvironment import Environment
 from ..module_utils.gqlProject import Project
 from ..module_utils.gqlResourceBase import DEFAULT_BATCH_SIZE
@@ -34,6 +35,8 @@ class ActionModule(LagoonActionBase):
         resource = self._task.args.get('resource')
         batch_size = self._task.args.get('batch_size', DEFAULT_BATCH_SIZE)
         environment = self._task.args.get('environment')
+        # Hold the records in a compact form until they are returned.
+        options = {'compactRecords': bool(self._task.args.get('compact', False))}
 
         if resource not in SUPPORTED_RESOURCES:
             result['failed'] = True
@@ -43,9 +46,9 @@ class ActionModule(LagoonActionBase):
             return result
 
         if resource == "project":
-            self.fetch_projects(result, batch_size)
+            self.fetch_projects(result, batch_size, options)
         elif resource == "environment":
-            self.fetch_environments(result, batch_size)
+            self.fetch_environments(result, batch_size, options)
         elif resource == "task_definition":
             self.fetch_task_definitions(result)
         elif resource == "task":
@@ -55,8 +58,8 @@ class ActionModule(LagoonActionBase):
 
         return result
 
-    def fetch_projects(self, result: dict, batch_size: int):
-        lagoonProject = Project(self.client).all()
+    def fetch_projects(self, result: dict, batch_size: int, options: dict = {}):
+        lagoonProject = Project(self.client, {**options}).all()
         if not len(lagoonProject.projects):
             raise AnsibleError(f"Unable to get projects.")
 
@@ -65,20 +68,20 @@ class ActionModule(LagoonActionBase):
             self._display.warning(
                 f"The query partially succeeded, but the following errors were encountered:\n{ lagoonProject.errors }")
 
-        result['result'] = lagoonProject.projects
+        result['result'] = plain(lagoonProject.projects)
 
-    def fetch_environments(self, result: dict, batch_size: int):
-        lagoonEnvironment = Environment(self.client).all(batch_size=batch_size)
+    def fetch_environments(self, result: dict, batch_size: int, options: dict = {}):
+        lagoonEnvironment = Environment(self.client, {**options}).all(batch_size=batch_size)
         if not len(lagoonEnvironment.environments):
             raise AnsibleError(f"Unable to get environments.")
 
-        lagoonEnvironment.withCluster(
-            batch_size=batch_size).withProject(batch_size=batch_size)
+        lagoonEnvironment.withSubresources(
+            {'cluster': None, 'project': None}, batch_size)
         if len(lagoonEnvironment.errors):
             self._display.warning(
                 f"The query partially succeeded, but the following errors were encountered:\n{ lagoonEnvironment.errors }")
 
-        result['result'] = lagoonEnvironment.environments
+        result['result'] = plain(lagoonEnvironment.environments)
 
     def fetch_task_definitions(self, result: dict):
         result['result'] = TaskDefinition(self.client).get_definitions()
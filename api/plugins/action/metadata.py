@@ -46,28 +46,26 @@ class ActionModule(LagoonActionBase):
             return required
 
         if state == 'present':
+            # The changes are made concurrently, up to the client's concurrency.
+            updates = {}
             if isinstance(data, list):
                 for item in data:
                     if not isinstance(item, dict) or 'key' not in item or 'value' not in item:
                         result['invalid'].append(item)
                         continue
-                    key, value = item['key'], item['value']
-                    if is_change_required(key, value):
-                        try:
-                            update_result = lagoonMetadata.update(project_id, key, value)
-                            result['result'].append({key: value})
-                            result['changed'] = True
-                        except Exception as e:
-                            result['invalid'].append(key)
+                    if is_change_required(item['key'], item['value']):
+                        updates[item['key']] = item['value']
             else:  # if data is a dict
                 for key, value in data.items():
                     if is_change_required(key, value):
-                        try:
-                            update_result = lagoonMetadata.update(project_id, key, value)
-                            result['result'].append({key: value})
-                            result['changed'] = True
-                        except Exception as e:
-                            result['invalid'].append(key)
+                        updates[key] = value
+
+            for key, update_result in lagoonMetadata.updateMany(project_id, updates).items():
+                if isinstance(update_result, Exception):
+                    result['invalid'].append(key)
+                    continue
+                result['result'].append({key: updates[key]})
+                result['changed'] = True
 
         elif state == 'absent':
             # handle both list and dictionaries
@@ -81,15 +79,13 @@ class ActionModule(LagoonActionBase):
             else:
                 keys_to_remove = list(data.keys())
 
-
-            for key in keys_to_remove:
-                if key in current_metadata:
-                    try:
-                        remove_result = lagoonMetadata.remove(project_id, key)
-                        result['result'].append({key: 'removed'})
-                        result['changed'] = True
-                    except Exception as e:
-                        result['invalid'].append(key)
+            keys_to_remove = [key for key in keys_to_remove if key in current_metadata]
+            for key, remove_result in lagoonMetadata.removeMany(project_id, keys_to_remove).items():
+                if isinstance(remove_result, Exception):
+                    result['invalid'].append(key)
+                    continue
+                result['result'].append({key: 'removed'})
+                result['changed'] = True
 
         if result['invalid']:
             result['failed'] = True
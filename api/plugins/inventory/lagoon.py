@@ -1,22 +1,60 @@
 import ast
 import json
 import re
+import threading
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor, wait
 from ansible.errors import AnsibleError, AnsibleParserError
 from ansible.inventory.data import InventoryData
 from ansible.module_utils._text import to_native
 from ansible.plugins.inventory import BaseInventoryPlugin, Cacheable, Constructable
 from ansible.utils import py3compat
 from ..module_utils import token as LagoonToken
-from ..module_utils.gql import GqlClient
+from ..module_utils.collection import ResourceCollection, plain
+from ..module_utils.gql import GqlClient, client_options
 from ..module_utils.gqlEnvironment import Environment
+from ..module_utils.gqlKubernetes import Kubernetes
 from ..module_utils.gqlProject import Project
+from ..module_utils.gqlResourceBase import CLUSTER_FIELDS, PROJECT_FIELDS
+from ..module_utils.inventory_cache import InventoryCache
+from ..module_utils.inventory_snapshot import InventorySnapshot
+from gql.transport.exceptions import TransportQueryError
 from typing import Any, Optional, Union
 
+# Environment fields selected by the inventory by default.
+INVENTORY_ENVIRONMENT_FIELDS = [
+    'id',
+    'name',
+    'kubernetesNamespaceName',
+    'environmentType',
+    'route',
+    'routes',
+]
+
+# Fields always selected, whatever the configured fields, since the
+# inventory is built from them.
+REQUIRED_PROJECT_FIELDS = ['id', 'name']
+REQUIRED_ENVIRONMENT_FIELDS = ['id', 'kubernetesNamespaceName']
+
+# The timestamps are also required to find the changes in incremental mode.
+INCREMENTAL_ENVIRONMENT_FIELDS = ['created', 'updated']
+
+# Number of clusters fetched at once with the clusters fetch strategy.
+DEFAULT_SHARD_CONCURRENCY = 4
+
 
 DOCUMENTATION = """
     name: lagoon
     short_description: Builds an inventory of Lagoon projects and environments.
-    description: Builds an inventory of Lagoon projects and environments.
+    description:
+    - Builds an inventory of Lagoon projects and environments.
+    - Related resources (environments, groups and variables for projects,
+      then project, cluster and variables for environments) are fetched
+      together in batches, the smallest of the relevant api_batch_* sizes
+      being used. Batches failing because they are too large for the API
+      (timeouts, 413/5xx responses or query complexity errors) are retried
+      with each related resource queried separately, then split in two as
+      needed; the reduced sizes are kept for the rest of the run.
     plugin_type: inventory
     extends_documentation_fragment:
         - constructed
@@ -105,6 +143,130 @@ DOCUMENTATION = """
                 aliases: [ api_batch_environment_variables_size ]
                 env:
                 - name: LAGOON_API_BATCH_ENVIRONMENT_VARIABLES_SIZE
+            api_schema_file:
+                description:
+                - Path to a GraphQL schema SDL file to use instead of fetching
+                  the schema from the API through introspection.
+                type: path
+                env:
+                - name: LAGOON_API_SCHEMA_FILE
+            api_schema_cache_ttl:
+                description:
+                - Cache the API's GraphQL schema on disk for this many seconds,
+                  avoiding the introspection query on every inventory parse.
+                  A negative value caches the schema until it is refreshed.
+                - The cache is disabled when set to 0.
+                type: int
+                default: 0
+                env:
+                - name: LAGOON_API_SCHEMA_CACHE_TTL
+            api_schema_cache_dir:
+                description:
+                - Directory in which the GraphQL schema cache is stored.
+                type: path
+                default: ~/.ansible/cache/lagoon_schema
+                env:
+                - name: LAGOON_API_SCHEMA_CACHE_DIR
+            api_schema_cache_refresh:
+                description:
+                - Discard the cached GraphQL schema and fetch it again.
+                type: bool
+                default: false
+                env:
+                - name: LAGOON_API_SCHEMA_CACHE_REFRESH
+            api_concurrency:
+                description:
+                - Number of batches fetched concurrently when retrieving the
+                  projects' and environments' related resources.
+                type: int
+                default: 1
+                env:
+                - name: LAGOON_API_CONCURRENCY
+            api_batch_target_latency:
+                description:
+                - Target duration, in seconds, of each batched request. When
+                  set, the batch sizes adapt to the API's response times; they
+                  grow while the requests are faster than the target and are
+                  halved when slower, the api_batch_* sizes only being used
+                  as the initial sizes.
+                type: float
+                env:
+                - name: LAGOON_API_BATCH_TARGET_LATENCY
+            api_streaming:
+                description:
+                - Parse the responses listing all the projects or
+                  environments as they are received, processing each record
+                  as soon as it is complete, instead of once the whole
+                  response is loaded. This lowers the peak memory and the
+                  time to the first results on large fleets. Not used
+                  through the API broker.
+                type: bool
+                default: false
+                env:
+                - name: LAGOON_API_STREAMING
+            api_pool_size:
+                description:
+                - Number of connections to the API kept alive, in the HTTP
+                  session shared by the clients of the process. Defaults to
+                  10, or api_concurrency if larger.
+                type: int
+                env:
+                - name: LAGOON_API_POOL_SIZE
+            api_async:
+                description:
+                - Execute the API requests with an asyncio engine (aiohttp) on
+                  a background event loop, over a single connection pool.
+                  Only the operations executed together (e.g, the keys of the
+                  metadata module) are then in flight at once on the loop; the
+                  batches of the inventory's related resources are still
+                  fetched by api_concurrency threads, through the engine, so
+                  this does not make them faster. Requires the aiohttp
+                  package.
+                type: bool
+                env:
+                - name: LAGOON_API_ASYNC
+            api_operation_batching:
+                description:
+                - Send the operations queued together (e.g, the metadata keys
+                  set at once) in a single request, as a JSON array, or merged
+                  into a single operation if the server does not support
+                  arrays.
+                type: bool
+                env:
+                - name: LAGOON_API_OPERATION_BATCHING
+            api_operation_batch_window:
+                description:
+                - Number of seconds after which the queued operations are sent,
+                  unless their results are needed before. Defaults to 0, sent
+                  when needed only.
+                type: float
+                env:
+                - name: LAGOON_API_OPERATION_BATCH_WINDOW
+            api_persisted_queries:
+                description:
+                - Send the queries as automatic persisted queries, by hash
+                  first and with their full text only when unknown to the
+                  server. The batched queries are then parameterized, so that
+                  their text does not depend on the names in the batch.
+                type: bool
+                env:
+                - name: LAGOON_API_PERSISTED_QUERIES
+            api_compression:
+                description:
+                - Whether to accept compressed responses (gzip and deflate, as
+                  well as brotli and zstd if their packages are installed),
+                  and to gzip large request bodies. Compressed responses are
+                  accepted when not set.
+                type: bool
+                env:
+                - name: LAGOON_API_COMPRESSION
+            api_compression_min_size:
+                description:
+                - Size, in bytes, from which the request bodies are compressed
+                  when api_compression is enabled. Defaults to 16384.
+                type: int
+                env:
+                - name: LAGOON_API_COMPRESSION_MIN_SIZE
             headers:
               description: HTTP request headers
               type: dictionary
@@ -116,6 +278,199 @@ DOCUMENTATION = """
                 aliases: [ lagoon_filter_groups, lagoon_groups ]
                 env:
                 - name: LAGOON_FILTER_GROUPS
+            filter_metadata:
+                description:
+                - Only include the projects with all this metadata, using
+                  the projectsByMetadata query; a null value matches any
+                  value. Combined with filter_groups, the projects must be
+                  in the groups and have the metadata. The environment
+                  variable takes a JSON object.
+                type: dict
+                default: {}
+                aliases: [ lagoon_filter_metadata ]
+                env:
+                - name: LAGOON_FILTER_METADATA
+            filter_environment_type:
+                description:
+                - Only include the environments of this type. The filter is
+                  part of the queries listing the environments, so the other
+                  environments are never fetched nor enriched.
+                type: str
+                choices: [ production, development ]
+                aliases: [ lagoon_filter_environment_type ]
+                env:
+                - name: LAGOON_FILTER_ENVIRONMENT_TYPE
+            fetch_strategy:
+                description:
+                - How the environments are fetched. C(projects) fetches
+                  them through the projects, in batches of aliased queries.
+                  C(clusters) lists the clusters, then fetches and enriches
+                  the environments of each cluster as a separate shard;
+                  shard_concurrency shards are fetched in parallel.
+                type: str
+                default: projects
+                choices: [ projects, clusters ]
+                aliases: [ lagoon_fetch_strategy ]
+                env:
+                - name: LAGOON_FETCH_STRATEGY
+            shard_concurrency:
+                description:
+                - Number of cluster shards fetched in parallel with the
+                  clusters fetch strategy, independently of api_concurrency
+                  (each shard's environments are enriched one batch at a
+                  time).
+                type: int
+                default: 4
+                aliases: [ lagoon_shard_concurrency ]
+                env:
+                - name: LAGOON_SHARD_CONCURRENCY
+            filter_clusters:
+                description:
+                - List of cluster names to build the inventory for, only
+                  the projects with environments in these clusters being
+                  included. Requires the clusters fetch strategy.
+                type: list
+                default: []
+                aliases: [ lagoon_filter_clusters ]
+                env:
+                - name: LAGOON_FILTER_CLUSTERS
+      concurrent_lagoons:
+          description:
+          - Number of Lagoons from the lagoons list fetched concurrently,
+            each with its own API client. The inventory is the same as when
+            fetching them one after another; when some Lagoons fail, the
+            others are still fetched before the error is raised.
+          type: int
+          default: 4
+          env:
+          - name: LAGOON_INVENTORY_CONCURRENT_LAGOONS
+      group_by:
+          description:
+          - Groups built directly from the fetched data, without the Jinja
+            templating of the groups and keyed_groups options, which is slow
+            on large inventories. project adds the hosts to
+            project_<project name>, environment_type to
+            environment_type_<type>, cluster to cluster_<cluster name> and
+            lagoon_group to lagoon_group_<group name>, the names' special
+            characters being replaced by underscores.
+          - groups and keyed_groups still apply, e.g. for custom groups.
+          type: list
+          elements: str
+          choices: [ project, environment_type, cluster, lagoon_group ]
+          default: []
+          env:
+          - name: LAGOON_INVENTORY_GROUP_BY
+      project_fields:
+          description:
+          - The project fields to select, all the top-level fields by
+            default. id and name are always selected.
+          type: list
+          elements: str
+          default: []
+          env:
+          - name: LAGOON_INVENTORY_PROJECT_FIELDS
+      environment_fields:
+          description:
+          - The environment fields to select; id and kubernetesNamespaceName
+            are always selected.
+          type: list
+          elements: str
+          default: [ id, name, kubernetesNamespaceName, environmentType, route, routes ]
+          env:
+          - name: LAGOON_INVENTORY_ENVIRONMENT_FIELDS
+      project_subresources:
+          description:
+          - The subresources fetched for the projects. The hostvars built
+            from a subresource which is not fetched (lagoon_groups and
+            project_variables) are not set.
+          type: list
+          elements: str
+          choices: [ groups, variables ]
+          default: [ groups, variables ]
+          env:
+          - name: LAGOON_INVENTORY_PROJECT_SUBRESOURCES
+      environment_subresources:
+          description:
+          - The subresources fetched for the environments. The hostvars
+            built from a subresource which is not fetched (cluster_id,
+            cluster_name and environment_variables) are not set, except for
+            the clusters with the clusters fetch strategy, which come for
+            free.
+          type: list
+          elements: str
+          choices: [ cluster, variables ]
+          default: [ cluster, variables ]
+          env:
+          - name: LAGOON_INVENTORY_ENVIRONMENT_SUBRESOURCES
+      cache_format:
+          description:
+          - The format of the inventory cache. C(ansible) stores the fetched
+            objects through the configured cache plugin, as a single
+            document. C(indexed) stores them in a compressed file, in
+            cache_connection (default ~/.ansible/cache/lagoon_inventory),
+            indexed by project, so that loading only decompresses the
+            projects passing the filter options; the cache is also reused
+            when these filters become narrower. Both honour cache and
+            cache_timeout.
+          type: str
+          default: ansible
+          choices: [ ansible, indexed ]
+          env:
+          - name: LAGOON_INVENTORY_CACHE_FORMAT
+      compact_hostvars:
+          description:
+          - Set the variables shared by the environments of a project
+            (project_id, project_name, git_url, project_variables,
+            lagoon_groups, lagoon_project and metadata) once, on a
+            lagoon_project_<name> group containing its environments, rather
+            than on every host. The values seen by plays are unchanged, but
+            they are built and stored once per project, which reduces the
+            memory used by large inventories.
+          type: bool
+          default: false
+          env:
+          - name: LAGOON_INVENTORY_COMPACT_HOSTVARS
+      compact_records:
+          description:
+          - Hold the projects and environments fetched from Lagoon as
+            compact records (tuples of values sharing their keys) rather
+            than dicts, while fetching and in the inventory cache. They are
+            converted back to dicts for the hostvars, so plays see no
+            difference; this reduces the memory used while building large
+            inventories.
+          type: bool
+          default: false
+          env:
+          - name: LAGOON_INVENTORY_COMPACT_RECORDS
+      incremental:
+          description:
+          - Only fetch what changed since the previous refresh. The objects
+            fetched are stored in a snapshot, independent of the inventory
+            cache; on the next refresh, the projects with new, updated or
+            deleted environments are fetched again while the others are
+            taken from the snapshot.
+          - Changes to the variables or groups of a project do not update
+            its environments, so these are only picked up by the full
+            refreshes forced by incremental_max_age.
+          type: bool
+          default: false
+          env:
+          - name: LAGOON_INVENTORY_INCREMENTAL
+      incremental_cache_dir:
+          description:
+          - Directory in which the incremental snapshots are stored.
+          type: path
+          default: ~/.ansible/cache/lagoon_inventory
+          env:
+          - name: LAGOON_INVENTORY_INCREMENTAL_CACHE_DIR
+      incremental_max_age:
+          description:
+          - Fetch everything again when the snapshot is older than this many
+            seconds. Set to 0 to always refresh incrementally.
+          type: int
+          default: 86400
+          env:
+          - name: LAGOON_INVENTORY_INCREMENTAL_MAX_AGE
     requirements:
     - "python >= 3"
     - "PyYAML >= 3.11"
@@ -150,6 +505,11 @@ leading_separator: false
 keyed_groups:
   - key: lagoon_groups|map(attribute='name')
   - key: project_name
+# Faster than the equivalent keyed_groups.
+group_by:
+  - cluster
+incremental: true
+incremental_max_age: 86400
 cache: true
 cache_plugin: ansible.builtin.jsonfile
 cache_timeout: 7200
@@ -161,6 +521,24 @@ cache_prefix: lagoon
 class InventoryModule(BaseInventoryPlugin, Constructable, Cacheable):
     NAME = 'lagoon.api.lagoon'
 
+    def __init__(self):
+        super(InventoryModule, self).__init__()
+        # The Lagoons are fetched concurrently, each in its own thread.
+        self._fetching = threading.local()
+        self._token_lock = threading.Lock()
+
+    @property
+    def lagoon_api(self) -> GqlClient:
+        """
+        The client of the Lagoon fetched by the current thread.
+        """
+
+        return getattr(self._fetching, 'lagoon_api', None)
+
+    @lagoon_api.setter
+    def lagoon_api(self, client: GqlClient):
+        self._fetching.lagoon_api = client
+
     def parse(self, inventory: InventoryData, loader, path, cache=True):
         super(InventoryModule, self).parse(inventory, loader, path, cache)
 
@@ -178,22 +556,35 @@ class InventoryModule(BaseInventoryPlugin, Constructable, Cacheable):
 
         self.all_objects = []
 
+        lagoons = self.get_option('lagoons')
+        indexed_cache = None
+        if self.get_option('cache_format') == 'indexed':
+            indexed_cache = self.indexed_cache(cache_key)
+
         # attempt to read the cache if inventory isn't being refreshed and the user has caching enabled
-        if attempt_to_read_cache:
+        if attempt_to_read_cache and indexed_cache:
+            self.all_objects = indexed_cache.load(
+                self.cache_filters(lagoons), self.get_option('cache_timeout'))
+            if self.all_objects is None:
+                self.all_objects = []
+                cache_needs_update = True
+            else:
+                self.display.v(f"Loaded {indexed_cache.loaded} of {indexed_cache.total} projects from the inventory cache ({indexed_cache.size} bytes) in {indexed_cache.loadTime * 1000:.1f} ms")
+        elif attempt_to_read_cache:
             try:
                 self.all_objects = self._cache[cache_key]
             except KeyError:
                 # This occurs if the cache_key is not in the cache or if the cache_key expired, so the cache needs to be updated
                 cache_needs_update = True
 
-        lagoons = self.get_option('lagoons')
-
         if not attempt_to_read_cache or cache_needs_update:
             # Fetch and process projects from Lagoon.
             self.fetch_objects(lagoons)
 
-        if cache_needs_update:
-            self._cache[cache_key] = self.all_objects
+        if cache_needs_update and indexed_cache:
+            indexed_cache.save(self.all_objects, self.cache_filters(lagoons))
+        elif cache_needs_update:
+            self._cache[cache_key] = plain(self.all_objects)
 
         strict = self.get_option('strict')
         self.populate()
@@ -201,6 +592,9 @@ class InventoryModule(BaseInventoryPlugin, Constructable, Cacheable):
         try:
             for host in inventory.hosts:
                 hostvars = inventory.hosts[host].get_vars()
+                if host in self.project_hostvars:
+                    # Compact hostvars: include the project group's variables.
+                    hostvars = {**self.project_hostvars[host], **hostvars}
                 # Create composed groups.
                 self._add_host_to_composed_groups(self.get_option(
                     'groups'), hostvars, host, strict=strict)
@@ -211,6 +605,31 @@ class InventoryModule(BaseInventoryPlugin, Constructable, Cacheable):
             raise AnsibleParserError("failed to parse %s: %s " % (
                 to_native(path), to_native(e)), orig_exc=e)
 
+    def indexed_cache(self, cache_key: str) -> InventoryCache:
+        """
+        The indexed inventory cache, keyed by the inventory cache key and
+        the fields and subresources fetched.
+        """
+
+        return InventoryCache(
+            [cache_key, self.project_fields(), self.environment_fields(),
+             self.get_option('project_subresources'),
+             self.get_option('environment_subresources')],
+            self.get_option('cache_connection'))
+
+    def cache_filters(self, lagoons) -> list:
+        """
+        The filters of each Lagoon, stored in the indexed cache.
+        """
+
+        return [{
+            'endpoint': self.get_var(lagoon, 'api_endpoint'),
+            'groups': self.groups_filter(lagoon),
+            'metadata': self.metadata_filter(lagoon),
+            'environment_type': self.environment_type_filter(lagoon),
+            'clusters': self.clusters_filter(lagoon),
+        } for lagoon in lagoons or []]
+
     def fetch_objects(self, lagoons):
 
         if lagoons:
@@ -226,130 +645,476 @@ class InventoryModule(BaseInventoryPlugin, Constructable, Cacheable):
                         "Expecting lagoon to be a dictionary."
                     )
 
-                if 'transport' not in lagoon:
-                    lagoon['transport'] = 'ssh'
-                elif lagoon['transport'] != 'ssh':
-                    # @TODO kubectl support.
-                    raise AnsibleError(
-                        "Only ssh transport is supported."
-                    )
+            # Each Lagoon is fetched with its own client; a failure does not
+            # interrupt the others, and the objects are kept in the order
+            # of the configuration.
+            concurrency = max(intWhenStr(self.get_option('concurrent_lagoons')) or 1, 1)
+            with ThreadPoolExecutor(max_workers=min(concurrency, len(lagoons))) as executor:
+                futures = [executor.submit(self.fetch_lagoon, lagoon) for lagoon in lagoons]
+                wait(futures)
 
-                # Set default connections details to public Lagoon.
-                lagoon['ssh_host'] = self.get_var(lagoon, 'ssh_host', 'ssh.lagoon.amazeeio.cloud')
-                lagoon['ssh_port'] = self.get_var(lagoon, 'ssh_port', '32222')
+            errors = []
+            for lagoon, future in zip(lagoons, futures):
+                if future.exception() is not None:
+                    name = lagoon.get('name') or self.get_var(lagoon, 'api_endpoint')
+                    self.display.error(f"Error fetching Lagoon {name}: {future.exception()}")
+                    errors.append(future.exception())
+            if len(errors):
+                raise errors[0]
 
-                # Endpoint & token can be provided in the file directly
-                # or in --extra-vars. They could also be provided in separate
-                # places.
-                lagoon_api_endpoint = self.get_var(lagoon, 'api_endpoint')
-                lagoon_api_token = self.get_var(lagoon, 'api_token')
+            self.all_objects.extend(future.result() for future in futures)
 
-                if not lagoon_api_endpoint:
-                    raise AnsibleError(
-                        "Expecting lagoon_api_endpoint."
-                    )
+    def fetch_lagoon(self, lagoon) -> dict:
+        """
+        Fetches the objects of one Lagoon.
+        """
+
+        if 'transport' not in lagoon:
+            lagoon['transport'] = 'ssh'
+        elif lagoon['transport'] != 'ssh':
+            # @TODO kubectl support.
+            raise AnsibleError(
+                "Only ssh transport is supported."
+            )
+
+        # Set default connections details to public Lagoon.
+        lagoon['ssh_host'] = self.get_var(lagoon, 'ssh_host', 'ssh.lagoon.amazeeio.cloud')
+        lagoon['ssh_port'] = self.get_var(lagoon, 'ssh_port', '32222')
 
-                if not lagoon_api_token:
-                    # Try fetching a fresh token.
-                    lagoon_api_token = self.fetch_lagoon_api_token(lagoon)
-
-                # Batch sizes should be overridable by environment variables.
-                batch_project_environments_size = intWhenStr(self.get_var(
-                    lagoon, 'api_batch_project_environments_size', 100))
-                batch_project_groups_size = intWhenStr(self.get_var(
-                    lagoon, 'api_batch_project_groups_size', 100))
-                batch_project_variables_size = intWhenStr(self.get_var(
-                    lagoon, 'api_batch_project_variables_size', 100))
-                batch_environment_project_size = intWhenStr(self.get_var(
-                    lagoon, 'api_batch_environment_project_size', 100))
-                batch_environment_cluster_size = intWhenStr(self.get_var(
-                    lagoon, 'api_batch_environment_cluster_size', 100))
-                batch_environment_variables_size = intWhenStr(self.get_var(
-                    lagoon, 'api_batch_environment_variables_size', 100))
-
-                self.lagoon_api = GqlClient(
-                    lagoon_api_endpoint,
-                    lagoon_api_token,
-                    lagoon['headers'] if 'headers' in lagoon else {},
-                    self.display,
+        # Endpoint & token can be provided in the file directly
+        # or in --extra-vars. They could also be provided in separate
+        # places.
+        lagoon_api_endpoint = self.get_var(lagoon, 'api_endpoint')
+        lagoon_api_token = self.get_var(lagoon, 'api_token')
+
+        if not lagoon_api_endpoint:
+            raise AnsibleError(
+                "Expecting lagoon_api_endpoint."
+            )
+
+        if not lagoon_api_token:
+            # Try fetching a fresh token.
+            lagoon_api_token = self.fetch_lagoon_api_token(lagoon)
+
+        # Batch sizes should be overridable by environment variables.
+        batch_project_environments_size = intWhenStr(self.get_var(
+            lagoon, 'api_batch_project_environments_size', 100))
+        batch_project_groups_size = intWhenStr(self.get_var(
+            lagoon, 'api_batch_project_groups_size', 100))
+        batch_project_variables_size = intWhenStr(self.get_var(
+            lagoon, 'api_batch_project_variables_size', 100))
+        batch_environment_project_size = intWhenStr(self.get_var(
+            lagoon, 'api_batch_environment_project_size', 100))
+        batch_environment_cluster_size = intWhenStr(self.get_var(
+            lagoon, 'api_batch_environment_cluster_size', 100))
+        batch_environment_variables_size = intWhenStr(self.get_var(
+            lagoon, 'api_batch_environment_variables_size', 100))
+
+        lagoon_api = GqlClient(
+            lagoon_api_endpoint,
+            lagoon_api_token,
+            lagoon['headers'] if 'headers' in lagoon else {},
+            self.display,
+            options=client_options(
+                lambda name: self.get_var(lagoon, name)),
+        )
+        self.lagoon_api = lagoon_api
+        lagoonProject = Project(self.lagoon_api, self.resource_options())
+
+        lagoon_groups = self.groups_filter(lagoon)
+        lagoon_metadata = self.metadata_filter(lagoon)
+        # Validate the filter before fetching anything.
+        self.environment_type_filter(lagoon)
+
+        if lagoon_groups:
+            self.display.v(f"Fetching list of projects for these groups: [{', '.join(lagoon_groups)}]")
+            for group in lagoon_groups:
+                lagoonProject.allInGroup(group, self.project_fields())
+        elif lagoon_metadata:
+            self.display.v(f"Fetching list of projects with this metadata: {lagoon_metadata}")
+            lagoonProject.byMetadata(lagoon_metadata, self.project_fields())
+        else:
+            self.display.v("Fetching list of all projects")
+            lagoonProject.all(self.project_fields())
+
+        metadata_names = None
+        if lagoon_groups and lagoon_metadata:
+            # Only the projects in the groups which also have the metadata.
+            self.display.v(f"Fetching list of projects with this metadata: {lagoon_metadata}")
+            metadata_names = {p['name'] for p in Project(self.lagoon_api, self.resource_options()).byMetadata(
+                lagoon_metadata, ['name']).projects if p}
+
+        # Ensure unique.
+        projects = [p for p in lagoonProject.projects.unique('name')
+                    if metadata_names is None or p['name'] in metadata_names]
+
+        # The subresources are fetched together, so the batches
+        # are as small as the smallest configured size.
+        batch_sizes = {
+            'project': min(batch_project_environments_size,
+                           batch_project_groups_size,
+                           batch_project_variables_size),
+            'environment': min(batch_environment_project_size,
+                               batch_environment_cluster_size,
+                               batch_environment_variables_size),
+        }
+
+        fetch_strategy = self.get_var(lagoon, 'fetch_strategy', 'projects')
+        lagoon_clusters = self.clusters_filter(lagoon)
+        if fetch_strategy not in ['projects', 'clusters']:
+            raise AnsibleError(
+                f"Unknown fetch strategy: {fetch_strategy}."
+            )
+        if fetch_strategy != 'clusters' and lagoon_clusters:
+            raise AnsibleError(
+                "Filtering by clusters requires the clusters fetch strategy."
+            )
+
+        if fetch_strategy == 'clusters':
+            if self.get_option('incremental'):
+                raise AnsibleError(
+                    "Incremental refresh requires the projects fetch strategy."
                 )
-                lagoonProject = Project(self.lagoon_api, {'exitOnError': True})
-                lagoonEnvironment = Environment(
-                    self.lagoon_api, {'exitOnError': True})
-
-                objects = {
-                    'lagoon': lagoon,
-                    'project_list': [],
-                    'project_environments': {},
-                }
-
-                lagoon_groups = self.get_var(lagoon, 'filter_groups')
-                # Backwards-compatibility.
-                if not lagoon_groups:
-                    lagoon_groups = self.get_var(lagoon, 'groups')
-                if isinstance(lagoon_groups, str):
-                    lagoon_groups = lagoon_groups.split(",")
-
-                if lagoon_groups:
-                    self.display.v(f"Fetching list of projects for these groups: [{', '.join(lagoon_groups)}]")
-                    for group in lagoon_groups:
-                        lagoonProject.allInGroup(group)
-                else:
-                    self.display.v("Fetching list of all projects")
-                    lagoonProject.all()
-
-                project_names = []
-                # Ensure unique.
-                for project in lagoonProject.projects:
-                    if project['name'] not in project_names:
-                        objects['project_list'].append(project)
-                        project_names.append(project['name'])
-                lagoonProject.projects = objects['project_list']
-
-                lagoonProject.withEnvironments([
-                    'id',
-                    'name',
-                    'kubernetesNamespaceName',
-                    'environmentType',
-                    'route',
-                    'routes',
-                ], batch_project_environments_size).withGroups(
-                    batch_size=batch_project_groups_size
-                ).withVariables(batch_size=batch_project_variables_size)
-                if len(lagoonProject.errors):
-                    self.display.error(f"Errors while fetching project subresources: {lagoonProject.errors}")
-                    raise AnsibleError("""Encountered errors while fetching project subresources.
-                        Errors at this stage may indicate that the query is too big and the API server
-                        cannot handle the load; try adjusting the batch levels and retry.""",
-                    )
+            objects = self.fetch_cluster_objects(
+                lagoon, projects, batch_sizes, lagoon_clusters)
+        elif self.get_option('incremental'):
+            objects = self.fetch_incremental(
+                lagoon, lagoon_groups, projects, batch_sizes)
+        else:
+            objects = self.fetch_projects_objects(
+                lagoon, projects, batch_sizes)
+
+        objects['project_metadata'] = self.decode_projects_metadata(
+            objects['project_list'])
+        return objects
+
+    def groups_filter(self, lagoon) -> Optional[list]:
+        """
+        The groups the projects are filtered by, from filter_groups.
+        """
+
+        lagoon_groups = self.get_var(lagoon, 'filter_groups')
+        # Backwards-compatibility.
+        if not lagoon_groups:
+            lagoon_groups = self.get_var(lagoon, 'groups')
+        if isinstance(lagoon_groups, str):
+            lagoon_groups = lagoon_groups.split(",")
+        return lagoon_groups or None
+
+    def clusters_filter(self, lagoon) -> Optional[list]:
+        """
+        The clusters the environments are filtered by, from filter_clusters.
+        """
+
+        lagoon_clusters = self.get_var(lagoon, 'filter_clusters')
+        if isinstance(lagoon_clusters, str):
+            lagoon_clusters = lagoon_clusters.split(",")
+        return lagoon_clusters or None
+
+    def metadata_filter(self, lagoon) -> Optional[dict]:
+        """
+        The metadata the projects are filtered by, from filter_metadata.
+        """
+
+        metadata = self.get_var(lagoon, 'filter_metadata')
+        # From the environment variable.
+        if isinstance(metadata, str):
+            try:
+                metadata = json.loads(metadata)
+            except ValueError as e:
+                raise AnsibleError(f"Expecting filter_metadata to be a JSON object: {e}.")
+        if metadata and not isinstance(metadata, dict):
+            raise AnsibleError("Expecting filter_metadata to be a dictionary.")
+        return metadata or None
 
-                for p in lagoonProject.projects:
-                    for e in p['environments']:
-                        # If a project does not yet have an environment, `e`
-                        # might be None.
-                        if not e:
-                            continue
-                        lagoonEnvironment.environments.append(e)
-
-                lagoonEnvironment.withProject(
-                    ['name'], batch_environment_project_size).withCluster(
-                        batch_size=batch_environment_cluster_size
-                ).withVariables(batch_size=batch_environment_variables_size)
-
-                if len(lagoonEnvironment.errors):
-                    self.display.error(f"Errors while fetching environment subresources: {lagoonEnvironment.errors}")
-                    raise AnsibleError("""Encountered errors while fetching project subresources.
-                        Errors at this stage may indicate that the query is too big and the API server
-                        cannot handle the load; try adjusting the batch levels and retry.""",
-                                       )
-
-                for e in lagoonEnvironment.environments:
-                    pname = e['project']['name']
-                    if not pname in objects['project_environments']:
-                        objects['project_environments'][pname] = []
-                    objects['project_environments'][pname].append(e)
-
-                self.all_objects.append(objects)
+    def environment_type_filter(self, lagoon) -> Optional[str]:
+        """
+        The type the environments are filtered by, from
+        filter_environment_type.
+        """
+
+        environment_type = self.get_var(lagoon, 'filter_environment_type')
+        if not environment_type:
+            return None
+        if environment_type.lower() not in ['production', 'development']:
+            raise AnsibleError(
+                f"Unknown environment type: {environment_type}."
+            )
+        return environment_type.lower()
+
+    def resource_options(self, **options) -> dict:
+        """
+        The options of the resources fetching the inventory's objects.
+        """
+
+        return {
+            'exitOnError': True,
+            'compactRecords': self.get_option('compact_records'),
+            **options,
+        }
+
+    def project_fields(self) -> list:
+        """
+        The project fields selected, from the project_fields option.
+        """
+
+        fields = self.get_option('project_fields') or PROJECT_FIELDS
+        return list(dict.fromkeys(REQUIRED_PROJECT_FIELDS + fields))
+
+    def environment_fields(self) -> list:
+        """
+        The environment fields selected, from the environment_fields option.
+        """
+
+        fields = REQUIRED_ENVIRONMENT_FIELDS + (
+            self.get_option('environment_fields') or INVENTORY_ENVIRONMENT_FIELDS)
+        if self.get_option('incremental'):
+            fields += INCREMENTAL_ENVIRONMENT_FIELDS
+        return list(dict.fromkeys(fields))
+
+    def subresources_plan(self, option: str, exclude: list = []) -> dict:
+        """
+        The fetch plan for the subresources enabled by the option
+        (project_subresources or environment_subresources).
+        """
+
+        return {s: None for s in self.get_option(option) or [] if s not in exclude}
+
+    def fetch_projects_objects(self, lagoon, projects: list, batch_sizes: dict) -> dict:
+        """
+        Fetches the environments of the projects and the enabled
+        subresources of the projects and environments.
+        """
+
+        lagoonProject = Project(self.lagoon_api, self.resource_options(
+            environmentType=self.environment_type_filter(lagoon)))
+        lagoonEnvironment = Environment(self.lagoon_api, self.resource_options())
+
+        objects = {
+            'lagoon': lagoon,
+            'project_list': projects,
+            'project_environments': {},
+        }
+        lagoonProject.projects = projects
+
+        lagoonProject.withSubresources({
+            'environments': self.environment_fields(),
+            **self.subresources_plan('project_subresources'),
+        }, batch_sizes['project'])
+        if len(lagoonProject.errors):
+            self.display.error(f"Errors while fetching project subresources: {lagoonProject.errors}")
+            raise AnsibleError("""Encountered errors while fetching project subresources.
+                Errors at this stage may indicate that the query is too big and the API server
+                cannot handle the load, even after reducing the batch sizes.""",
+            )
+
+        for p in lagoonProject.projects:
+            for e in p['environments'] or []:
+                # If a project does not yet have an environment, `e`
+                # might be None.
+                if not e:
+                    continue
+                lagoonEnvironment.environments.append(e)
+
+        lagoonEnvironment.withSubresources({
+            'project': ['name'],
+            **self.subresources_plan('environment_subresources'),
+        }, batch_sizes['environment'])
+
+        if len(lagoonEnvironment.errors):
+            self.display.error(f"Errors while fetching environment subresources: {lagoonEnvironment.errors}")
+            raise AnsibleError("""Encountered errors while fetching project subresources.
+                Errors at this stage may indicate that the query is too big and the API server
+                cannot handle the load, even after reducing the batch sizes.""",
+                               )
+
+        objects['project_environments'] = lagoonEnvironment.environments.groupBy(
+            lambda e: (e.get('project') or {}).get('name'))
+
+        return objects
+
+    def fetch_cluster_objects(self, lagoon, projects: list, batch_sizes: dict,
+                              cluster_names: Optional[list] = None) -> dict:
+        """
+        Fetches the environments cluster by cluster, enriching each shard as
+        soon as it is fetched, then the groups and variables of the projects
+        with environments in these clusters.
+        """
+
+        lagoonKubernetes = Kubernetes(self.lagoon_api, self.resource_options())
+        self.display.v("Fetching list of all clusters")
+        clusters = {c['id']: c for c in lagoonKubernetes.all(CLUSTER_FIELDS).clusters if c}
+        if cluster_names:
+            unknown = set(cluster_names) - {c['name'] for c in clusters.values()}
+            if len(unknown):
+                raise AnsibleError(f"Unknown clusters: {', '.join(sorted(unknown))}.")
+            clusters = {id: c for id, c in clusters.items() if c['name'] in cluster_names}
+
+        project_names = {p['name'] for p in projects}
+        errors = []
+        # The shards are enriched in the threads fetching them.
+        lagoon_api = self.lagoon_api
+        # The clusters of the environments are known already.
+        plan = self.subresources_plan('environment_subresources', ['cluster'])
+
+        def enrich_shard(cluster: int, environments: list):
+            # The shards are already fetched concurrently.
+            shardEnvironment = Environment(
+                lagoon_api, self.resource_options(concurrency=1))
+            shardEnvironment.environments = [
+                e for e in environments
+                if e and e['project'] and e['project']['name'] in project_names]
+            self.display.v(f"Enriching {len(shardEnvironment.environments)} environments in cluster {clusters[cluster]['name']}")
+            for e in shardEnvironment.environments:
+                e['kubernetes'] = e['openshift'] = clusters[cluster]
+            shardEnvironment.withSubresources(plan, batch_sizes['environment'])
+            errors.extend(shardEnvironment.errors)
+            environments[:] = shardEnvironment.environments
+
+        shard_concurrency = max(intWhenStr(self.get_var(
+            lagoon, 'shard_concurrency', DEFAULT_SHARD_CONCURRENCY)) or 1, 1)
+        lagoonEnvironment = Environment(
+            self.lagoon_api, self.resource_options(concurrency=shard_concurrency))
+        lagoonEnvironment.byKubernetes(
+            list(clusters.keys()), self.environment_fields(),
+            environmentType=self.environment_type_filter(lagoon), shard=enrich_shard)
+        if len(errors):
+            self.display.error(f"Errors while fetching environment subresources: {errors}")
+            raise AnsibleError("""Encountered errors while fetching environment subresources.
+                Errors at this stage may indicate that the query is too big and the API server
+                cannot handle the load, even after reducing the batch sizes.""",
+            )
+
+        objects = {
+            'lagoon': lagoon,
+            'project_list': [],
+            'project_environments': {},
+        }
+        objects['project_environments'] = lagoonEnvironment.environments.groupBy(
+            lambda e: (e.get('project') or {}).get('name'))
+
+        # Without a cluster filter, the projects without any environment
+        # are still part of the inventory.
+        objects['project_list'] = [
+            p for p in projects
+            if not cluster_names or p['name'] in objects['project_environments']]
+
+        lagoonProject = Project(self.lagoon_api, self.resource_options())
+        lagoonProject.projects = objects['project_list']
+        lagoonProject.withSubresources(
+            self.subresources_plan('project_subresources'), batch_sizes['project'])
+        if len(lagoonProject.errors):
+            self.display.error(f"Errors while fetching project subresources: {lagoonProject.errors}")
+            raise AnsibleError("""Encountered errors while fetching project subresources.
+                Errors at this stage may indicate that the query is too big and the API server
+                cannot handle the load, even after reducing the batch sizes.""",
+            )
+
+        return objects
+
+    def fetch_incremental(self, lagoon, lagoon_groups, projects: list, batch_sizes: dict) -> dict:
+        """
+        Updates the objects fetched by the previous refresh, stored in an
+        inventory snapshot, instead of fetching everything again.
+        """
+
+        # Snapshots taken with other fields or subresources are not reused.
+        snapshot = InventorySnapshot(
+            [self.get_var(lagoon, 'api_endpoint'), lagoon_groups,
+             self.metadata_filter(lagoon), self.environment_type_filter(lagoon),
+             self.project_fields(), self.environment_fields(),
+             self.get_option('project_subresources'),
+             self.get_option('environment_subresources')],
+            self.get_option('incremental_cache_dir'))
+        previous = snapshot.load(self.get_option('incremental_max_age'))
+
+        objects = None
+        if previous is not None:
+            objects = self.update_objects(lagoon, previous, projects, batch_sizes)
+        if objects is None:
+            self.display.v("Fetching all objects for the inventory snapshot")
+            objects = self.fetch_projects_objects(lagoon, projects, batch_sizes)
+
+        snapshot.save({k: v for k, v in objects.items() if k != 'lagoon'})
+        return objects
+
+    def update_objects(self, lagoon, previous: dict, projects: list, batch_sizes: dict) -> Optional[dict]:
+        """
+        Determines the projects which changed since the previous objects were
+        fetched and only fetches these again.
+
+        Projects are refetched when they are new or when one of their
+        environments is new or has been updated; deleted projects and
+        environments are dropped. Returns None if the changes could not be
+        determined, in which case everything should be fetched.
+        """
+
+        previous_projects = ResourceCollection(previous['project_list'])
+        previous_environments = {}
+        for pname, envs in previous['project_environments'].items():
+            for e in envs:
+                previous_environments[e['id']] = (pname, e)
+
+        created_after = max(
+            (e.get('created') or '' for _, e in previous_environments.values()),
+            default='')
+        if not created_after:
+            return None
+
+        try:
+            environment_type = self.environment_type_filter(lagoon)
+            created = Environment(self.lagoon_api).allCreatedAfter(
+                created_after, ['id'], environment_type).environments
+            current = Environment(self.lagoon_api).all(
+                ['id', 'updated'], environmentType=environment_type).environments
+        except TransportQueryError as e:
+            self.display.v(f"Unable to list the environment changes: {e}")
+            return None
+
+        # Environments missing from the previous objects which were not
+        # created since belong to projects that were not part of the
+        # inventory, so the listing is only used for the updates and the
+        # deletions.
+        current_environments = {e['id']: e['updated'] for e in current if e}
+
+        project_names = {p['name'] for p in projects}
+        changed = project_names - set(previous_projects.indexBy('name'))
+        for e in created:
+            if e and e['id'] not in previous_environments and e.get('project'):
+                changed.add(e['project']['name'])
+        for id, (pname, e) in previous_environments.items():
+            if id in current_environments and current_environments[id] != e.get('updated'):
+                changed.add(pname)
+        changed &= project_names
+
+        self.display.v(f"Fetching {len(changed)} changed projects out of {len(projects)}")
+        refreshed = self.fetch_projects_objects(
+            lagoon, [p for p in projects if p['name'] in changed], batch_sizes)
+
+        objects = {
+            'lagoon': lagoon,
+            'project_list': [],
+            'project_environments': refreshed['project_environments'],
+        }
+        for project in projects:
+            if project['name'] in changed:
+                objects['project_list'].append(project)
+                continue
+
+            # Keep the previous subresources, but drop the deleted
+            # environments.
+            project = {**previous_projects.byName(project['name']), **project}
+            project['environments'] = [
+                e for e in project.get('environments') or []
+                if e and e['id'] in current_environments]
+            objects['project_list'].append(project)
+
+            envs = [e for e in previous['project_environments'].get(project['name'], [])
+                    if e['id'] in current_environments]
+            if len(envs):
+                objects['project_environments'][project['name']] = envs
+
+        return objects
 
     def get_var(self, lagoon, name: str, default: Optional[Any] = None):
         """
@@ -375,17 +1140,89 @@ class InventoryModule(BaseInventoryPlugin, Constructable, Cacheable):
         return val
 
     def populate(self):
+        compact = self.get_option('compact_hostvars')
+        group_by = self.get_option('group_by') or []
+        # The project groups (compact hostvars) by name, and the project
+        # variables of their hosts.
+        self.project_groups = {}
+        self.project_hostvars = {}
+
         for objects in self.all_objects:
+            # Objects cached before the metadata was decoded when fetching.
+            if 'project_metadata' not in objects:
+                objects['project_metadata'] = self.decode_projects_metadata(
+                    objects['project_list'])
+
             for project in objects['project_list']:
                 project_envs = objects['project_environments'].get(
                     project['name'])
                 if not project_envs:
                     project_envs = []
+
+                metadata = objects['project_metadata'].get(project['name'])
+                # The project's compact records are converted once for all
+                # its environments, which then share the resulting dicts.
+                memo = {}
+                project_group = None
+                if compact and len(project_envs):
+                    project_group = self.add_project_group(project, metadata, memo)
                 for environment in project_envs:
-                    self.add_environment(project, environment, objects['lagoon'])
+                    self.add_environment(project, environment, objects['lagoon'],
+                                         project_group, metadata, memo)
+                    if len(group_by):
+                        self.add_to_native_groups(group_by, project, environment)
+
+    def add_to_native_groups(self, group_by: list, project, environment):
+        """
+        Adds the environment's host to the groups of the group_by option,
+        built from the fetched data without templating.
+        """
+
+        names = []
+        for key in group_by:
+            if key == 'project':
+                names.append(f"project_{project['name']}")
+            elif key == 'environment_type' and environment.get('environmentType'):
+                names.append(f"environment_type_{environment['environmentType']}")
+            elif key == 'cluster' and environment.get('kubernetes'):
+                names.append(f"cluster_{environment['kubernetes']['name']}")
+            elif key == 'lagoon_group':
+                names.extend(f"lagoon_group_{g['name']}" for g in project.get('groups') or [] if g)
+
+        namespace = environment['kubernetesNamespaceName']
+        for name in names:
+            group = self.inventory.add_group(self.sanitised_for_query_alias(name))
+            self.inventory.add_child(group, namespace)
+
+    def add_project_group(self, project, metadata: Optional[dict] = None,
+                          memo: Optional[dict] = None) -> str:
+        """
+        Adds the group holding the variables shared by the environments of
+        a project, for compact hostvars, and returns its name.
+        """
+
+        group = f"lagoon_project_{self.sanitised_for_query_alias(project['name'])}"
+        # Project names differing only by their special characters, or from
+        # different Lagoons, still get their own group.
+        suffix = 1
+        while group in self.project_groups:
+            suffix += 1
+            group = f"lagoon_project_{self.sanitised_for_query_alias(project['name'])}_{suffix}"
+
+        self.inventory.add_group(group)
+        try:
+            project_vars = plain(self.collect_project_vars(project, metadata), memo)
+            for key, value in project_vars.items():
+                self.inventory.set_variable(group, key, value)
+        except Exception as e:
+            raise AnsibleParserError("failed to parse: %s " % (to_native(e)), orig_exc=e)
+
+        self.project_groups[group] = project_vars
+        return group
 
     # Add the environment to the inventory set.
-    def add_environment(self, project, environment, lagoon):
+    def add_environment(self, project, environment, lagoon, project_group: Optional[str] = None,
+                        metadata: Optional[dict] = None, memo: Optional[dict] = None):
         namespace = environment['kubernetesNamespaceName']
 
         # Add host to the inventory.
@@ -393,33 +1230,104 @@ class InventoryModule(BaseInventoryPlugin, Constructable, Cacheable):
 
         # Collect and set host variables.
         try:
-            hostvars = self.collect_host_vars(namespace, environment, project, lagoon)
+            if project_group is None:
+                hostvars = self.collect_host_vars(namespace, environment, project, lagoon, metadata)
+            else:
+                # The project variables are inherited from its group.
+                self.inventory.add_child(project_group, namespace)
+                self.project_hostvars[namespace] = self.project_groups[project_group]
+                hostvars = self.collect_environment_vars(namespace, environment, lagoon)
+            hostvars = plain(hostvars, memo)
             for key, value in hostvars.items():
                 self.inventory.set_variable(namespace, key, value)
         except Exception as e:
             raise AnsibleParserError("failed to parse: %s " % (to_native(e)), orig_exc=e)
 
-    def collect_host_vars(self, namespace, environment, project, lagoon):
+    def collect_host_vars(self, namespace, environment, project, lagoon,
+                          metadata: Optional[dict] = None):
+        return {
+            **self.collect_environment_vars(namespace, environment, lagoon),
+            **self.collect_project_vars(project, metadata),
+        }
 
-        host_vars = {
-            'name': namespace,
+    def collect_project_vars(self, project, metadata: Optional[dict] = None):
+
+        project_vars = {
             'project_id': project['id'],
             'project_name': project['name'],
-            'env_id': environment['id'],
-            'env_name': environment['name'],
-            'type': environment['environmentType'],
-            'git_url': project['gitUrl'],
-            'cluster_id': environment['kubernetes']['id'],
-            'cluster_name': environment['kubernetes']['name'],
-
-            # Complex values.
-            'project_variables': {var['name']: var['value'] for var in project['envVariables']},
-            'environment_variables': {var['name']: var['value'] for var in environment['envVariables']},
-            'lagoon_groups': project['groups'],
 
             # This adds all information returned from the Lagoon query to the host variable
             # list, this will by dynamic and keys are not guaranteed.
             'lagoon_project': project,
+        }
+
+        # The fields and subresources which can be turned off.
+        if 'gitUrl' in project:
+            project_vars['git_url'] = project['gitUrl']
+        if 'envVariables' in project:
+            project_vars['project_variables'] = {
+                var['name']: var['value'] for var in project['envVariables'] or []}
+        if 'groups' in project:
+            project_vars['lagoon_groups'] = project['groups']
+
+        if 'metadata' in project:
+            if metadata is None:
+                metadata = self.decode_project_metadata(project)
+            project_vars['metadata'] = metadata
+
+        return project_vars
+
+    def decode_project_metadata(self, project) -> Optional[dict]:
+        """
+        Decodes the metadata of a project for the inventory, None if the
+        metadata was not fetched.
+        """
+
+        if 'metadata' not in project:
+            return None
+
+        # The Lagoon API sometimes returns a proper json structure as the
+        # value - we need to cater for both.
+        lagoon_meta = project['metadata']
+        if not isinstance(project['metadata'], Mapping):
+            lagoon_meta = json.loads(project['metadata'])
+        inventory_meta = {}
+        for key, value in lagoon_meta.items():
+            try:
+                # Metadata can be inserted as valid JSON, the lagoon interpreter
+                # will convert this to a JSON string and will escape with single quotes.
+                value = ast.literal_eval(value)
+            except Exception as e: # noqa F841
+                # We ignore an invalid decode - this will be a standard string value.
+                pass
+
+            inventory_meta[key] = value
+
+        return inventory_meta
+
+    def decode_projects_metadata(self, projects: list) -> dict:
+        """
+        Decodes the metadata of the projects once per fetch, keyed by project
+        name, so that it is stored in the inventory cache and populate()
+        does not have to parse it for every environment.
+        """
+
+        metadata = {}
+        for project in projects:
+            try:
+                metadata[project['name']] = self.decode_project_metadata(project)
+            except Exception as e:
+                raise AnsibleParserError("failed to parse: %s " % (to_native(e)), orig_exc=e)
+        return metadata
+
+    def collect_environment_vars(self, namespace, environment, lagoon):
+
+        environment_vars = {
+            'name': namespace,
+            'env_id': environment['id'],
+
+            # This adds all information returned from the Lagoon query to the host variable
+            # list, this will by dynamic and keys are not guaranteed.
             'lagoon_environment': environment,
 
             # Ansible specific host variables these define how ansible
@@ -432,27 +1340,19 @@ class InventoryModule(BaseInventoryPlugin, Constructable, Cacheable):
             'ansible_ssh_common_args': '-T -o "UserKnownHostsFile=/dev/null" -o "StrictHostKeyChecking=no"'
         }
 
-        if 'metadata' in project:
-            # The Lagoon API sometimes returns a proper json structure as the
-            # value - we need to cater for both.
-            lagoon_meta = project['metadata']
-            if type(project['metadata']) is not dict:
-                lagoon_meta = json.loads(project['metadata'])
-            inventory_meta = {}
-            for key, value in lagoon_meta.items():
-                try:
-                    # Metadata can be inserted as valid JSON, the lagoon interpreter
-                    # will convert this to a JSON string and will escape with single quotes.
-                    value = ast.literal_eval(value)
-                except Exception as e: # noqa F841
-                    # We ignore an invalid decode - this will be a standard string value.
-                    pass
-
-                inventory_meta[key] = value
-
-            host_vars['metadata'] = inventory_meta
-
-        return host_vars
+        # The fields and subresources which can be turned off.
+        if 'name' in environment:
+            environment_vars['env_name'] = environment['name']
+        if 'environmentType' in environment:
+            environment_vars['type'] = environment['environmentType']
+        if environment.get('kubernetes'):
+            environment_vars['cluster_id'] = environment['kubernetes']['id']
+            environment_vars['cluster_name'] = environment['kubernetes']['name']
+        if 'envVariables' in environment:
+            environment_vars['environment_variables'] = {
+                var['name']: var['value'] for var in environment['envVariables'] or []}
+
+        return environment_vars
 
     def sanitised_name(self, name):
         return re.sub(r'[\W_-]+', '-', name)
@@ -464,17 +1364,19 @@ class InventoryModule(BaseInventoryPlugin, Constructable, Cacheable):
         lagoon_ssh_private_key = self.get_var(lagoon, 'ssh_private_key')
         lagoon_ssh_private_key_file = self.get_var(lagoon, 'ssh_private_key_file')
 
-        if lagoon_ssh_private_key:
-            if not lagoon_ssh_private_key_file:
-                lagoon_ssh_private_key_file = '/tmp/lagoon_ssh_private_key'
-            LagoonToken.write_ssh_key(lagoon_ssh_private_key, lagoon_ssh_private_key_file)
+        # The Lagoons may share the default key file.
+        with self._token_lock:
+            if lagoon_ssh_private_key:
+                if not lagoon_ssh_private_key_file:
+                    lagoon_ssh_private_key_file = '/tmp/lagoon_ssh_private_key'
+                LagoonToken.write_ssh_key(lagoon_ssh_private_key, lagoon_ssh_private_key_file)
 
-        rc, token, error = LagoonToken.fetch_token(
-            lagoon.get('ssh_host'),
-            lagoon.get('ssh_port'),
-            "-q -o UserKnownHostsFile=/dev/null -o StrictHostKeyChecking=no",
-            lagoon_ssh_private_key_file
-        )
+            rc, token, error = LagoonToken.fetch_token(
+                lagoon.get('ssh_host'),
+                lagoon.get('ssh_port'),
+                "-q -o UserKnownHostsFile=/dev/null -o StrictHostKeyChecking=no",
+                lagoon_ssh_private_key_file
+            )
 
         if rc > 0:
             raise AnsibleError("Failed to fetch Lagoon API token: %s (error code: %s) " % (error, rc))
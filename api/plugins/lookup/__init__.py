@@ -1,13 +1,18 @@
 from ansible.plugins.lookup import LookupBase
-from ansible_collections.lagoon.api.plugins.module_utils.gql import GqlClient
+from ansible_collections.lagoon.api.plugins.module_utils.gql import GqlClient, client_options
 
 
 class LagoonLookupBase(LookupBase):
 
-    def createClient(self):
+    def createClient(self, variables=None):
+        if variables is None:
+            variables = dict()
+
         self.client = GqlClient(
             self._templar.template(self.get_option('lagoon_api_endpoint')),
             self._templar.template(self.get_option('lagoon_api_token')),
             self.get_option('headers', {}),
             self._display,
+            options=client_options(lambda name: self._templar.template(
+                variables.get(f"lagoon_{name}"))),
         )
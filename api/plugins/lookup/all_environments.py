@@ -1,4 +1,5 @@
 from ansible_collections.lagoon.api.plugins.lookup import LagoonLookupBase
+from ansible_collections.lagoon.api.plugins.module_utils.collection import plain
 from ansible_collections.lagoon.api.plugins.module_utils.gqlEnvironment import Environment
 from ansible.errors import AnsibleError
 
@@ -56,7 +57,7 @@ class LookupModule(LagoonLookupBase):
 
     self.set_options(var_options=variables, direct=kwargs)
 
-    self.createClient()
+    self.createClient(variables)
 
     lagoonEnvironment = Environment(self.client).all()
     if not len(lagoonEnvironment.environments):
@@ -65,10 +66,11 @@ class LookupModule(LagoonLookupBase):
             f"Unable to fetch environments; encountered the following errors: {lagoonEnvironment.errors}")
       return ret
 
-    lagoonEnvironment.withCluster(batch_size=50).withVariables(batch_size=50)
+    lagoonEnvironment.withSubresources(
+        {'cluster': None, 'variables': None}, batch_size=50)
     if len(lagoonEnvironment.errors):
       self._display.warning(
           f"The query partially succeeded, but the following errors were encountered:\n{ lagoonEnvironment.errors }")
-    ret = lagoonEnvironment.environments
+    ret = plain(lagoonEnvironment.environments)
 
     return ret
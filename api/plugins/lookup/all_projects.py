@@ -1,5 +1,6 @@
 from ansible.errors import AnsibleError
 from ansible_collections.lagoon.api.plugins.lookup import LagoonLookupBase
+from ansible_collections.lagoon.api.plugins.module_utils.collection import plain
 from ansible_collections.lagoon.api.plugins.module_utils.gqlProject import Project
 
 DOCUMENTATION = """
@@ -56,7 +57,7 @@ class LookupModule(LagoonLookupBase):
 
     self.set_options(var_options=variables, direct=kwargs)
 
-    self.createClient()
+    self.createClient(variables)
 
     lagoonProject = Project(self.client).all()
     if not len(lagoonProject.projects):
@@ -65,10 +66,11 @@ class LookupModule(LagoonLookupBase):
             f"Unable to fetch projects; encountered the following errors: {lagoonProject.errors}")
       return ret
 
-    lagoonProject.withCluster(batch_size=50).withEnvironments(batch_size=50)
+    lagoonProject.withSubresources(
+        {'cluster': None, 'environments': None}, batch_size=50)
     if len(lagoonProject.errors):
       self._display.warning(
           f"The query partially succeeded, but the following errors were encountered:\n{ lagoonProject.errors }")
-    ret = lagoonProject.projects
+    ret = plain(lagoonProject.projects)
 
     return ret
@@ -59,7 +59,7 @@ class LookupModule(LagoonLookupBase):
 
         self.set_options(var_options=variables, direct=kwargs)
 
-        self.createClient()
+        self.createClient(variables)
 
         lagoonEnvironment = Environment(self.client)
 
@@ -71,8 +71,12 @@ class LookupModule(LagoonLookupBase):
                         f"Unable to fetch environment {term}; encountered the following errors: {lagoonEnvironment.errors}")
                 return ret
 
-            lagoonEnvironment.withCluster().withVariables()
-            lagoonEnvironment.withProject().withDeployments()
+            lagoonEnvironment.withSubresources({
+                'cluster': None,
+                'variables': None,
+                'project': None,
+                'deployments': None,
+            })
             if len(lagoonEnvironment.errors):
                 self._display.warning(
                     f"The query partially succeeded, but the following errors were encountered:\n{ lagoonEnvironment.errors }")
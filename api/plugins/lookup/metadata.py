@@ -67,7 +67,7 @@ class LookupModule(LagoonLookupBase):
 
     self.set_options(var_options=variables, direct=kwargs)
 
-    self.createClient()
+    self.createClient(variables)
 
     project = self.get_option('project')
 
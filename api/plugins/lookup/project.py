@@ -67,7 +67,7 @@ class LookupModule(LagoonLookupBase):
 
     self.set_options(var_options=variables, direct=kwargs)
 
-    self.createClient()
+    self.createClient(variables)
 
     lagoonProject = Project(self.client)
     lagoonEnvironment = Environment(self.client)
@@ -86,8 +86,13 @@ class LookupModule(LagoonLookupBase):
         if not len(lagoonProject.projects):
             return ret
 
-      lagoonProject.withCluster().withEnvironments()
-      lagoonProject.withDeployTargetConfigs().withVariables().withGroups()
+      lagoonProject.withSubresources({
+          'cluster': None,
+          'environments': None,
+          'deployTargetConfigs': None,
+          'variables': None,
+          'groups': None,
+      })
       if len(lagoonProject.errors):
         self._display.warning(
             f"The query partially succeeded, but the following errors were encountered:\n{ lagoonProject.errors }")
@@ -64,7 +64,7 @@ class LookupModule(LagoonLookupBase):
     def run(self, terms, variables=None, **kwargs):
         ret = []
         self.set_options(var_options=variables, direct=kwargs)
-        self.createClient()
+        self.createClient(variables)
 
         for term in terms:
             if isinstance(term, int):
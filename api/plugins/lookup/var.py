@@ -82,7 +82,7 @@ class LookupModule(LagoonLookupBase):
     ret = []
 
     self.set_options(var_options=variables, direct=kwargs)
-    self.createClient()
+    self.createClient(variables)
     environment = self.get_option('environment')
 
     for term in terms:
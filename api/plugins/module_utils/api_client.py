@@ -4,10 +4,10 @@ __metaclass__ = type
 import json
 import re
 import time
+from .http_session import shared_session
 from ansible.errors import AnsibleError
-from ansible.module_utils.urls import open_url, ConnectionError, SSLValidationError
 from ansible.module_utils._text import to_native
-from ansible.module_utils.six.moves.urllib.error import HTTPError, URLError
+from requests.exceptions import ConnectionError, HTTPError, RequestException, SSLError, Timeout
 
 # This has been commented out due to modules failing because of it.
 # from ansible.utils.display import Display
@@ -642,25 +642,32 @@ class ApiClient:
 
     def make_api_call(self, payload):
         # display.v("API call payload: %s" % payload)
+        # The connections are kept alive in the session shared with the
+        # other clients, e.g for the polling of project_check_deploy_status.
+        # The requests are not retried, not to run mutations (e.g, deploy)
+        # twice, and the certificates are only verified with validate_certs.
+        session = shared_session(
+            self.options.get('pool_size'), retries=0,
+            verify=bool(self.options.get('validate_certs', False)))
         try:
-            response = open_url(self.options.get('endpoint'), data=payload,
-                                validate_certs=self.options.get(
-                                    'validate_certs', False),
-                                headers=self.options.get('headers', {}),
-                                timeout=self.options.get('timeout', 30))
+            response = session.post(
+                self.options.get('endpoint'), data=payload,
+                headers=self.options.get('headers', {}),
+                timeout=self.options.get('timeout', 30))
+            response.raise_for_status()
         except HTTPError as e:
             raise AnsibleError(
                 "Received HTTP error: %s" % (to_native(e)))
-        except URLError as e:
-            raise AnsibleError(
-                "Failed lookup url: %s" % (to_native(e)))
-        except SSLValidationError as e:
+        except SSLError as e:
             raise AnsibleError(
                 "Error validating the server's certificate: %s" % (to_native(e)))
-        except ConnectionError as e:
+        except (ConnectionError, Timeout) as e:
             raise AnsibleError("Error connecting: %s" % (to_native(e)))
+        except RequestException as e:
+            raise AnsibleError(
+                "Failed lookup url: %s" % (to_native(e)))
 
-        result = json.loads(response.read())
+        result = json.loads(response.content)
 
         if "errors" in result:
             raise AnsibleError("GraphQL error: %s" % (to_native(result)))
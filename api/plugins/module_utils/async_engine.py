@@ -0,0 +1,107 @@
+import asyncio
+import threading
+
+from gql import Client
+from graphql import DocumentNode, GraphQLSchema
+from typing import Any, Coroutine, Dict, List, Optional, Tuple, Union
+
+try:
+    import aiohttp
+    from gql.transport.aiohttp import AIOHTTPTransport
+    HAS_AIOHTTP = True
+except ImportError:
+    HAS_AIOHTTP = False
+
+# A document to execute and its variables, if any.
+Operation = Tuple[DocumentNode, Optional[Dict[str, Any]]]
+
+
+class AsyncEngine:
+    """
+    Executes GraphQL documents through gql's aiohttp transport, on an event
+    loop running in a background thread, for synchronous callers.
+
+    All the requests share a single aiohttp session, so that many of them
+    can be in flight at once (see execute_many) without a thread and a
+    transport per request.
+    """
+
+    def __init__(self, endpoint: str, headers: dict, schema: GraphQLSchema = None,
+                 poolSize: int = None) -> None:
+        if not HAS_AIOHTTP:
+            raise ImportError("The aiohttp package is required for the async engine")
+
+        self.endpoint = endpoint
+        self.headers = dict(headers)
+        self.schema = schema
+        self.poolSize = poolSize
+        self.client: Client = None
+        self.session = None
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(
+            target=self.loop.run_forever, name='lagoon-api-async', daemon=True)
+        self.thread.start()
+        try:
+            self.run(self.connect())
+        except BaseException:
+            self.stop()
+            raise
+
+    def run(self, coroutine: Coroutine) -> Any:
+        """Runs the coroutine on the engine's loop and waits for its result."""
+
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    async def connect(self):
+        # The connector has to be created on the loop it is used from.
+        transport = AIOHTTPTransport(
+            url=self.endpoint,
+            headers=self.headers,
+            client_session_args={
+                'connector': aiohttp.TCPConnector(limit_per_host=self.poolSize or 0),
+            },
+        )
+        self.client = Client(transport=transport, schema=self.schema)
+        self.session = await self.client.connect_async()
+
+    def execute(self, document: DocumentNode,
+                variables: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        return self.run(self.session.execute(document, variable_values=variables))
+
+    def execute_many(self, operations: List[Operation],
+                     concurrency: int = 1) -> List[Union[Dict[str, Any], BaseException]]:
+        """
+        Executes the operations with up to concurrency of them in flight at
+        once, and returns their results in order - or the exception raised,
+        for those which failed.
+        """
+
+        return self.run(self.gather(operations, concurrency))
+
+    async def gather(self, operations: List[Operation],
+                     concurrency: int) -> List[Union[Dict[str, Any], BaseException]]:
+        semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+        async def execute(document: DocumentNode, variables: Optional[Dict[str, Any]]):
+            async with semaphore:
+                return await self.session.execute(document, variable_values=variables)
+
+        return await asyncio.gather(
+            *(execute(document, variables) for document, variables in operations),
+            return_exceptions=True)
+
+    def close(self):
+        if self.loop.is_closed():
+            return
+        try:
+            if self.session is not None:
+                self.run(self.client.close_async())
+        finally:
+            self.session = None
+            self.stop()
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
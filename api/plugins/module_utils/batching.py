@@ -0,0 +1,68 @@
+import threading
+
+# Batch sizes never grow beyond this when adapting to the latency.
+MAX_BATCH_SIZE = 500
+
+# Factor applied to the batch size when a request is slower than the target.
+DECREASE_FACTOR = 0.5
+
+
+class BatchSizer:
+    """
+    Keeps track of the size of the batches sent for one kind of aliased
+    query (e.g, the environments of projects).
+
+    Without a target latency, the size only ever shrinks, when a batch fails
+    for being too large. With a target latency (in seconds), it also adapts
+    to the response times using additive increase/multiplicative decrease
+    (AIMD): it grows by a tenth of the initial size after each full batch
+    answered within the target and halves after each slower one.
+
+    With a target latency, the size requested by the caller is only the
+    initial size, which then grows up to MAX_BATCH_SIZE; it is an upper
+    bound otherwise, or when pinned.
+    """
+
+    def __init__(self, initial: int, targetLatency: float = None) -> None:
+        self.size = max(int(initial), 1)
+        self.targetLatency = targetLatency
+        self.increase = max(self.size // 10, 1)
+        self.lock = threading.Lock()
+
+    def next(self, requested: int, pinned: bool = False) -> int:
+        """
+        Returns the size of the next batch; requested is the size asked for
+        by the caller, replaced by the adapted size with a target latency
+        unless pinned (e.g, for batches which can only be split).
+        """
+
+        with self.lock:
+            if self.targetLatency and not pinned:
+                return self.size
+            return max(min(requested, self.size), 1)
+
+    def record(self, batchSize: int, elapsed: float):
+        """
+        Adjusts the size after a batch of batchSize items took elapsed
+        seconds.
+        """
+
+        if not self.targetLatency:
+            return
+
+        with self.lock:
+            if elapsed > self.targetLatency:
+                self.size = max(int(self.size * DECREASE_FACTOR), 1)
+            elif batchSize >= self.size:
+                # Partial batches (the last one) say nothing about whether
+                # a larger batch would still be fast enough.
+                self.size = min(self.size + self.increase, MAX_BATCH_SIZE)
+
+    def failed(self, size: int):
+        """
+        Caps the size after a batch failed and was split into batches of
+        the given size.
+        """
+
+        with self.lock:
+            self.size = max(min(self.size, size), 1)
@@ -0,0 +1,370 @@
+import fcntl
+import hashlib
+import json
+import os
+import stat
+import tempfile
+import threading
+import time
+
+from .http_session import RETRIES, PooledRequestsHTTPTransport
+from gql.transport import Transport
+from gql.transport.exceptions import (
+    TransportClosed,
+    TransportProtocolError,
+    TransportServerError,
+)
+from graphql import DocumentNode, ExecutionResult, OperationType, parse, print_ast
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client as ConnectionClient, Listener
+from typing import Any, Dict, Optional, Tuple
+
+DEFAULT_BROKER_IDLE_TIMEOUT = 300
+
+# How long to wait for a newly started broker to accept connections.
+BROKER_START_TIMEOUT = 10
+
+# Expired read cache entries are purged once the cache reaches this size.
+MAX_CACHE_ENTRIES = 1000
+
+# The connections to the API kept alive by the broker, enough for one per
+# fork with Ansible's usual forks settings.
+BROKER_POOL_SIZE = 50
+
+
+def broker_socket_dir() -> str:
+    """
+    The directory of the brokers' sockets, private to the current user:
+    under $XDG_RUNTIME_DIR if set, or the temporary directory otherwise.
+    """
+
+    return os.path.join(
+        os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir(),
+        f"lagoon-api-broker-{os.getuid()}")
+
+
+def check_socket_dir(socketDir: str):
+    """
+    Makes sure the sockets' directory is a directory (not a symlink) owned
+    by the current user and only accessible to them, as another user could
+    otherwise have created it to intercept the requests and their token.
+    """
+
+    st = os.lstat(socketDir)
+    if (not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or
+            stat.S_IMODE(st.st_mode) != 0o700):
+        raise TransportClosed(
+            f"Refusing to use the API broker directory {socketDir}: it must be "
+            "a directory owned by the current user, with mode 0700")
+
+
+def broker_address(endpoint: str, headers: dict) -> Tuple[str, bytes]:
+    """
+    Returns the unix socket path and the authentication key for the broker
+    serving the endpoint with the given headers (which include the token).
+
+    Only processes that know the token can derive the key and therefore talk
+    to the broker.
+    """
+
+    digest = hashlib.sha256(
+        json.dumps([endpoint, headers], sort_keys=True).encode('utf-8'))
+    return (os.path.join(broker_socket_dir(), f"{digest.hexdigest()[:32]}.sock"),
+            digest.digest())
+
+
+def broker_alive(address: str, authkey: bytes) -> bool:
+    try:
+        conn = ConnectionClient(address, 'AF_UNIX', authkey=authkey)
+    except (OSError, EOFError, AuthenticationError):
+        return False
+    conn.close()
+    return True
+
+
+def start_broker(endpoint: str, headers: dict, options: dict = {}) -> Tuple[str, bytes]:
+    """
+    Makes sure a broker is running for the endpoint, starting one in a
+    detached process if required, and returns its address and key.
+
+    A lock file prevents concurrent forks from starting several brokers.
+    """
+
+    address, authkey = broker_address(endpoint, headers)
+    os.makedirs(os.path.dirname(address), mode=0o700, exist_ok=True)
+    check_socket_dir(os.path.dirname(address))
+    if broker_alive(address, authkey):
+        return address, authkey
+
+    with open(f"{address}.lock", 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if broker_alive(address, authkey):
+                return address, authkey
+
+            if os.path.exists(address):
+                os.remove(address)
+
+            pid = os.fork()
+            if pid == 0:
+                # Double-fork so the broker is re-parented to init and
+                # outlives the Ansible worker that started it.
+                try:
+                    lock.close()
+                    os.setsid()
+                    if os.fork() == 0:
+                        devnull = os.open(os.devnull, os.O_RDWR)
+                        for fd in (0, 1, 2):
+                            os.dup2(devnull, fd)
+                        BrokerServer(
+                            address, authkey, endpoint, headers, options).serve()
+                finally:
+                    os._exit(0)
+            os.waitpid(pid, 0)
+
+            deadline = time.monotonic() + BROKER_START_TIMEOUT
+            while not broker_alive(address, authkey):
+                if time.monotonic() > deadline:
+                    raise TransportClosed(
+                        f"Timed out waiting for the API broker at {address}")
+                time.sleep(0.05)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+    return address, authkey
+
+
+class RateLimiter:
+    """
+    Spaces out requests so that no more than `rate` are sent per second;
+    a rate of 0 disables the limit.
+    """
+
+    def __init__(self, rate: float = 0) -> None:
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.nextSlot = time.monotonic()
+
+    def wait(self):
+        if self.rate <= 0:
+            return
+
+        with self.lock:
+            now = time.monotonic()
+            delay = self.nextSlot - now
+            self.nextSlot = max(now, self.nextSlot) + 1 / self.rate
+
+        if delay > 0:
+            time.sleep(delay)
+
+
+class BrokerServer:
+    """
+    Long-lived process holding the HTTP sessions, the schema, a read cache
+    and a rate limiter for one Lagoon endpoint, shared by all the processes
+    (Ansible forks) connecting to it.
+
+    Each connection is handled in its own thread; all of them send their
+    requests through the same pooled session, kept alive for the broker's
+    lifetime, so that the forks share its warm connections to the API.
+
+    It exits after idleTimeout seconds without any connection.
+    """
+
+    def __init__(self, address: str, authkey: bytes, endpoint: str,
+                 headers: dict, options: dict = {}) -> None:
+        self.address = address
+        self.authkey = authkey
+        self.endpoint = endpoint
+        self.headers = headers
+        self.apiTransport: PooledRequestsHTTPTransport = None
+        self.transportLock = threading.Lock()
+        self.cacheTtl = options.get('brokerCacheTtl', 0)
+        self.idleTimeout = options.get(
+            'brokerIdleTimeout', DEFAULT_BROKER_IDLE_TIMEOUT)
+        self.limiter = RateLimiter(options.get('brokerRateLimit', 0))
+
+        self.cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self.lock = threading.Lock()
+        self.activeConnections = 0
+        self.lastActivity = time.monotonic()
+        self.closing = False
+        self.listener: Listener = None
+
+    def newTransport(self) -> PooledRequestsHTTPTransport:
+        return PooledRequestsHTTPTransport(
+            url=self.endpoint,
+            headers=self.headers,
+            verify=True,
+            retries=RETRIES,
+            poolSize=BROKER_POOL_SIZE,
+        )
+
+    def transport(self) -> PooledRequestsHTTPTransport:
+        """The transport shared by the handler threads, connected on first use."""
+
+        with self.transportLock:
+            if self.apiTransport is None:
+                transport = self.newTransport()
+                transport.connect()
+                self.apiTransport = transport
+            return self.apiTransport
+
+    def serve(self):
+        self.listener = Listener(self.address, 'AF_UNIX', authkey=self.authkey)
+        threading.Thread(target=self.watchIdle, daemon=True).start()
+
+        try:
+            while True:
+                try:
+                    conn = self.listener.accept()
+                except (AuthenticationError, EOFError, OSError):
+                    if self.closing:
+                        break
+                    continue
+                if self.closing:
+                    conn.close()
+                    break
+                threading.Thread(
+                    target=self.handle, args=(conn,), daemon=True).start()
+        finally:
+            self.listener.close()
+            with self.transportLock:
+                if self.apiTransport is not None:
+                    self.apiTransport.close()
+                    self.apiTransport = None
+
+    def watchIdle(self):
+        while True:
+            time.sleep(1)
+            with self.lock:
+                idle = (self.activeConnections == 0 and
+                        time.monotonic() - self.lastActivity > self.idleTimeout)
+            if idle:
+                break
+
+        # Wake up the accept() call so that the server loop can exit.
+        self.closing = True
+        broker_alive(self.address, self.authkey)
+
+    def handle(self, conn):
+        with self.lock:
+            self.activeConnections += 1
+        try:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    break
+                conn.send(self.execute(request))
+        finally:
+            conn.close()
+            with self.lock:
+                self.activeConnections -= 1
+                self.lastActivity = time.monotonic()
+
+    def execute(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Executes a GraphQL request received from a client, serving queries
+        from the read cache when possible.
+
+        Any mutation clears the read cache, so that clients never read data
+        older than their own writes.
+        """
+
+        document = parse(request['query'])
+        operations = [d for d in document.definitions if hasattr(d, 'operation')]
+        isMutation = any(
+            o.operation == OperationType.MUTATION for o in operations)
+        isIntrospection = any(
+            o.name and o.name.value == 'IntrospectionQuery' for o in operations)
+
+        cacheKey = json.dumps(
+            [request['query'], request.get('variables'), request.get('operationName')],
+            sort_keys=True)
+        with self.lock:
+            if isMutation:
+                self.cache.clear()
+            elif cacheKey in self.cache:
+                expires, cached = self.cache[cacheKey]
+                if expires < 0 or expires > time.monotonic():
+                    return cached
+
+        self.limiter.wait()
+        try:
+            result = self.transport().execute(
+                document,
+                variable_values=request.get('variables'),
+                operation_name=request.get('operationName'))
+        except TransportServerError as e:
+            return {'exception': 'server', 'message': str(e), 'code': e.code}
+        except Exception as e:
+            return {'exception': 'protocol', 'message': f"{type(e).__name__}: {e}"}
+
+        response = {
+            'data': result.data,
+            'errors': result.errors,
+            'extensions': result.extensions,
+        }
+        if not result.errors and (isIntrospection or (
+                not isMutation and self.cacheTtl)):
+            now = time.monotonic()
+            expires = -1 if isIntrospection else now + self.cacheTtl
+            with self.lock:
+                if len(self.cache) >= MAX_CACHE_ENTRIES:
+                    self.cache = {k: v for k, v in self.cache.items()
+                                  if v[0] < 0 or v[0] > now}
+                self.cache[cacheKey] = (expires, response)
+        return response
+
+
+class BrokerTransport(Transport):
+    """
+    Sync gql transport sending the operations to the API broker instead of
+    the API itself.
+    """
+
+    def __init__(self, endpoint: str, headers: dict, options: dict = {}) -> None:
+        self.address, self.authkey = start_broker(endpoint, headers, options)
+        self.conn = None
+
+    def connect(self):
+        try:
+            self.conn = ConnectionClient(
+                self.address, 'AF_UNIX', authkey=self.authkey)
+        except (OSError, EOFError, AuthenticationError) as e:
+            raise TransportClosed(f"Unable to connect to the API broker: {e}")
+
+    def execute(self, document: DocumentNode,
+                variable_values: Optional[Dict[str, Any]] = None,
+                operation_name: Optional[str] = None,
+                **kwargs) -> ExecutionResult:
+
+        if self.conn is None:
+            raise TransportClosed("Transport is not connected")
+
+        try:
+            self.conn.send({
+                'query': print_ast(document),
+                'variables': variable_values,
+                'operationName': operation_name,
+            })
+            res = self.conn.recv()
+        except (OSError, EOFError) as e:
+            raise TransportClosed(f"Lost connection to the API broker: {e}")
+
+        if res.get('exception') == 'server':
+            raise TransportServerError(res['message'], res['code'])
+        elif res.get('exception'):
+            raise TransportProtocolError(res['message'])
+
+        return ExecutionResult(
+            data=res.get('data'),
+            errors=res.get('errors'),
+            extensions=res.get('extensions'),
+        )
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
@@ -0,0 +1,311 @@
+import sys
+
+from collections.abc import Mapping, MutableMapping
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class RecordSchema:
+    """
+    The keys of compact records, shared by all the records with the same
+    keys in the same order (e.g, the results of a query).
+
+    Schemas are derived from the empty one by adding keys one at a time,
+    so that equal schemas are the same object.
+    """
+
+    __slots__ = ('keys', 'positions', 'transitions')
+
+    def __init__(self, keys: Tuple[str, ...] = ()) -> None:
+        self.keys = keys
+        self.positions = {k: i for i, k in enumerate(keys)}
+        self.transitions: Dict[str, 'RecordSchema'] = {}
+
+    def withKey(self, key: str) -> 'RecordSchema':
+        schema = self.transitions.get(key)
+        if schema is None:
+            if isinstance(key, str):
+                key = sys.intern(key)
+            schema = self.transitions.setdefault(key, RecordSchema(self.keys + (key,)))
+        return schema
+
+    def withKeys(self, keys: Iterable[str]) -> 'RecordSchema':
+        schema = self
+        for key in keys:
+            schema = schema.withKey(key)
+        return schema
+
+
+EMPTY_SCHEMA = RecordSchema()
+
+
+class CompactRecord(MutableMapping):
+    """
+    A resource record stored as a tuple of values and a shared schema,
+    instead of a dict: a fraction of the memory for the large lists of
+    identically shaped records returned by the API.
+
+    Values set on a record are made compact too (see compact); plain()
+    converts the records back to dicts, for Ansible.
+    """
+
+    __slots__ = ('_schema', '_values')
+
+    def __init__(self, items: Mapping = None) -> None:
+        items = items or {}
+        self._schema = EMPTY_SCHEMA.withKeys(items.keys())
+        self._values = tuple(compact(v) for v in items.values())
+
+    def __getitem__(self, key: str) -> Any:
+        return self._values[self._schema.positions[key]]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        position = self._schema.positions.get(key)
+        return default if position is None else self._values[position]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._schema.positions
+
+    def __setitem__(self, key: str, value: Any):
+        value = compact(value)
+        position = self._schema.positions.get(key)
+        if position is None:
+            self._schema = self._schema.withKey(key)
+            self._values += (value,)
+        else:
+            self._values = self._values[:position] + (value,) + self._values[position + 1:]
+
+    def __delitem__(self, key: str):
+        position = self._schema.positions[key]
+        self._schema = EMPTY_SCHEMA.withKeys(
+            k for k in self._schema.keys if k != key)
+        self._values = self._values[:position] + self._values[position + 1:]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._schema.keys)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+    def __reduce__(self):
+        return (CompactRecord, (dict(self),))
+
+    def copy(self) -> 'CompactRecord':
+        record = CompactRecord()
+        record._schema, record._values = self._schema, self._values
+        return record
+
+
+def compact(value: Any) -> Any:
+    """
+    The value with its dicts (at any depth) converted to compact records;
+    values which are already compact are returned as is.
+    """
+
+    if isinstance(value, CompactRecord):
+        return value
+    if isinstance(value, dict):
+        return CompactRecord(value)
+    if isinstance(value, list):
+        converted = None
+        for i, v in enumerate(value):
+            c = compact(v)
+            if c is not v:
+                if converted is None:
+                    converted = list(value)
+                converted[i] = c
+        return value if converted is None else converted
+    return value
+
+
+def plain(value: Any, memo: Dict[int, Any] = None) -> Any:
+    """
+    The value with its compact records (at any depth) converted to dicts
+    and its lists to plain lists, for Ansible. Values which are plain
+    already are returned as is, without copying them.
+    """
+
+    if memo is None:
+        memo = {}
+    if isinstance(value, CompactRecord):
+        # Records shared by several values stay shared.
+        if id(value) not in memo:
+            memo[id(value)] = (value, {k: plain(v, memo) for k, v in value.items()})
+        return memo[id(value)][1]
+    if isinstance(value, dict):
+        converted = None
+        for k, v in value.items():
+            p = plain(v, memo)
+            if p is not v:
+                if converted is None:
+                    converted = dict(value)
+                converted[k] = p
+        return value if converted is None else converted
+    if isinstance(value, list):
+        converted = None if type(value) is list else list(value)
+        for i, v in enumerate(value):
+            p = plain(v, memo)
+            if p is not v:
+                if converted is None:
+                    converted = list(value)
+                converted[i] = p
+        return value if converted is None else converted
+    return value
+
+
+def json_default(value: Any) -> Any:
+    """
+    Serialises compact records, as the default of json.dump.
+    """
+
+    if isinstance(value, CompactRecord):
+        return dict(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class ResourceCollection(list):
+    """
+    A list of resource records (e.g, Project.projects) which can also look
+    them up by id, name or kubernetesNamespaceName in constant time.
+
+    The index of a field is built on its first lookup, then kept up to date
+    as records are appended; other changes to the list discard the indexes.
+    When several records share a value, the first one is returned.
+
+    With compactRecords, the records are stored as compact records.
+    """
+
+    def __init__(self, records: Iterable[dict] = (), compactRecords: bool = False) -> None:
+        self.compactRecords = compactRecords
+        super().__init__(self.compacted(records))
+        self.indexes: Dict[str, Dict[Any, dict]] = {}
+
+    def compacted(self, records: Iterable[dict]) -> Iterable[dict]:
+        if not self.compactRecords:
+            return records
+        return [compact(r) for r in records]
+
+    def indexBy(self, field: str) -> Dict[Any, dict]:
+        """
+        The records keyed by the value of the field; named so as not to
+        override list.index.
+        """
+
+        if field not in self.indexes:
+            self.indexes[field] = {}
+            self.addToIndexes(self, [field])
+        return self.indexes[field]
+
+    def addToIndexes(self, records: Iterable[dict], fields: List[str] = None):
+        for field in fields or list(self.indexes.keys()):
+            index = self.indexes[field]
+            for record in records:
+                if not isinstance(record, Mapping) or record.get(field) is None:
+                    continue
+                try:
+                    index.setdefault(record[field], record)
+                except TypeError:
+                    # Unhashable values (e.g, subresources) are not indexed.
+                    continue
+
+    def get(self, field: str, value: Any, default: Optional[dict] = None) -> Optional[dict]:
+        return self.indexBy(field).get(value, default)
+
+    def byId(self, id: int) -> Optional[dict]:
+        return self.get('id', id)
+
+    def byName(self, name: str) -> Optional[dict]:
+        return self.get('name', name)
+
+    def byNamespace(self, ns: str) -> Optional[dict]:
+        return self.get('kubernetesNamespaceName', ns)
+
+    def unique(self, field: str = 'name') -> 'ResourceCollection':
+        """
+        The records without the ones whose field has the same value as a
+        previous record's.
+        """
+
+        unique = ResourceCollection(compactRecords=self.compactRecords)
+        unique.extendUnique(self, field)
+        return unique
+
+    def extendUnique(self, records: Iterable[dict], field: str = 'name'):
+        """
+        Appends the records whose field's value is not in the collection yet.
+        """
+
+        index = self.indexBy(field)
+        for record in records:
+            if isinstance(record, Mapping) and record.get(field) in index:
+                continue
+            self.append(record)
+
+    def groupBy(self, key: Callable[[dict], Any]) -> Dict[Any, List[dict]]:
+        """
+        The records grouped by the value returned by key, in order.
+        """
+
+        groups = {}
+        for record in self:
+            groups.setdefault(key(record), []).append(record)
+        return groups
+
+    def append(self, record: dict):
+        if self.compactRecords:
+            record = compact(record)
+        super().append(record)
+        if self.indexes:
+            self.addToIndexes([record])
+
+    def extend(self, records: Iterable[dict]):
+        records = list(self.compacted(records))
+        super().extend(records)
+        if self.indexes:
+            self.addToIndexes(records)
+
+    def __iadd__(self, records: Iterable[dict]) -> 'ResourceCollection':
+        self.extend(records)
+        return self
+
+    def resetIndexes(self):
+        self.indexes = {}
+
+    def __setitem__(self, key, value):
+        if self.compactRecords:
+            value = compact(value) if isinstance(key, int) else self.compacted(value)
+        super().__setitem__(key, value)
+        self.resetIndexes()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.resetIndexes()
+
+    def insert(self, index: int, record: dict):
+        if self.compactRecords:
+            record = compact(record)
+        super().insert(index, record)
+        self.resetIndexes()
+
+    def remove(self, record: dict):
+        super().remove(record)
+        self.resetIndexes()
+
+    def pop(self, index: int = -1) -> dict:
+        record = super().pop(index)
+        self.resetIndexes()
+        return record
+
+    def clear(self):
+        super().clear()
+        self.resetIndexes()
+
+    def sort(self, *args, **kwargs):
+        super().sort(*args, **kwargs)
+        self.resetIndexes()
+
+    def reverse(self):
+        super().reverse()
+        self.resetIndexes()
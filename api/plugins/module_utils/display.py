@@ -34,6 +34,10 @@ class Display:
     def vvvvvv(self, msg, host=None):
         return self.verbose(msg, host=host, caplevel=5)
 
+    def warning(self, msg, formatted=False):
+        if self.display:
+            self.display.warning(msg, formatted)
+
     def debug(self, msg, host=None):
         if self.display:
             self.display.debug(msg, host)
@@ -1,8 +1,26 @@
 from __future__ import annotations
 
+import atexit
+import threading
+
+from .async_engine import HAS_AIOHTTP, AsyncEngine, Operation
+from .batching import BatchSizer
+from .broker import BrokerTransport
 from .display import Display
+from .operation_batch import OperationBatch, is_mutation, merge_operations, mergeable, split_result
+from .http_session import (
+    DEFAULT_COMPRESSION_MIN_SIZE,
+    DEFAULT_POOL_SIZE,
+    RETRIES,
+    PooledRequestsHTTPTransport,
+    shared_session,
+)
+from .schema_cache import SchemaCache, schema_from_file
+from .stitching import RelationStore
+from .streaming import CHUNK_SIZE, JsonStream
 from ansible.module_utils.errors import AnsibleValidationError
-from gql import Client, gql
+from ansible.module_utils.parsing.convert_bool import boolean
+from gql import Client, GraphQLRequest, gql
 from gql.dsl import (
   DSLExecutable,
   DSLField,
@@ -11,12 +29,19 @@ from gql.dsl import (
   DSLSchema, DSLType,
   dsl_gql
 )
-from gql.transport.exceptions import TransportQueryError
-from gql.transport.requests import RequestsHTTPTransport
+from gql.transport.exceptions import (
+    TransportProtocolError,
+    TransportQueryError,
+    TransportServerError,
+)
+from gql.transport.transport import Transport
 from graphql import (
+    DocumentNode,
     print_ast,
     GraphQLList,
+    OperationType,
     GraphQLOutputType,
+    GraphQLSchema,
     GraphQLUnionType,
 )
 from graphql.type.definition import (
@@ -28,8 +53,37 @@ from graphql.type.definition import (
     is_scalar_type,
     is_union_type,
 )
+from os import environ, getpid
 from random import randint
-from typing import Any, Dict, List, Optional, Union, cast
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from requests import Session
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union, cast
+from urllib3.util.request import ACCEPT_ENCODING
+
+# Client options that can be provided through 'lagoon_'-prefixed variables
+# (e.g, lagoon_api_schema_cache_ttl) or 'LAGOON_'-prefixed environment
+# variables, mapped to the GqlClient option name and its type.
+CLIENT_OPTIONS = {
+    'api_schema_file': ('schemaFile', 'str'),
+    'api_schema_cache_dir': ('schemaCacheDir', 'str'),
+    'api_schema_cache_ttl': ('schemaCacheTtl', 'int'),
+    'api_schema_cache_refresh': ('schemaCacheRefresh', 'bool'),
+    'api_broker': ('broker', 'bool'),
+    'api_broker_idle_timeout': ('brokerIdleTimeout', 'int'),
+    'api_broker_cache_ttl': ('brokerCacheTtl', 'int'),
+    'api_broker_rate_limit': ('brokerRateLimit', 'float'),
+    'api_concurrency': ('concurrency', 'int'),
+    'api_batch_target_latency': ('batchTargetLatency', 'float'),
+    'api_streaming': ('streaming', 'bool'),
+    'api_pool_size': ('poolSize', 'int'),
+    'api_async': ('async', 'bool'),
+    'api_operation_batching': ('operationBatching', 'bool'),
+    'api_operation_batch_window': ('operationBatchWindow', 'float'),
+    'api_persisted_queries': ('persistedQueries', 'bool'),
+    'api_compression': ('compression', 'bool'),
+    'api_compression_min_size': ('compressionMinSize', 'int'),
+}
 
 class GqlClient(Display):
     """ This client aims to facilitate the usage of the gql package, based on
@@ -39,38 +93,144 @@ class GqlClient(Display):
 
     checkMode: bool = False
 
+    # On-disk cache for the introspection result, if enabled.
+    schemaCache: SchemaCache = None
+
     def __init__(self, endpoint: str, token: str, headers: dict = {},
-                 display: Display = None, checkMode: bool = False) -> None:
+                 display: Display = None, checkMode: bool = False,
+                 options: dict = None) -> None:
         super().__init__()
 
+        self.options = options if options else {}
+
         if not isinstance(headers, dict):
             raise AnsibleValidationError("Expecting client headers to be dictionary.")
 
+        # Copied, not to share the headers set below with other clients.
+        headers = {**headers}
         headers['Content-Type'] = 'application/json'
         headers['Authorization'] = f"Bearer {token}"
 
+        # Compressed responses are accepted by default, in the encodings
+        # supported by the installed packages (gzip and deflate, brotli and
+        # zstd if available); this can be explicitly enabled or disabled.
+        if self.options.get('compression') is not None:
+            headers['Accept-Encoding'] = (
+                ACCEPT_ENCODING if self.options['compression'] else 'identity')
+
+        self.endpoint = endpoint
+        self.headers = headers
+
+        # Avoid the introspection query if a local schema file is provided or
+        # if the schema has been cached by a previous process.
+        schema = None
+        introspection = None
+        if self.options.get('schemaFile'):
+            schema = schema_from_file(
+                self.options.get('schemaFile'),
+                self.options.get('schemaCacheDir'))
+        elif self.options.get('schemaCacheTtl'):
+            self.schemaCache = SchemaCache(
+                endpoint,
+                self.options.get('schemaCacheDir'),
+                self.options.get('schemaCacheTtl'))
+            if self.options.get('schemaCacheRefresh'):
+                self.schemaCache.invalidate()
+            introspection = self.schemaCache.load()
+            self.vvv(f"GraphQL schema cache {'hit' if introspection else 'miss'} for {endpoint}")
+        self.schemaCached = introspection is not None
+
+        # Sizers for the batched queries, keyed by resource and batch label;
+        # see ResourceBase.batchSizer.
+        self.batchSizers: Dict[str, BatchSizer] = {}
+
+        # Relationships between the resources fetched so far, used to avoid
+        # fetching them again; see ResourceBase.fetchSubresources.
+        self.relations = RelationStore()
+
+        # A gql client (and its transport) can only be used by one thread at
+        # a time, so each thread gets its own; see the client property.
+        self.local = threading.local()
+        self.schemaLock = threading.Lock()
+        self.mainClient = self.newClient(schema, introspection)
+        self.client = self.mainClient
+
+        # Created on first use, when enabled; see engine.
+        self.asyncEngine: AsyncEngine = None
+        self.asyncEnginePid: int = None
+        self.asyncEngineLock = threading.Lock()
+
+        # Whether the server accepts arrays of operations, once known; see
+        # execute_batch.
+        self.arrayBatching: bool = None
+        if self.options.get('async') and not HAS_AIOHTTP:
+            self.warning("The async option requires the aiohttp package, using threads instead")
+
+        self.checkMode = checkMode
+
+        # This value of display if deprecated - use the Display class instead.
+        del display
+
+    @property
+    def client(self) -> Client:
+        """The gql client for the current thread.
+
+        If the schema has not been fetched yet, the first thread's client
+        fetches it for all the others rather than each doing so."""
+
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            with self.schemaLock:
+                client = self.newClient(self.mainClient.schema)
+                if client.schema is None and client.fetch_schema_from_transport:
+                    with client:
+                        pass
+                    self.mainClient.schema = client.schema
+                    self.mainClient.introspection = client.introspection
+            self.local.client = client
+        return client
+
+    @client.setter
+    def client(self, client: Client):
+        self.local.client = client
+
+    def newClient(self, schema: GraphQLSchema = None,
+                  introspection: Dict[str, Any] = None) -> Client:
+
         # There's not much reason to do async requests in the Ansible context,
-        # so we're defaulting to RequestsHTTPTransport.
+        # so we're defaulting to a RequestsHTTPTransport, using the session
+        # shared by the clients to keep the connections alive. Requests are
+        # made through the async engine instead when enabled; see engine.
         # See https://gql.readthedocs.io/en/latest/transports/index.html.
-        transport = RequestsHTTPTransport(
-            url=endpoint,
-            headers=headers,
-            verify=True,
-            retries=3,
-        )
+        # When enabled, requests are instead proxied through a local broker
+        # process shared by all Ansible forks.
+        transport = None
+        if self.options.get('broker'):
+            try:
+                transport = BrokerTransport(self.endpoint, self.headers, self.options)
+            except Exception as e:
+                self.warning(f"Unable to use the Lagoon API broker, connecting directly: {e}")
+
+        if transport is None:
+            transport = PooledRequestsHTTPTransport(
+                url=self.endpoint,
+                headers=self.headers,
+                verify=True,
+                retries=RETRIES,
+                poolSize=self.poolSize(),
+                persistedQueries=bool(self.options.get('persistedQueries')),
+                compressionMinSize=self.compressionMinSize(),
+            )
 
         # gql has the ability to fetch the schema directly from the GraphQL
         # server API, so we set the relevant argument.
-        self.client = Client(
+        return Client(
             transport=transport,
-            fetch_schema_from_transport=True
+            schema=schema,
+            introspection=introspection,
+            fetch_schema_from_transport=schema is None and introspection is None
         )
 
-        self.checkMode = checkMode
-
-        # This value of display if deprecated - use the Display class instead.
-        del display
-
     def __enter__(self):
         """This method and the next (__exit__) allow the use of the `with`
         statement with the class.
@@ -81,12 +241,23 @@ class GqlClient(Display):
 
         self.client.__enter__()
         assert self.client.schema is not None
+        self.cacheSchema()
         self.ds = DSLSchema(self.client.schema)
         return self.client.session, self.ds
 
     def __exit__(self, *args):
         self.client.__exit__(args)
 
+    def cacheSchema(self):
+        """Writes the schema fetched through introspection to the cache, if
+        enabled and not done already."""
+
+        if (self.schemaCache is None or self.schemaCached or
+                not self.client.introspection):
+            return
+        self.schemaCache.save(self.client.introspection)
+        self.schemaCached = True
+
     def execute_query(self, query: str, variables: Optional[Dict[str, Any]]={}) -> Dict[str, Any]:
         """Executes a query using the graphql string provided.
         """
@@ -97,8 +268,14 @@ class GqlClient(Display):
         if self.checkMode:
             return {'checkMode': True}
 
+        if any(getattr(d, 'operation', None) == OperationType.MUTATION
+               for d in query_ast.definitions):
+            # The relationships recorded so far may no longer be accurate.
+            self.relations.clear()
+
         try:
-            res = self.client.execute(query_ast, variable_values=variables)
+            res = self.execute_document(query_ast, variables)
+            self.cacheSchema()
             self.vvv(f"GraphQL query result: {res}\n\n")
             return res
         except TransportQueryError as e:
@@ -110,7 +287,296 @@ class GqlClient(Display):
             self.vvv(f"GraphQL TransportQueryError: {e}\n\n")
             return {'error': e}
 
-    def execute_query_dynamic(self, *operations: DSLExecutable) -> Dict[str, Any]:
+    def stream_query(self, query: DocumentNode, field: str,
+                     variables: Optional[Dict[str, Any]] = None) -> Iterator[Any]:
+        """Executes a query and yields the records of its top-level list
+        field (e.g, allEnvironments) as they are parsed from the response,
+        instead of once the whole response has been received and decoded.
+
+        GraphQL errors are raised as a TransportQueryError once the records
+        have been yielded, with an empty list for the field in its data.
+
+        Without the streaming option, or through the broker, the query is
+        executed as usual and the records yielded from the result.
+        """
+
+        self.vvv(f"GraphQL built query: \n{print_ast(query)}")
+
+        if (not self.options.get('streaming') or
+                isinstance(self.client.transport, BrokerTransport)):
+            res = self.client.execute(query, variable_values=variables)
+            self.vvv(f"GraphQL query result: {res}\n\n")
+            yield from res.get(field) or []
+            return
+
+        payload = {'query': print_ast(query)}
+        if variables:
+            payload['variables'] = variables
+        with self.session().post(
+                self.endpoint, json=payload, headers=self.headers,
+                stream=True) as response:
+            stream = JsonStream(response.iter_content(CHUNK_SIZE), ['data', field])
+            count = 0
+            try:
+                for record in stream.records():
+                    count += 1
+                    yield record
+                result = stream.document
+                if 'data' not in result and 'errors' not in result:
+                    raise ValueError('No "data" or "errors" keys in answer')
+            except ValueError as e:
+                # As raised by the gql transport.
+                if response.status_code >= 400:
+                    raise TransportServerError(
+                        f"{response.status_code} Server Error: {response.reason}",
+                        response.status_code) from e
+                raise TransportProtocolError(
+                    f"Server did not return a GraphQL result: {e}") from e
+
+        self.vvv(f"GraphQL query result: {count} {field} streamed\n\n")
+        if result.get('errors'):
+            raise TransportQueryError(
+                str(result['errors'][0]), errors=result['errors'],
+                data=result.get('data'), extensions=result.get('extensions'))
+
+    def execute_document(self, document: DocumentNode,
+                         variables: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Executes a parsed document, through the async engine if enabled."""
+
+        engine = self.engine()
+        if engine is not None:
+            return engine.execute(document, variables)
+        res = self.client.execute(document, variable_values=variables)
+        self.logTransfer()
+        return res
+
+    def execute_many(self, operations: List[Union[str, DocumentNode, Operation]],
+                     concurrency: int = None) -> List[Union[Dict[str, Any], Exception]]:
+        """Executes many queries or mutations at once - each a query string
+        or parsed document, or a tuple of one and its variables.
+
+        Up to concurrency operations (by default the concurrency option) are
+        in flight at a time: on the async engine's loop if enabled, or else
+        in a pool of threads. The results are returned in the order of the
+        operations, with the exception raised in place of those which failed
+        (or the partial data for errors of the 'not found' kind, as for
+        execute_query) - so that the caller can handle each of them.
+        """
+
+        documents = self.operation_documents(operations)
+        if self.checkMode:
+            return [{'checkMode': True} for _ in documents]
+
+        concurrency = max(concurrency or self.options.get('concurrency') or 1, 1)
+        engine = self.engine()
+        if engine is not None:
+            results = engine.execute_many(documents, concurrency)
+        else:
+            def execute(operation: Operation):
+                try:
+                    return self.client.execute(operation[0], variable_values=operation[1])
+                except Exception as e:
+                    return e
+
+            if concurrency <= 1 or len(documents) <= 1:
+                results = [execute(o) for o in documents]
+            else:
+                with ThreadPoolExecutor(max_workers=min(concurrency, len(documents))) as executor:
+                    results = list(executor.map(execute, documents))
+
+        return self.operation_results(results)
+
+    def operation_documents(self, operations: List[Union[str, DocumentNode, Operation]]) -> List[Operation]:
+        """Parses the operations passed to execute_many or execute_batch,
+        and clears the recorded relationships if any is a mutation."""
+
+        documents = []
+        for operation in operations:
+            document, variables = operation if isinstance(operation, tuple) else (operation, None)
+            if isinstance(document, str):
+                document = gql(document)
+            self.vvv(f"GraphQL built query: \n{print_ast(document)}")
+            self.vvv(f"GraphQL query variables: \n{variables}")
+            documents.append((document, variables))
+
+        if not self.checkMode and any(is_mutation(d) for d, _ in documents):
+            self.relations.clear()
+        return documents
+
+    def operation_results(self, results: list) -> list:
+        for i, res in enumerate(results):
+            if isinstance(res, TransportQueryError) and 'not found' in str(res):
+                results[i] = res.data
+            self.vvv(f"GraphQL query result: {results[i]}\n\n")
+        return results
+
+    def batch(self) -> OperationBatch:
+        """Queues operations to send them together; see OperationBatch."""
+
+        return OperationBatch(self, self.options.get('operationBatchWindow') or 0)
+
+    def execute_batch(self, operations: List[Union[str, DocumentNode, Operation]]) -> List[Union[Dict[str, Any], Exception]]:
+        """Executes several independent operations in as few requests as
+        possible, when the operationBatching option is enabled - or else one
+        after the other. The results are returned as by execute_many.
+
+        The mutations are merged into a single one (see merge_operations),
+        so that they are still applied in order, and sent along with the
+        queries in a single request as a JSON array. If the server does not
+        support arrays of operations, the queries are merged as well and the
+        merged operations sent one after the other.
+        """
+
+        documents = self.operation_documents(operations)
+        if self.checkMode:
+            return [{'checkMode': True} for _ in documents]
+
+        def execute(document: DocumentNode, variables: Optional[Dict[str, Any]]):
+            try:
+                return self.execute_document(document, variables)
+            except Exception as e:
+                return e
+
+        if not self.options.get('operationBatching') or len(documents) <= 1:
+            return self.operation_results([execute(d, v) for d, v in documents])
+
+        # Units of work, each a document to send and the indexes of the
+        # operations it is made of (more than one if merged).
+        def units(mergeQueries: bool) -> List[Tuple[Operation, List[int]]]:
+            mutations = [i for i, (d, _) in enumerate(documents)
+                         if is_mutation(d) and mergeable(d)]
+            queries = [i for i, (d, _) in enumerate(documents)
+                       if mergeQueries and not is_mutation(d) and mergeable(d)]
+            merged = [(merge_operations([documents[i] for i in indexes]), indexes)
+                      for indexes in [queries, mutations] if len(indexes) > 1]
+            mergedIndexes = [i for _, indexes in merged for i in indexes]
+            return merged + [(documents[i], [i]) for i in range(len(documents))
+                             if i not in mergedIndexes]
+
+        results = [None] * len(documents)
+        def record(unit: Tuple[Operation, List[int]], res):
+            (document, _), indexes = unit
+            if len(indexes) == 1:
+                results[indexes[0]] = res
+                return
+
+            if isinstance(res, TransportQueryError) and res.data is None and not is_mutation(document):
+                # An invalid query fails all those merged with it, which
+                # are sent on their own instead.
+                split = [execute(*documents[i]) for i in indexes]
+            elif isinstance(res, TransportQueryError):
+                split = split_result(len(indexes), res.data, res.errors)
+            elif isinstance(res, Exception):
+                split = [res] * len(indexes)
+            else:
+                split = split_result(len(indexes), res)
+            for i, r in zip(indexes, split):
+                results[i] = r
+
+        if self.arrayBatching is not False and self.supportsArrayBatching():
+            batchUnits = units(mergeQueries=False)
+            try:
+                # The thread's client may be connected already (e.g, by a
+                # caller's with block), in which case its session is reused.
+                connected = getattr(self.client.transport, 'session', None) is not None
+                with nullcontext() if connected else self.client:
+                    answers = self.client.transport.execute_batch([
+                        GraphQLRequest(document, variable_values=variables)
+                        for (document, variables), _ in batchUnits])
+                self.arrayBatching = True
+                for unit, answer in zip(batchUnits, answers):
+                    record(unit, TransportQueryError(
+                        str(answer.errors[0]), errors=answer.errors,
+                        data=answer.data, extensions=answer.extensions)
+                        if answer.errors else answer.data)
+                return self.operation_results(results)
+            except (TransportProtocolError, TransportServerError) as e:
+                # Servers without support for arrays reject them as invalid.
+                if self.arrayBatching or (isinstance(e, TransportServerError) and
+                                          e.code is not None and e.code >= 500):
+                    return self.operation_results([e] * len(documents))
+                self.vvv(f"Arrays of operations not supported by the server ({e}), merging them instead")
+                self.arrayBatching = False
+            except Exception as e:
+                return self.operation_results([e] * len(documents))
+
+        for unit in units(mergeQueries=True):
+            record(unit, execute(*unit[0]))
+        return self.operation_results(results)
+
+    def supportsArrayBatching(self) -> bool:
+        """Whether the transport can send arrays of operations."""
+
+        transport = self.client.transport
+        return type(transport).execute_batch is not Transport.execute_batch
+
+    def engine(self) -> Optional[AsyncEngine]:
+        """The async engine executing the requests, if the async option is
+        enabled and aiohttp available - and unless they go through the
+        broker. Forked processes get their own.
+
+        Only execute_many runs several operations at once on the engine's
+        loop; ResourceBase.fetchInBatches still fetches its batches from a
+        pool of threads, each waiting on the engine for its request."""
+
+        if (not self.options.get('async') or not HAS_AIOHTTP or
+                isinstance(self.mainClient.transport, BrokerTransport)):
+            return None
+
+        with self.asyncEngineLock:
+            if self.asyncEngine is None or self.asyncEnginePid != getpid():
+                self.asyncEngine = AsyncEngine(
+                    self.endpoint, self.headers,
+                    self.client.schema or self.mainClient.schema,
+                    self.poolSize())
+                self.asyncEnginePid = getpid()
+                atexit.register(self.asyncEngine.close)
+            return self.asyncEngine
+
+    def compressionMinSize(self) -> Optional[int]:
+        """The size from which the request bodies are compressed, if the
+        compression is enabled."""
+
+        if not self.options.get('compression'):
+            return None
+        minSize = self.options.get('compressionMinSize')
+        return DEFAULT_COMPRESSION_MIN_SIZE if minSize is None else minSize
+
+    def logTransfer(self):
+        """Reports the size of the last request and response, and how much
+        was saved by compressing them."""
+
+        transport = self.client.transport
+        transfer = getattr(transport, 'lastTransfer', None)
+        if not isinstance(transfer, dict):
+            return
+        transport.lastTransfer = None
+
+        def saved(compressed: int, uncompressed: int) -> str:
+            if not uncompressed or compressed >= uncompressed:
+                return "uncompressed"
+            return f"{uncompressed - compressed} bytes ({100 - compressed * 100 // uncompressed}%) saved"
+
+        self.vvv(
+            f"GraphQL transfer: sent {transfer['sentBytes']} bytes for "
+            f"{transfer['requestBytes']}, {saved(transfer['sentBytes'], transfer['requestBytes'])}; "
+            f"received {transfer['receivedBytes']} bytes for {transfer['responseBytes']}, "
+            f"{saved(transfer['receivedBytes'], transfer['responseBytes'])}")
+
+    def session(self) -> Session:
+        """The HTTP session shared by the clients; see shared_session."""
+
+        return shared_session(self.poolSize())
+
+    def poolSize(self) -> int:
+        """The number of connections kept alive, which should be enough for
+        the concurrent requests."""
+
+        return self.options.get('poolSize') or max(
+            DEFAULT_POOL_SIZE, self.options.get('concurrency') or 1)
+
+    def execute_query_dynamic(self, *operations: DSLExecutable,
+                              variables: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Executes a dynamic query with the open session.
 
         See https://gql.readthedocs.io/en/latest/advanced/dsl_module.html for
@@ -120,11 +586,15 @@ class GqlClient(Display):
         ----------
         operations : DSLExecutable, required
             A tuple of DSLQuery and/or DSLFragment.
+        variables : dict, optional
+            The values of the operations' variables, if any.
         """
 
         # Generate the full query.
         full_query = dsl_gql(*operations)
         self.vvv(f"GraphQL built query: \n{print_ast(full_query)}")
+        if variables:
+            self.vvv(f"GraphQL query variables: \n{variables}")
 
         opName = operations[0].selection_set.selections[0].name.value
         if self.checkMode and isinstance(operations[0], DSLMutation):
@@ -134,8 +604,15 @@ class GqlClient(Display):
             else:
                 res = {opName: {'id': -1 * randint(1, 1000)}}
         else:
+            if any(isinstance(o, DSLMutation) for o in operations):
+                self.relations.clear()
             try:
-                res = self.client.session.execute(full_query)
+                engine = self.engine()
+                if engine is not None:
+                    res = engine.execute(full_query, variables)
+                else:
+                    res = self.client.session.execute(full_query, variable_values=variables)
+                    self.logTransfer()
             except TransportQueryError as e:
                 # In some cases (groupByName), an error is returned when
                 # not found, whereas in others it's just an empty result
@@ -300,13 +777,40 @@ class GqlClient(Display):
 
 globalClient: GqlClient = None
 def GetClientInstance(endpoint: str, token: str, headers: dict = {},
-                      checkMode: bool = False) -> GqlClient:
+                      checkMode: bool = False, options: dict = None) -> GqlClient:
 
     global globalClient
     if not globalClient:
-        globalClient = GqlClient(endpoint, token, headers, checkMode=checkMode)
+        globalClient = GqlClient(endpoint, token, headers,
+                                 checkMode=checkMode, options=options)
     return globalClient
 
+def client_options(getVar: Callable[[str], Any]) -> dict:
+    """
+    Builds the GqlClient options from the CLIENT_OPTIONS names.
+
+    getVar is called with the unprefixed option name (e.g, api_schema_cache_ttl)
+    and should return the value set by the user, or None. Environment variables
+    (e.g, LAGOON_API_SCHEMA_CACHE_TTL) are used as a fallback.
+    """
+
+    options = {}
+    for name, (option, optionType) in CLIENT_OPTIONS.items():
+        val = getVar(name)
+        if val is None or val == '':
+            val = environ.get(f"LAGOON_{name.upper()}")
+        if val is None or val == '':
+            continue
+
+        if optionType == 'int':
+            val = int(val)
+        elif optionType == 'float':
+            val = float(val)
+        elif optionType == 'bool':
+            val = boolean(val)
+        options[option] = val
+    return options
+
 class ProxyLookup(Display):
     """This class aims to facilitate the lookup of records in the Lagoon API
     by providing a simple interface to build and execute queries."""
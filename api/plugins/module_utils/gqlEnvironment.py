@@ -1,12 +1,14 @@
 from .gqlResourceBase import CLUSTER_FIELDS, DEFAULT_BATCH_SIZE, DEPLOYMENTS_FIELDS, ENVIRONMENTS_FIELDS, PROJECT_FIELDS, ResourceBase, VARIABLES_FIELDS
+from .collection import ResourceCollection
 from .gql import GqlClient
 from .gqlProject import Project
 
 from ansible.errors import AnsibleError
-from gql.dsl import DSLQuery
+from gql import gql
+from gql.dsl import DSLField, DSLQuery, DSLSchema
 from gql.transport.exceptions import TransportQueryError
 from time import sleep
-from typing import List
+from typing import Callable, Dict, List
 from typing_extensions import Self
 
 
@@ -16,9 +18,23 @@ class Environment(ResourceBase):
         super().__init__(client, options)
         self.environments = []
 
-    def all(self, fields: List[str] = None, batch_size: int = DEFAULT_BATCH_SIZE) -> Self:
+    @property
+    def environments(self) -> ResourceCollection:
+        return self._environments
+
+    @environments.setter
+    def environments(self, environments: List[dict]):
+        # Plain lists are still accepted, and indexed from then on.
+        if not isinstance(environments, ResourceCollection):
+            environments = ResourceCollection(
+                environments, self.options.get('compactRecords', False))
+        self._environments = environments
+
+    def all(self, fields: List[str] = None, batch_size: int = DEFAULT_BATCH_SIZE,
+            environmentType: str = None) -> Self:
         """
-        Get a list of all environments, but only top level fields.
+        Get a list of all environments, optionally of the given type only,
+        but only top level fields.
 
         This method first tries using the allEnvironments query, and if it fails
         due to lack of permissions, it fetches all projects instead.
@@ -28,20 +44,30 @@ class Environment(ResourceBase):
             fields = ENVIRONMENTS_FIELDS
 
         joined_fields = "\n        ".join(fields)
-
-        query = f"""query {{
-    allEnvironments {{
+        params = args = ""
+        variables = {}
+        if environmentType:
+            params = " ($type: EnvType)"
+            args = "(type: $type)"
+            variables['type'] = environmentType.upper()
+
+        query = f"""query{ params } {{
+    allEnvironments{ args } {{
         { joined_fields }
     }}
 }}"""
 
         try:
-            res = self.client.execute_query(query)
-            self.environments.extend(res['allEnvironments'])
+            if self.client.options.get('streaming'):
+                self.streamTopLevelField(
+                    self.environments, gql(query), 'allEnvironments', variables)
+            else:
+                res = self.client.execute_query(query, variables)
+                self.environments.extend(res['allEnvironments'])
         except TransportQueryError as e:
             self.v(f"{e.errors}")
             if e.errors[0]['message'] == 'Unauthorized: You don\'t have permission to "viewAll" on "environment": {}':
-                return self.allThroughProjects(fields, batch_size)
+                return self.allThroughProjects(fields, batch_size, environmentType)
             elif e.data and isinstance(e.data['allEnvironments'], list):
                 self.environments.extend(e.data['allEnvironments'])
                 self.errors.extend(e.errors)
@@ -52,12 +78,16 @@ class Environment(ResourceBase):
 
         return self
 
-    def allThroughProjects(self, fields: List[str] = None, batch_size: int = DEFAULT_BATCH_SIZE) -> Self:
+    def allThroughProjects(self, fields: List[str] = None, batch_size: int = DEFAULT_BATCH_SIZE,
+                           environmentType: str = None) -> Self:
         """
         Get a list of all environments, but going through projects first.
         """
 
-        projects = Project(self.client, self.options).all(
+        options = self.options
+        if environmentType:
+            options = {**options, 'environmentType': environmentType}
+        projects = Project(self.client, options).all(
             ).withEnvironments(fields, batch_size).projects
 
         for p in projects:
@@ -65,6 +95,77 @@ class Environment(ResourceBase):
 
         return self
 
+    def allCreatedAfter(self, createdAfter: str, fields: List[str] = None,
+                        environmentType: str = None) -> Self:
+        """
+        Get the environments created after the given date, optionally of the
+        given type only, with the name of their project.
+
+        Unlike all(), there is no fallback for users without permission to
+        view all the environments.
+        """
+
+        if not fields:
+            fields = ENVIRONMENTS_FIELDS
+
+        args = {'createdAfter': createdAfter}
+        if environmentType:
+            args['type'] = environmentType.upper()
+
+        with self.client:
+            queryObj = self.client.build_dynamic_query(
+                'allEnvironments', 'Environment', args, fields,
+                {'project': {'type': 'Project', 'fields': ['name']}})
+            res = self.client.execute_query_dynamic(DSLQuery(queryObj))
+            self.environments.extend(res['allEnvironments'] or [])
+
+        return self
+
+    def byKubernetes(self, clusters: List[int], fields: List[str] = None,
+                     environmentType: str = None, createdAfter: str = None,
+                     shard: Callable[[int, List[dict]], None] = None) -> Self:
+        """
+        Get the environments deployed to the given clusters (by id), with the
+        name of their project.
+
+        Each cluster is a separate shard, fetched in its own request;
+        concurrency() shards are fetched at once. shard, if given, is called
+        with the cluster id and its environments as soon as they are
+        fetched, e.g to enrich them while the other shards are fetched.
+        """
+
+        if not fields:
+            fields = ENVIRONMENTS_FIELDS
+
+        args = {}
+        if environmentType:
+            args['type'] = environmentType.upper()
+        if createdAfter:
+            args['createdAfter'] = createdAfter
+
+        def fetchShard(batch: List[int]) -> Dict[int, List[dict]]:
+            res = {}
+            for cluster in batch:
+                with self.client:
+                    queryObj = self.client.build_dynamic_query(
+                        'environmentsByKubernetes', 'Environment',
+                        {'kubernetes': {'id': cluster}, **args}, fields,
+                        {'project': {'type': 'Project', 'fields': ['name']}})
+                    envs = self.client.execute_query_dynamic(
+                        DSLQuery(queryObj))['environmentsByKubernetes'] or []
+                if shard:
+                    shard(cluster, envs)
+                res[cluster] = envs
+            return res
+
+        shards = self.fetchInBatches(
+            clusters, fetchShard, 1, "environments by cluster",
+            "Error fetching environments by cluster", pinned=True)
+        for cluster in clusters:
+            self.environments.extend(shards.get(cluster) or [])
+
+        return self
+
     def byNs(self, ns: str, fields: List[str] = None) -> Self:
         """
         Get the top-level information for an environment by k8s namespace.
@@ -128,254 +229,146 @@ class Environment(ResourceBase):
 
         return self
 
-    def withCluster(self, fields: List[str] = None, batch_size: int = DEFAULT_BATCH_SIZE) -> Self:
+    def withSubresources(self, plan: Dict[str, List[str]], batch_size: int = DEFAULT_BATCH_SIZE) -> Self:
         """
-        Retrieve cluster information for the environments.
-        """
-
-        if not len(self.environments):
-            return self
-
-        env_names = [e['kubernetesNamespaceName'] for e in self.environments]
+        Retrieve several subresources of the environments at once.
 
-        batches = []
-        for i in range(0, len(env_names), batch_size):
-            batches.append(env_names[i:i+batch_size])
+        The plan maps the subresources (cluster, variables, project,
+        deployments) to the fields to retrieve, or None for the default ones;
+        they are all selected in a single query per batch of environments.
+        """
 
-        clusters = {}
-        for i, b in enumerate(batches):
-            self.v(f"Fetching cluster for batch {i+1}/{len(batches)}")
-            clusters.update(self.getCluster(b, fields))
-            self.raiseExceptionIfRequired("Error fetching environment cluster")
+        self.fetchSubresources(
+            self.environments, 'kubernetesNamespaceName',
+            'environmentByKubernetesNamespaceName', 'kubernetesNamespaceName',
+            plan, batch_size, "Error fetching environment")
+        return self
 
-        for environment in self.environments:
-            ns = environment['kubernetesNamespaceName']
-            environment['kubernetes'] = clusters.get(ns)
-            environment['openshift'] = clusters.get(ns)
+    def withCluster(self, fields: List[str] = None, batch_size: int = DEFAULT_BATCH_SIZE) -> Self:
+        """
+        Retrieve cluster information for the environments.
+        """
 
-        return self
+        return self.withSubresources({'cluster': fields}, batch_size)
 
     def withVariables(self, fields: List[str] = None, batch_size: int = DEFAULT_BATCH_SIZE) -> Self:
         """
         Retrieve the environments' variables.
         """
 
-        if not len(self.environments):
-            return self
-
-        env_names = [e['kubernetesNamespaceName'] for e in self.environments]
-
-        batches = []
-        for i in range(0, len(env_names), batch_size):
-            batches.append(env_names[i:i+batch_size])
-
-        environmentVars = {}
-        for i, b in enumerate(batches):
-            self.v(
-                f"Fetching variables for batch {i+1}/{len(batches)}")
-            environmentVars.update(self.getVariables(b, fields))
-            self.raiseExceptionIfRequired("Error fetching environment variables")
-
-        for environment in self.environments:
-            environment['envVariables'] = environmentVars.get(
-                environment['kubernetesNamespaceName'])
-
-        return self
+        return self.withSubresources({'variables': fields}, batch_size)
 
     def withProject(self, fields: List[str] = None, batch_size: int = DEFAULT_BATCH_SIZE) -> Self:
         """
         Retrieve the environments' project.
         """
 
-        if not len(self.environments):
-            return self
-
-        env_names = [e['kubernetesNamespaceName'] for e in self.environments]
-
-        batches = []
-        for i in range(0, len(env_names), batch_size):
-            batches.append(env_names[i:i+batch_size])
-
-        envProject = {}
-        for i, b in enumerate(batches):
-            self.v(
-                f"Fetching project for batch {i+1}/{len(batches)}")
-            envProject.update(self.getProject(b, fields))
-            self.raiseExceptionIfRequired(
-                "Error fetching environment project")
-
-        for environment in self.environments:
-            environment['project'] = envProject.get(
-                environment['kubernetesNamespaceName'])
-
-        return self
+        return self.withSubresources({'project': fields}, batch_size)
 
     def withDeployments(self, fields: List[str] = None, batch_size: int = DEFAULT_BATCH_SIZE) -> Self:
         """
         Retrieve the environments' deployments.
         """
 
-        if not len(self.environments):
-            return self
-
-        env_names = [e['kubernetesNamespaceName'] for e in self.environments]
-
-        batches = []
-        for i in range(0, len(env_names), batch_size):
-            batches.append(env_names[i:i+batch_size])
-
-        envDeployments = {}
-        for i, b in enumerate(batches):
-            self.v(
-                f"Fetching deployments for batch {i+1}/{len(batches)}")
-            envDeployments.update(self.getDeployments(b, fields))
-            self.raiseExceptionIfRequired("Error fetching deployments")
+        return self.withSubresources({'deployments': fields}, batch_size)
+
+    def subresources(self) -> Dict[str, dict]:
+        return {
+            'cluster': {
+                'label': "cluster",
+                'error': "Error fetching environment cluster",
+                'selection': self.clusterSelection,
+                'field': 'kubernetes',
+                'keys': ['kubernetes', 'openshift'],
+                'get': self.getCluster,
+            },
+            'variables': {
+                'label': "variables",
+                'error': "Error fetching environment variables",
+                'selection': self.variablesSelection,
+                'field': 'envVariables',
+                'keys': ['envVariables'],
+                'get': self.getVariables,
+            },
+            'project': {
+                'label': "project",
+                'error': "Error fetching environment project",
+                'selection': self.projectSelection,
+                'field': 'project',
+                'keys': ['project'],
+                'get': self.getProject,
+                'local': self.localProject,
+                'record': self.recordProject,
+            },
+            'deployments': {
+                'label': "deployments",
+                'error': "Error fetching deployments",
+                'selection': self.deploymentsSelection,
+                'field': 'deployments',
+                'keys': ['deployments'],
+                'get': self.getDeployments,
+            },
+        }
 
-        for environment in self.environments:
-            environment['deployments'] = envDeployments.get(
-                environment['kubernetesNamespaceName'])
+    def localProject(self, ns: str, fields: List[str] = None) -> dict:
+        if not fields or not len(fields):
+            fields = PROJECT_FIELDS
 
-        return self
+        return self.client.relations.parent('Environment', ns, 'Project', fields)
 
-    def getCluster(self, env_names: List[str], fields: List[str] = None) -> List[dict]:
-        res = {}
+    def recordProject(self, environment: dict, project: dict):
+        if project and environment.get('kubernetesNamespaceName'):
+            self.client.relations.addParent(
+                'Environment', environment['kubernetesNamespaceName'],
+                'Project', project)
 
+    def clusterSelection(self, ds: DSLSchema, fields: List[str] = None) -> DSLField:
         if not fields or not len(fields):
             fields = CLUSTER_FIELDS
 
-        resources = {}
-        with self.client as (_, ds):
-            # Build the fragment.
-            cluster_fields = ds.Environment.kubernetes.select(
-                getattr(ds.Kubernetes, fields[0]))
-            if len(fields) > 1:
-                for f in fields[1:]:
-                    cluster_fields.select(getattr(ds.Kubernetes, f))
-
-            field_queries = []
-            for eName in env_names:
-                # Build the main query.
-                field_query = ds.Query.environmentByKubernetesNamespaceName.args(
-                    kubernetesNamespaceName=eName).alias(
-                        self.sanitiseForQueryAlias(eName))
-                field_query.select(cluster_fields)
-                field_queries.append(field_query)
-
-            resources = self.queryResources(DSLQuery(*field_queries))
-
-        for eName in env_names:
-            try:
-                res[eName] = resources.get(
-                    self.sanitiseForQueryAlias(eName))['kubernetes']
-            except:
-                res[eName] = None
-
-        return res
-
-    def getVariables(self, env_names: List[str], fields: List[str] = None) -> List[dict]:
-        res = {}
+        return ds.Environment.kubernetes.select(
+            *[getattr(ds.Kubernetes, f) for f in fields])
 
+    def variablesSelection(self, ds: DSLSchema, fields: List[str] = None) -> DSLField:
         if not fields or not len(fields):
             fields = VARIABLES_FIELDS
 
-        resources = {}
-        with self.client as (_, ds):
-            # Build the fragment.
-            var_fields = ds.Environment.envVariables.select(
-                getattr(ds.EnvKeyValue, fields[0]))
-            if len(fields) > 1:
-                for f in fields[1:]:
-                    var_fields.select(getattr(ds.EnvKeyValue, f))
-
-            field_queries = []
-            for eName in env_names:
-                # Build the main query.
-                field_query = ds.Query.environmentByKubernetesNamespaceName.args(
-                    kubernetesNamespaceName=eName).alias(
-                        self.sanitiseForQueryAlias(eName))
-                field_query.select(var_fields)
-                field_queries.append(field_query)
-
-            resources = self.queryResources(DSLQuery(*field_queries))
-
-        for eName in env_names:
-            try:
-                res[eName] = resources.get(
-                    self.sanitiseForQueryAlias(eName))['envVariables']
-            except:
-                res[eName] = None
-
-        return res
-
-    def getProject(self, env_names: List[str], fields: List[str] = None) -> List[dict]:
-        res = {}
+        return ds.Environment.envVariables.select(
+            *[getattr(ds.EnvKeyValue, f) for f in fields])
 
+    def projectSelection(self, ds: DSLSchema, fields: List[str] = None) -> DSLField:
         if not fields or not len(fields):
             fields = PROJECT_FIELDS
 
-        resources = {}
-        with self.client as (_, ds):
-            # Build the fragment.
-            project_fields = ds.Environment.project.select(
-                getattr(ds.Project, fields[0]))
-            if len(fields) > 1:
-                for f in fields[1:]:
-                    project_fields.select(getattr(ds.Project, f))
-
-            field_queries = []
-            for eName in env_names:
-                # Build the main query.
-                field_query = ds.Query.environmentByKubernetesNamespaceName.args(
-                    kubernetesNamespaceName=eName).alias(
-                        self.sanitiseForQueryAlias(eName))
-                field_query.select(project_fields)
-                field_queries.append(field_query)
-
-            resources = self.queryResources(DSLQuery(*field_queries))
-
-        for eName in env_names:
-            try:
-                res[eName] = resources.get(
-                    self.sanitiseForQueryAlias(eName))['project']
-            except:
-                res[eName] = None
-
-        return res
-
-    def getDeployments(self, env_names: List[str], fields: List[str] = None) -> List[dict]:
-        res = {}
+        return ds.Environment.project.select(
+            *[getattr(ds.Project, f) for f in fields])
 
+    def deploymentsSelection(self, ds: DSLSchema, fields: List[str] = None) -> DSLField:
         if not fields or not len(fields):
             fields = DEPLOYMENTS_FIELDS
 
-        resources = {}
-        with self.client as (_, ds):
-            # Build the fragment.
-            deployment_fields = ds.Environment.deployments.select(
-                getattr(ds.Deployment, fields[0]))
-            if len(fields) > 1:
-                for f in fields[1:]:
-                    deployment_fields.select(getattr(ds.Deployment, f))
-
-            field_queries = []
-            for eName in env_names:
-                # Build the main query.
-                field_query = ds.Query.environmentByKubernetesNamespaceName.args(
-                    kubernetesNamespaceName=eName).alias(
-                        self.sanitiseForQueryAlias(eName))
-                field_query.select(deployment_fields)
-                field_queries.append(field_query)
-
-            resources = self.queryResources(DSLQuery(*field_queries))
-
-        for eName in env_names:
-            try:
-                res[eName] = resources.get(
-                    self.sanitiseForQueryAlias(eName))['deployments']
-            except:
-                res[eName] = None
-
-        return res
+        return ds.Environment.deployments.select(
+            *[getattr(ds.Deployment, f) for f in fields])
+
+    def queryByNs(self, env_names: List[str],
+                  selection: Callable[[DSLSchema, List[str]], DSLField],
+                  fields: List[str], field: str) -> dict:
+        resources = self.queryByAlias(
+            'environmentByKubernetesNamespaceName', 'kubernetesNamespaceName',
+            env_names, lambda ds: [selection(ds, fields)])
+        return {n: r.get(field) if r else None for n, r in resources.items()}
+
+    def getCluster(self, env_names: List[str], fields: List[str] = None) -> dict:
+        return self.queryByNs(env_names, self.clusterSelection, fields, 'kubernetes')
+
+    def getVariables(self, env_names: List[str], fields: List[str] = None) -> dict:
+        return self.queryByNs(env_names, self.variablesSelection, fields, 'envVariables')
+
+    def getProject(self, env_names: List[str], fields: List[str] = None) -> dict:
+        return self.queryByNs(env_names, self.projectSelection, fields, 'project')
+
+    def getDeployments(self, env_names: List[str], fields: List[str] = None) -> dict:
+        return self.queryByNs(env_names, self.deploymentsSelection, fields, 'deployments')
 
     def delete(self, project_name: str, environment_name: str) -> bool:
         res = self.client.execute_query("""
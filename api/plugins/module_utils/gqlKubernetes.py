@@ -0,0 +1,25 @@
+from .collection import ResourceCollection
+from .gql import GqlClient
+from .gqlResourceBase import CLUSTER_FIELDS, ResourceBase
+
+from typing import List
+from typing_extensions import Self
+
+
+class Kubernetes(ResourceBase):
+
+    def __init__(self, client: GqlClient, options: dict = {}) -> None:
+        super().__init__(client, options)
+        self.clusters = ResourceCollection(
+            compactRecords=self.options.get('compactRecords', False))
+
+    def all(self, fields: List[str] = None) -> Self:
+        """
+        Get a list of all the clusters (deploy targets).
+        """
+
+        if not fields:
+            fields = CLUSTER_FIELDS
+
+        return self.queryTopLevelFields(
+            self.clusters, 'allKubernetes', 'Kubernetes', fields=fields)
@@ -4,8 +4,31 @@ from .gql import GqlClient
 from .gqlResourceBase import ResourceBase
 
 
-from gql.dsl import DSLQuery
-from typing import List, Union
+from typing import Dict, List, Union
+
+UPDATE_MUTATION = """
+    mutation UpdateMetadata(
+        $id: Int!,
+        $key: String!,
+        $value: String!
+    ) {
+        updateProjectMetadata(input: {
+            id: $id,
+            patch: {
+                key: $key,
+                value: $value
+            }
+        }) {
+            metadata
+        }
+    }"""
+
+REMOVE_MUTATION = """
+    mutation RemoveMeta($id: Int!, $key: String!) {
+        removeProjectMetadataByKey(input: { id: $id, key: $key }) {
+            id
+        }
+    }"""
 
 class Metadata(ResourceBase):
 
@@ -18,20 +41,13 @@ class Metadata(ResourceBase):
         if len(project_names) > 0:
             resources = {}
             with self.client as (_, ds):
-                field_queries = []
-                for pName in project_names:
-                    # Build the main query.
-                    field_query = ds.Query.projectByName.args(
-                        name=pName).alias(self.sanitiseForQueryAlias(pName))
-                    field_query.select(ds.Project.metadata)
-                    field_queries.append(field_query)
-
-                resources = self.queryResources(DSLQuery(*field_queries))
+                operation, variables, aliases = self.aliasedQuery(
+                    ds, 'projectByName', 'name', project_names, [ds.Project.metadata])
+                resources = self.queryResources(operation, variables=variables)
 
             for pName in project_names:
                 try:
-                    metadata = resources.get(
-                        self.sanitiseForQueryAlias(pName)).get(
+                    metadata = resources.get(aliases[pName]).get(
                             'projectByName', {}).get('metadata', None)
                     if not isinstance(metadata, dict):
                         metadata = json.loads(metadata)
@@ -62,34 +78,37 @@ class Metadata(ResourceBase):
         return res
 
     def update(self, project_id: int, key: str, value: Union[str, list, dict]) -> dict:
+        res = self.client.execute_query(
+            UPDATE_MUTATION, self.updateVariables(project_id, key, value))
+        return self.updateResult(key, res)
+
+    def updateMany(self, project_id: int, values: Dict[str, Union[str, list, dict]]) -> dict:
+        """
+        Sets the metadata keys concurrently, or in a batch (see
+        executeMany); returns, by key, the result as for update, or the
+        exception raised.
+        """
+
+        keys = list(values.keys())
+        results = self.executeMany([
+            (UPDATE_MUTATION, self.updateVariables(project_id, key, values[key]))
+            for key in keys])
+        return {key: res if isinstance(res, Exception) else self.updateResult(key, res)
+                for key, res in zip(keys, results)}
+
+    def updateVariables(self, project_id: int, key: str, value: Union[str, list, dict]) -> dict:
         # Encode non-string values.
         if not isinstance(value, str):
             value = json.dumps(value)
-        res = self.client.execute_query(
-            """
-            mutation UpdateMetadata(
-                $id: Int!,
-                $key: String!,
-                $value: String!
-            ) {
-                updateProjectMetadata(input: {
-                    id: $id,
-                    patch: {
-                        key: $key,
-                        value: $value
-                    }
-                }) {
-                    metadata
-                }
-            }""",
-            {
-                "id": project_id,
-                "key": key,
-                "value": value
-            }
-        )
-        metadata = res.get('updateProjectMetadata',
-                               {}).get('metadata', None)
+        return {
+            "id": project_id,
+            "key": key,
+            "value": value
+        }
+
+    def updateResult(self, key: str, res: dict) -> str:
+        # The update may have failed, with partial data.
+        metadata = (res.get('updateProjectMetadata') or {}).get('metadata', None)
         if not metadata:
             return f'{key}:null'
 
@@ -99,17 +118,20 @@ class Metadata(ResourceBase):
         return f"{key}:{metadata.get(key, 'null')}"
 
     def remove(self, project_id: int, key: str) -> bool:
-        self.client.execute_query(
-            """
-            mutation RemoveMeta($id: Int!, $key: String!) {
-                removeProjectMetadataByKey(input: { id: $id, key: $key }) {
-                    id
-                }
-            }""",
-            {"id": project_id, "key": key, }
-        )
+        self.client.execute_query(REMOVE_MUTATION, {"id": project_id, "key": key, })
         return key
 
+    def removeMany(self, project_id: int, keys: List[str]) -> dict:
+        """
+        Removes the metadata keys concurrently, or in a batch (see
+        executeMany); returns, by key, the key or the exception raised.
+        """
+
+        results = self.executeMany([
+            (REMOVE_MUTATION, {"id": project_id, "key": key, }) for key in keys])
+        return {key: res if isinstance(res, Exception) else key
+                for key, res in zip(keys, results)}
+
     def unpack(self, metadata: dict):
         """
         Iterates through the metadata items and attempts
@@ -1,12 +1,13 @@
 from .gqlResourceBase import CLUSTER_FIELDS, DEFAULT_BATCH_SIZE
 from .gqlResourceBase import ENVIRONMENTS_FIELDS
 from .gqlResourceBase import PROJECT_FIELDS, ResourceBase
+from .collection import ResourceCollection
 from .gql import GqlClient
 from .gqlVariable import Variable
 from .gqlGroup import Group
 
-from gql.dsl import DSLQuery
-from typing import List
+from gql.dsl import DSLField, DSLSchema
+from typing import Callable, Dict, List
 from typing_extensions import Self
 
 PROJECT_DEPLOY_TARGET_CONFIGS_FIELDS = [
@@ -24,6 +25,18 @@ class Project(ResourceBase):
         super().__init__(client, options)
         self.projects = []
 
+    @property
+    def projects(self) -> ResourceCollection:
+        return self._projects
+
+    @projects.setter
+    def projects(self, projects: List[dict]):
+        # Plain lists are still accepted, and indexed from then on.
+        if not isinstance(projects, ResourceCollection):
+            projects = ResourceCollection(
+                projects, self.options.get('compactRecords', False))
+        self._projects = projects
+
     def all(self, fields: List[str] = None) -> Self:
         """
         Get a list of all projects, but only top level fields.
@@ -50,6 +63,21 @@ class Project(ResourceBase):
         return self.queryTopLevelFields(
             self.projects, 'allProjectsInGroup', 'Project', args, fields)
 
+    def byMetadata(self, metadata: Dict[str, str], fields: List[str] = None) -> Self:
+        """
+        Get a list of the projects with all the given metadata; a None value
+        matches any value of the key.
+        """
+
+        if not fields:
+            fields = PROJECT_FIELDS
+
+        args = {"metadata": [
+            {"key": key} if value is None else {"key": key, "value": str(value)}
+            for key, value in metadata.items()]}
+        return self.queryTopLevelFields(
+            self.projects, 'projectsByMetadata', 'Project', args, fields)
+
     def byName(self, name: str, fields: List[str] = None) -> Self:
         """
         Get the top-level information for a project.
@@ -62,240 +90,160 @@ class Project(ResourceBase):
         return self.queryTopLevelFields(
             self.projects, 'projectByName', 'Project', args, fields)
 
-    def withCluster(self, fields: List[str] = None, batch_size: int = DEFAULT_BATCH_SIZE) -> Self:
-        """
-        Retrieve cluster information for the projects.
+    def withSubresources(self, plan: Dict[str, List[str]], batch_size: int = DEFAULT_BATCH_SIZE) -> Self:
         """
+        Retrieve several subresources of the projects at once.
 
-        if not len(self.projects):
-            return self
-
-        project_names = [p['name'] for p in self.projects]
-
-        batches = []
-        for i in range(0, len(project_names), batch_size):
-            batches.append(project_names[i:i+batch_size])
+        The plan maps the subresources (cluster, environments,
+        deployTargetConfigs, variables, groups) to the fields to retrieve, or
+        None for the default ones; they are all selected in a single query per
+        batch of projects.
+        """
 
-        clusters = {}
-        for i, b in enumerate(batches):
-            self.v(f"Fetching cluster for batch {i+1}/{len(batches)}")
-            clusters.update(self.getCluster(b, fields))
-            self.raiseExceptionIfRequired("Error fetching project cluster")
+        self.fetchSubresources(
+            self.projects, 'name', 'projectByName', 'name', plan, batch_size,
+            "Error fetching project")
+        return self
 
-        for project in self.projects:
-            project['kubernetes'] = clusters.get(project['name'])
-            project['openshift'] = clusters.get(project['name'])
+    def withCluster(self, fields: List[str] = None, batch_size: int = DEFAULT_BATCH_SIZE) -> Self:
+        """
+        Retrieve cluster information for the projects.
+        """
 
-        return self
+        return self.withSubresources({'cluster': fields}, batch_size)
 
     def withEnvironments(self, fields: List[str] = None, batch_size: int = DEFAULT_BATCH_SIZE) -> Self:
         """
         Retrieve the projects' environments.
         """
 
-        if not len(self.projects):
-            return self
-
-        project_names = [p['name'] for p in self.projects]
-
-        batches = []
-        for i in range(0, len(project_names), batch_size):
-            batches.append(project_names[i:i+batch_size])
-
-        environments = {}
-        for i, b in enumerate(batches):
-            self.v(f"Fetching environments for batch {i+1}/{len(batches)}")
-            environments.update(self.getEnvironments(b, fields))
-            self.raiseExceptionIfRequired("Error fetching environments")
-
-        for project in self.projects:
-            project['environments'] = environments.get(project['name'])
-
-        return self
+        return self.withSubresources({'environments': fields}, batch_size)
 
     def withDeployTargetConfigs(self, fields: List[str] = None, batch_size: int = DEFAULT_BATCH_SIZE) -> Self:
         """
         Retrieve the projects' deploy target configs.
         """
 
-        if not len(self.projects):
-            return self
-
-        project_names = [p['name'] for p in self.projects]
-
-        batches = []
-        for i in range(0, len(project_names), batch_size):
-            batches.append(project_names[i:i+batch_size])
-
-        dtcs = {}
-        for i, b in enumerate(batches):
-            self.v(f"Fetching deploy target configs for batch {i+1}/{len(batches)}")
-            dtcs.update(self.getDeployTargetConfigs(b, fields))
-            self.raiseExceptionIfRequired("Error fetching deploy target configs")
-
-        for project in self.projects:
-            project['deployTargetConfigs'] = dtcs.get(project['name'])
-
-        return self
+        return self.withSubresources({'deployTargetConfigs': fields}, batch_size)
 
     def withVariables(self, fields: List[str] = None, batch_size: int = DEFAULT_BATCH_SIZE) -> Self:
         """
         Retrieve the projects' variables.
         """
 
-        if not len(self.projects):
-            return self
-
-        project_names = [p['name'] for p in self.projects]
-
-        batches = []
-        for i in range(0, len(project_names), batch_size):
-            batches.append(project_names[i:i+batch_size])
-
-        projectVars = {}
-        variables = Variable(self.client, self.options)
-        for i, b in enumerate(batches):
-            self.v(f"Fetching variables for batch {i+1}/{len(batches)}")
-            projectVars.update(variables.getForProjects(b, fields))
-            self.raiseExceptionIfRequired("Error fetching project variables")
-
-        for project in self.projects:
-            project['envVariables'] = projectVars.get(project['name'])
-
-        return self
+        return self.withSubresources({'variables': fields}, batch_size)
 
     def withGroups(self, fields: List[str] = None, batch_size: int = DEFAULT_BATCH_SIZE) -> Self:
         """
         Retrieve the projects' groups.
         """
 
-        if not len(self.projects):
-            return self
-
-        project_names = [p['name'] for p in self.projects]
-
-        batches = []
-        for i in range(0, len(project_names), batch_size):
-            batches.append(project_names[i:i+batch_size])
+        return self.withSubresources({'groups': fields}, batch_size)
 
-        groups = {}
+    def subresources(self) -> Dict[str, dict]:
+        variables = Variable(self.client, self.options)
         grouper = Group(self.client, self.options)
-        for i, b in enumerate(batches):
-            self.v(f"Fetching groups for batch {i+1}/{len(batches)}")
-            groups.update(grouper.get(b, fields))
-            self.raiseExceptionIfRequired("Error fetching groups")
-
-        for project in self.projects:
-            project['groups'] = groups.get(project['name'])
-
-        return self
-
-    def getCluster(self, project_names: List[str], fields: List[str] = None) -> List[dict]:
-        res = {}
-
+        return {
+            'cluster': {
+                'label': "cluster",
+                'error': "Error fetching project cluster",
+                'selection': self.clusterSelection,
+                'field': 'kubernetes',
+                'keys': ['kubernetes', 'openshift'],
+                'get': self.getCluster,
+            },
+            'environments': {
+                'label': "environments",
+                'error': "Error fetching environments",
+                'selection': self.environmentsSelection,
+                'field': 'environments',
+                'keys': ['environments'],
+                'get': self.getEnvironments,
+                'record': self.recordEnvironments,
+            },
+            'deployTargetConfigs': {
+                'label': "deploy target configs",
+                'error': "Error fetching deploy target configs",
+                'selection': self.deployTargetConfigsSelection,
+                'field': 'deployTargetConfigs',
+                'keys': ['deployTargetConfigs'],
+                'get': self.getDeployTargetConfigs,
+            },
+            'variables': {
+                'label': "variables",
+                'error': "Error fetching project variables",
+                'selection': variables.projectSelection,
+                'field': 'envVariables',
+                'keys': ['envVariables'],
+                'get': variables.getForProjects,
+            },
+            'groups': {
+                'label': "groups",
+                'error': "Error fetching groups",
+                'selection': grouper.projectSelection,
+                'field': 'groups',
+                'keys': ['groups'],
+                'get': grouper.get,
+            },
+        }
+
+    def recordEnvironments(self, project: dict, environments: List[dict]):
+        for environment in environments or []:
+            if environment and environment.get('kubernetesNamespaceName'):
+                self.client.relations.addParent(
+                    'Environment', environment['kubernetesNamespaceName'],
+                    'Project', project)
+
+    def clusterSelection(self, ds: DSLSchema, fields: List[str] = None) -> DSLField:
         if not fields or not len(fields):
             fields = CLUSTER_FIELDS
 
-        resources = {}
-        with self.client as (_, ds):
-            # Build the fragment.
-            cluster_fields = ds.Project.kubernetes.select(
-                getattr(ds.Kubernetes, fields[0]))
-            if len(fields) > 1:
-                for f in fields[1:]:
-                    cluster_fields.select(getattr(ds.Kubernetes, f))
-
-            field_queries = []
-            for pName in project_names:
-                # Build the main query.
-                field_query = ds.Query.projectByName.args(
-                    name=pName).alias(self.sanitiseForQueryAlias(pName))
-                field_query.select(cluster_fields)
-                field_queries.append(field_query)
-
-            resources = self.queryResources(DSLQuery(*field_queries))
-
-        for pName in project_names:
-            try:
-                res[pName] = resources.get(
-                    self.sanitiseForQueryAlias(pName))['kubernetes']
-            except:
-                res[pName] = None
-
-        return res
-
-    def getEnvironments(self, project_names: List[str], fields: List[str] = None) -> List[dict]:
-        res = {}
+        return ds.Project.kubernetes.select(
+            *[getattr(ds.Kubernetes, f) for f in fields])
 
+    def environmentsSelection(self, ds: DSLSchema, fields: List[str] = None) -> DSLField:
         if not fields or not len(fields):
             fields = ENVIRONMENTS_FIELDS
 
-        resources = {}
-        with self.client as (_, ds):
-            # Build the fragment.
-            env_fields = ds.Project.environments.select(
-                getattr(ds.Environment, fields[0]))
-            if len(fields) > 1:
-                for f in fields[1:]:
-                    env_fields.select(getattr(ds.Environment, f))
-
-            field_queries = []
-            for pName in project_names:
-                # Build the main query.
-                field_query = ds.Query.projectByName.args(
-                    name=pName).alias(self.sanitiseForQueryAlias(pName))
-                field_query.select(env_fields)
-                field_queries.append(field_query)
-
-            resources = self.queryResources(DSLQuery(*field_queries))
-
-        for pName in project_names:
-            try:
-                res[pName] = resources.get(
-                    self.sanitiseForQueryAlias(pName))['environments']
-            except:
-                res[pName] = None
-
-        return res
-
-    def getDeployTargetConfigs(self, project_names: List[str], fields: List[str] = None) -> List[dict]:
-        res = {}
+        environments = ds.Project.environments
+        # Only the environments of this type, if set in the options.
+        if self.options.get('environmentType'):
+            environments = environments.args(
+                type=self.options['environmentType'].upper())
+        return environments.select(
+            *[getattr(ds.Environment, f) for f in fields])
 
+    def deployTargetConfigsSelection(self, ds: DSLSchema, fields: List[str] = None) -> DSLField:
         if not fields or not len(fields):
             fields = PROJECT_DEPLOY_TARGET_CONFIGS_FIELDS
 
-        resources = {}
-        with self.client as (_, ds):
-            # Build the fragment.
-            dtc_fields = ds.Project.deployTargetConfigs.select(
-                getattr(ds.DeployTargetConfig, fields[0]))
-            if len(fields) > 1:
-                for f in fields[1:]:
-                    if f == 'deployTarget':
-                        continue
-                    dtc_fields.select(getattr(ds.DeployTargetConfig, f))
-
-                if 'deployTarget' in fields:
-                    dtc_fields.select(ds.DeployTargetConfig.deployTarget.select(
-                        ds.Kubernetes.id,
-                        ds.Kubernetes.name,
-                    ))
-
-            field_queries = []
-            for pName in project_names:
-                # Build the main query.
-                field_query = ds.Query.projectByName.args(
-                    name=pName).alias(self.sanitiseForQueryAlias(pName))
-                field_query.select(dtc_fields)
-                field_queries.append(field_query)
-
-            resources = self.queryResources(DSLQuery(*field_queries))
-
-        for pName in project_names:
-            try:
-                res[pName] = resources.get(
-                    self.sanitiseForQueryAlias(pName))['deployTargetConfigs']
-            except:
-                res[pName] = None
-
-        return res
+        dtc_fields = ds.Project.deployTargetConfigs.select(
+            *[getattr(ds.DeployTargetConfig, f) for f in fields
+              if f != 'deployTarget'])
+        if 'deployTarget' in fields:
+            dtc_fields.select(ds.DeployTargetConfig.deployTarget.select(
+                ds.Kubernetes.id,
+                ds.Kubernetes.name,
+            ))
+        return dtc_fields
+
+    def queryByName(self, project_names: List[str],
+                    selection: Callable[[DSLSchema, List[str]], DSLField],
+                    fields: List[str], field: str) -> dict:
+        resources = self.queryByAlias(
+            'projectByName', 'name', project_names,
+            lambda ds: [selection(ds, fields)])
+        return {n: r.get(field) if r else None for n, r in resources.items()}
+
+    def getCluster(self, project_names: List[str], fields: List[str] = None) -> dict:
+        return self.queryByName(
+            project_names, self.clusterSelection, fields, 'kubernetes')
+
+    def getEnvironments(self, project_names: List[str], fields: List[str] = None) -> dict:
+        return self.queryByName(
+            project_names, self.environmentsSelection, fields, 'environments')
+
+    def getDeployTargetConfigs(self, project_names: List[str], fields: List[str] = None) -> dict:
+        return self.queryByName(
+            project_names, self.deployTargetConfigsSelection, fields,
+            'deployTargetConfigs')
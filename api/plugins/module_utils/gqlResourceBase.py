@@ -1,12 +1,21 @@
+import asyncio
 import re
+import threading
+import time
 
+from .batching import BatchSizer
+from .collection import compact
 from .gql import GqlClient
 from .gqlError import ResourceError
 from .display import Display
 
-from gql.dsl import DSLExecutable, DSLQuery
-from gql.transport.exceptions import TransportQueryError
-from typing import Dict, List
+from concurrent.futures import ThreadPoolExecutor
+from ansible.module_utils.errors import AnsibleValidationError
+from gql.dsl import DSLExecutable, DSLField, DSLQuery, DSLSchema, DSLVariableDefinitions, dsl_gql
+from gql.transport.exceptions import TransportQueryError, TransportServerError
+from graphql import DocumentNode, get_nullable_type, is_list_type
+from requests.exceptions import RetryError, Timeout
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 PROJECT_FIELDS = [
     'autoIdle',
@@ -77,6 +86,31 @@ GROUPS_FIELDS = [
 
 DEFAULT_BATCH_SIZE = 100
 
+# GraphQL error messages returned when a query is rejected for its size.
+QUERY_TOO_LARGE_PATTERN = re.compile(
+    r'complexity|too (complex|large|big|deep)|query cost|max(imum)? (query )?depth',
+    re.IGNORECASE)
+
+# Whether the current thread is fetching a batch that can be split on failure.
+_batchState = threading.local()
+
+
+def batch_too_large(e: Exception) -> bool:
+    """
+    Determines whether a failed batch query might succeed if made smaller:
+    the request timed out, the server rejected or failed to process it, or
+    the query exceeded the API's complexity limits.
+    """
+
+    if isinstance(e, (Timeout, RetryError, asyncio.TimeoutError)):
+        return True
+    if isinstance(e, TransportServerError):
+        return e.code is None or e.code == 413 or e.code >= 500
+    if isinstance(e, TransportQueryError):
+        return any(QUERY_TOO_LARGE_PATTERN.search(str(err))
+                   for err in (e.errors or [str(e)]))
+    return False
+
 
 class ResourceBase(Display):
 
@@ -98,6 +132,10 @@ class ResourceBase(Display):
     def queryTopLevelFields(self, resList: list, query: str, qryType: str, args: Dict[str, any] = {}, fields: List[str] = []):
         with self.client:
             queryObj = self.client.build_dynamic_query(query, qryType, args, fields)
+            if self.client.options.get('streaming') and is_list_type(
+                    get_nullable_type(queryObj.field.type)):
+                return self.streamTopLevelField(
+                    resList, dsl_gql(DSLQuery(queryObj)), query)
             try:
                 res = self.client.execute_query_dynamic(DSLQuery(queryObj))
                 if isinstance(res[query], list):
@@ -118,14 +156,378 @@ class ResourceBase(Display):
 
             return self
 
-    def queryResources(self, *query_operations: DSLExecutable) -> dict:
+    def streamTopLevelField(self, resList: list, query: DocumentNode, field: str,
+                            variables: Optional[dict] = None):
+        """
+        Appends the records of the top-level list field to resList as they
+        are parsed from the response (see GqlClient.stream_query), so that
+        e.g a ResourceCollection indexes them while the rest downloads.
+        """
+
+        try:
+            for record in self.client.stream_query(query, field, variables):
+                resList.append(record)
+        except TransportQueryError as e:
+            # The records received before the errors are kept.
+            if isinstance(e.data, dict) and isinstance(e.data.get(field), list):
+                resList.extend(e.data[field])
+                self.errors.extend(e.errors)
+            else:
+                raise
+
+        return self
+
+    def concurrency(self) -> int:
+        """
+        The number of batches to fetch at once, from the resource options or
+        else from the client options.
+        """
+
+        concurrency = self.options.get('concurrency')
+        if concurrency is None:
+            concurrency = getattr(self.client, 'options', {}).get('concurrency')
+        return max(int(concurrency or 1), 1)
+
+    def batchSizer(self, sizeKey: str, batch_size: int) -> BatchSizer:
+        """
+        The sizer for the batches of sizeKey (e.g, Project.variables), kept
+        on the client so that it is shared by all the resources for the rest
+        of the run.
+        """
+
+        sizer = self.client.batchSizers.get(sizeKey)
+        if sizer is None:
+            sizer = self.client.batchSizers.setdefault(sizeKey, BatchSizer(
+                batch_size, self.client.options.get('batchTargetLatency')))
+        return sizer
+
+    def fetchInBatches(self, names: List[str], fetcher: Callable[[List[str]], dict],
+                       batch_size: int, label: str, errorMessage: str = "",
+                       fallback: Callable[[List[str]], dict] = None,
+                       pinned: bool = False) -> dict:
+        """
+        Calls fetcher with the names split into batches and merges the
+        results, which are dicts keyed by name.
+
+        The batches are of batch_size, unless their size is adapted by the
+        batchSizer(), either after failures (see fetchBatch) or to meet the
+        target latency. With pinned, they are never larger than batch_size
+        (e.g, one shard per request).
+
+        Up to concurrency() batches are in flight at once; the results are
+        merged in batch order regardless of the order in which they complete.
+        With the async option, their requests are sent on the client's
+        engine; the batches are still fetched from threads rather than
+        through execute_many, since the fetchers are not single documents
+        and each batch's size and splitting depend on the previous answers.
+
+        If provided, fallback is used instead of splitting the batches which
+        are too large.
+        """
+
+        sizer = self.batchSizer(f"{type(self).__name__}.{label}", batch_size)
+
+        lock = threading.Lock()
+        failed = threading.Event()
+        position = 0
+        count = 0
+        batchResults: Dict[int, dict] = {}
+
+        def nextBatch():
+            nonlocal position, count
+            with lock:
+                if failed.is_set() or position >= len(names):
+                    return None, None
+                start = position
+                batch = names[start:start + sizer.next(batch_size, pinned)]
+                position += len(batch)
+                count += 1
+                self.v(f"Fetching {label} for batch {count} ({position}/{len(names)})")
+            return start, batch
+
+        def fetchBatches():
+            try:
+                while True:
+                    start, batch = nextBatch()
+                    if batch is None:
+                        return
+                    batchResults[start] = self.fetchBatch(
+                        batch, fetcher, sizer, fallback)
+                    self.raiseExceptionIfRequired(errorMessage)
+            except BaseException:
+                failed.set()
+                raise
+
+        concurrency = self.concurrency()
+        if concurrency <= 1:
+            fetchBatches()
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                futures = [executor.submit(fetchBatches)
+                           for _ in range(concurrency)]
+                for future in futures:
+                    future.result()
+
+        results = {}
+        for start in sorted(batchResults):
+            results.update(batchResults[start])
+        return results
+
+    def fetchBatch(self, batch: List[str], fetcher: Callable[[List[str]], dict],
+                   sizer: BatchSizer, fallback: Callable[[List[str]], dict] = None) -> dict:
+        """
+        Calls fetcher with a batch; if the query fails because the batch is
+        too large (see batch_too_large), the batch is bisected and the halves
+        are fetched instead, recursing down to single items - or the batch is
+        passed to fallback if provided.
+
+        The reduced size is recorded in the sizer, so that the following
+        batches for the same resource (in this call or later ones) are made
+        smaller from the start.
+        """
+
+        # The batch can only be split, not grown.
+        size = sizer.next(len(batch), pinned=True)
+        if len(batch) > size:
+            results = {}
+            for i in range(0, len(batch), size):
+                results.update(self.fetchBatch(
+                    batch[i:i+size], fetcher, sizer, fallback))
+            return results
+
+        startTime = time.monotonic()
+
+        # Single items can't be split further, so their errors are handled
+        # as usual.
+        if len(batch) == 1 and fallback is None:
+            results = fetcher(batch)
+            sizer.record(len(batch), time.monotonic() - startTime)
+            return results
+
+        _batchState.splittable = True
+        try:
+            results = fetcher(batch)
+            sizer.record(len(batch), time.monotonic() - startTime)
+            return results
+        except Exception as e:
+            if not batch_too_large(e):
+                raise
+            error = e
+        finally:
+            _batchState.splittable = False
+
+        half = (len(batch) + 1) // 2
+        sizer.failed(half)
+        if fallback is not None:
+            self.v(f"Batch of {len(batch)} failed ({error}), using the fallback")
+            return fallback(batch)
+
+        self.v(f"Batch of {len(batch)} failed ({error}), retrying in batches of {half}")
+        results = self.fetchBatch(batch[:half], fetcher, sizer)
+        results.update(self.fetchBatch(batch[half:], fetcher, sizer))
+        return results
+
+    def queryByAlias(self, query: str, argName: str, names: List[str],
+                     selections: Callable[[DSLSchema], List[DSLField]]) -> Dict[str, dict]:
+        """
+        Runs the query (e.g, projectByName) once per name in a single request,
+        using aliases, with the fields built by selections, and returns the
+        resources keyed by name (None when not found).
+        """
+
+        resources = {}
+        with self.client as (_, ds):
+            operation, variables, aliases = self.aliasedQuery(
+                ds, query, argName, names, selections(ds))
+            resources = self.queryResources(operation, variables=variables)
+
+        return {name: (resources or {}).get(aliases[name]) for name in names}
+
+    def aliasedQuery(self, ds: DSLSchema, query: str, argName: str, names: List[str],
+                     fields: List[DSLField]) -> Tuple[DSLQuery, Optional[dict], Dict[str, str]]:
+        """
+        Builds a query running the query field once per name, using aliases
+        and selecting the fields; returns it along with its variables and the
+        aliases by name.
+
+        With persisted queries (see PooledRequestsHTTPTransport), the names
+        are passed as variables and the aliases are positional (r0, r1, ...),
+        so that the query's text - and hash - is the same for all the batches
+        of the same size.
+        """
+
+        parameterized = self.client.options.get('persistedQueries')
+        variableDefinitions = DSLVariableDefinitions()
+        variables = {}
+        aliases = {}
+        field_queries = []
+        for i, name in enumerate(names):
+            if parameterized:
+                alias = f"r{i}"
+                variables[alias] = name
+                arg = getattr(variableDefinitions, alias)
+            else:
+                alias = self.sanitiseForQueryAlias(name)
+                arg = name
+
+            # Build the main query.
+            field_query = getattr(ds.Query, query).args(**{argName: arg}).alias(alias)
+            field_query.select(*fields)
+            field_queries.append(field_query)
+            aliases[name] = alias
+
+        operation = DSLQuery(*field_queries)
+        if parameterized:
+            operation.variable_definitions = variableDefinitions
+            return operation, variables, aliases
+        return operation, None, aliases
+
+    def subresources(self) -> Dict[str, dict]:
+        """
+        The subresources which can be part of a fetch plan (see
+        fetchSubresources), each with:
+          - label: the batch label, also used in log messages and in the
+            error messages of combined batches
+          - error: the message of the errors when fetching it on its own
+          - selection: builds the field selecting the subresource, from the
+            schema and the list of fields
+          - field: the name of that field in the query result
+          - keys: the keys under which the subresource is stored in the
+            resource records
+          - get: fetches the subresource on its own for a batch of names
+          - local (optional): returns the subresource for a name and list of
+            fields if it is already known, None otherwise
+          - record (optional): called with the record's own fields (without
+            its subresources) and the subresource, e.g to record the
+            relationships in the client's RelationStore
+        """
+
+        return {}
+
+    def fetchSubresources(self, records: List[dict], nameKey: str,
+                          query: str, argName: str, plan: Dict[str, List[str]],
+                          batch_size: int, errorPrefix: str) -> None:
+        """
+        Retrieves the subresources in the plan (mapped to the list of fields
+        to fetch, or None for the defaults) for the records, using a single
+        aliased query per batch for all of them.
+
+        Subresources already known locally (see the 'local' resolvers) are
+        not queried again. When a combined batch is too large for the API,
+        its subresources are fetched in separate queries instead.
+        """
+
+        subresources = self.subresources()
+        unknown = [s for s in plan if s not in subresources]
+        if len(unknown):
+            raise AnsibleValidationError(
+                f"Unknown subresources: {', '.join(unknown)}.")
+
+        if not len(records) or not len(plan):
+            return
+
+        # Group the names by the subresources that need to be queried.
+        results = {}
+        toFetch: Dict[Tuple[str, ...], List[str]] = {}
+        for record in records:
+            name = record[nameKey]
+            results[name] = {}
+            for s, fields in plan.items():
+                local = subresources[s].get('local')
+                value = local(name, fields) if local else None
+                if value is not None:
+                    results[name][s] = value
+            missing = tuple(s for s in plan if s not in results[name])
+            if len(missing):
+                toFetch.setdefault(missing, []).append(name)
+
+        for missing, names in toFetch.items():
+            fetched = self.fetchPlan(
+                names, query, argName, {s: plan[s] for s in missing},
+                batch_size, errorPrefix)
+            for name, values in fetched.items():
+                results[name].update(values)
+
+        localCount = len(records) - sum(len(n) for n in toFetch.values())
+        if localCount:
+            self.v(f"Found the {', '.join(plan)} of {localCount} records locally")
+
+        keys = [k for s in subresources.values() for k in s['keys']]
+        for record in records:
+            for s in plan:
+                value = results.get(record[nameKey], {}).get(s)
+                if self.options.get('compactRecords'):
+                    # Compacted once for all its keys.
+                    value = compact(value)
+                for key in subresources[s]['keys']:
+                    record[key] = value
+
+            # Only pass the record's own fields, to avoid circular references.
+            for s in plan:
+                if subresources[s].get('record'):
+                    subresources[s]['record'](
+                        {k: v for k, v in record.items() if k not in keys},
+                        results.get(record[nameKey], {}).get(s))
+
+    def fetchPlan(self, names: List[str], query: str, argName: str,
+                  plan: Dict[str, List[str]], batch_size: int,
+                  errorPrefix: str) -> Dict[str, dict]:
+        """
+        Queries the subresources in the plan for the names; see
+        fetchSubresources.
+        """
+
+        subresources = self.subresources()
+        labels = [subresources[s]['label'] for s in plan]
+        errorMessage = f"{errorPrefix} {', '.join(labels)}"
+
+        if len(plan) == 1:
+            name, fields = list(plan.items())[0]
+            results = self.fetchInBatches(
+                names, lambda b: subresources[name]['get'](b, fields),
+                batch_size, labels[0], subresources[name]['error'])
+            return {n: {name: v} for n, v in results.items()}
+
+        def fetchCombined(batch: List[str]) -> dict:
+            resources = self.queryByAlias(query, argName, batch, lambda ds: [
+                subresources[s]['selection'](ds, fields)
+                for s, fields in plan.items()])
+            return {n: {s: r.get(subresources[s]['field']) if r else None
+                        for s in plan}
+                    for n, r in resources.items()}
+
+        def fetchSeparately(batch: List[str]) -> dict:
+            results = {n: {} for n in batch}
+            for s, fields in plan.items():
+                sub = self.fetchInBatches(
+                    batch,
+                    lambda b, s=s, fields=fields: subresources[s]['get'](b, fields),
+                    len(batch), subresources[s]['label'],
+                    subresources[s]['error'])
+                for n, v in sub.items():
+                    results[n][s] = v
+            return results
+
+        return self.fetchInBatches(
+            names, fetchCombined, batch_size, "+".join(labels),
+            errorMessage, fallback=fetchSeparately)
+
+    def queryResources(self, *query_operations: DSLExecutable,
+                       variables: Optional[dict] = None) -> dict:
         """
         Runs a dynamic query and captures any errors and returns the result.
         """
 
         try:
-            resources = self.client.execute_query_dynamic(*query_operations)
+            if variables:
+                resources = self.client.execute_query_dynamic(
+                    *query_operations, variables=variables)
+            else:
+                resources = self.client.execute_query_dynamic(*query_operations)
         except TransportQueryError as e:
+            # Let fetchBatch split the batch rather than recording the error.
+            if getattr(_batchState, 'splittable', False) and batch_too_large(e):
+                raise
             if isinstance(e.data, dict):
                 resources = e.data
                 self.errors.extend(e.errors)
@@ -136,6 +538,29 @@ class ResourceBase(Display):
 
         return resources
 
+    def executeMany(self, operations: list, concurrency: int = None) -> List[Any]:
+        """
+        Executes the independent operations concurrently (see
+        GqlClient.execute_many), up to concurrency() at once unless
+        specified - or with the operationBatching option, queues them in a
+        batch sent in as few requests as possible (see GqlClient.batch). The
+        errors of partial results are recorded and their data returned, as
+        by queryResources.
+        """
+
+        if self.client.options.get('operationBatching'):
+            with self.client.batch() as batch:
+                queued = [batch.add(*(o if isinstance(o, tuple) else (o,)))
+                          for o in operations]
+            results = [o.value for o in queued]
+        else:
+            results = self.client.execute_many(operations, concurrency or self.concurrency())
+        for i, res in enumerate(results):
+            if isinstance(res, TransportQueryError) and isinstance(res.data, dict):
+                results[i] = res.data
+                self.errors.extend(res.errors)
+        return results
+
     def shouldStopDueToError(self) -> bool:
         """
         Determines whether we should exit due to errors.
@@ -1,7 +1,6 @@
 from .gql import GqlClient
 from .gqlResourceBase import ResourceBase
 
-from gql.dsl import DSLQuery
 from gql.transport.exceptions import TransportQueryError
 from typing import List
 
@@ -46,20 +45,14 @@ class Task(ResourceBase):
                         ds.File.download,
                     ))
 
-            field_queries = []
-            for ns in env_names:
-                # Build the main query.
-                field_query = ds.Query.environmentByKubernetesNamespaceName.args(
-                    kubernetesNamespaceName=ns).alias(self.sanitiseForQueryAlias(ns))
-                field_query.select(fragment_fields)
-                field_queries.append(field_query)
-
-            resources = self.queryResources(DSLQuery(*field_queries))
+            operation, variables, aliases = self.aliasedQuery(
+                ds, 'environmentByKubernetesNamespaceName',
+                'kubernetesNamespaceName', env_names, [fragment_fields])
+            resources = self.queryResources(operation, variables=variables)
 
         for ns in env_names:
             try:
-                res[ns] = resources.get(
-                    self.sanitiseForQueryAlias(ns))['tasks']
+                res[ns] = resources.get(aliases[ns])['tasks']
             except:
                 res[ns] = None
 
@@ -2,7 +2,7 @@ from .gql import GqlClient
 from .gqlResourceBase import ResourceBase, VARIABLES_FIELDS
 
 
-from gql.dsl import DSLQuery
+from gql.dsl import DSLField, DSLSchema
 from typing import List
 
 class Variable(ResourceBase):
@@ -10,39 +10,19 @@ class Variable(ResourceBase):
     def __init__(self, client: GqlClient, options: dict = {}) -> None:
         super().__init__(client, options)
 
-    def getForProjects(self, project_names: List[str], fields: List[str] = None) -> dict:
-        res = {}
-
+    def projectSelection(self, ds: DSLSchema, fields: List[str] = None) -> DSLField:
         if not fields or not len(fields):
             fields = VARIABLES_FIELDS
 
-        resources = {}
-        with self.client as (_, ds):
-            # Build the fragment.
-            var_fields = ds.Project.envVariables.select(
-                getattr(ds.EnvKeyValue, fields[0]))
-            if len(fields) > 1:
-                for f in fields[1:]:
-                    var_fields.select(getattr(ds.EnvKeyValue, f))
-
-            field_queries = []
-            for pName in project_names:
-                # Build the main query.
-                field_query = ds.Query.projectByName.args(
-                    name=pName).alias(self.sanitiseForQueryAlias(pName))
-                field_query.select(var_fields)
-                field_queries.append(field_query)
+        return ds.Project.envVariables.select(
+            *[getattr(ds.EnvKeyValue, f) for f in fields])
 
-            resources = self.queryResources(DSLQuery(*field_queries))
-
-        for pName in project_names:
-            try:
-                res[pName] = resources.get(
-                    self.sanitiseForQueryAlias(pName))['envVariables']
-            except:
-                res[pName] = None
-
-        return res
+    def getForProjects(self, project_names: List[str], fields: List[str] = None) -> dict:
+        resources = self.queryByAlias(
+            'projectByName', 'name', project_names,
+            lambda ds: [self.projectSelection(ds, fields)])
+        return {n: r.get('envVariables') if r else None
+                for n, r in resources.items()}
 
     def addOrUpdateByName(self, projectName:str, environmentName: str, name:str, value:str, scope:str) -> dict:
         res = self.client.execute_query(
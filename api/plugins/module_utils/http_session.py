@@ -0,0 +1,244 @@
+import gzip
+import json
+import os
+import re
+import threading
+import warnings
+
+from gql.transport.exceptions import TransportAlreadyConnected, TransportServerError
+from gql.transport.requests import RequestsHTTPTransport
+from graphql import DocumentNode, ExecutionResult, print_ast
+from hashlib import sha256
+from http.cookiejar import DefaultCookiePolicy
+from requests import Response, Session
+from requests.adapters import HTTPAdapter
+from typing import Any, Dict, Optional, Tuple
+from urllib3.exceptions import InsecureRequestWarning
+from urllib3.util.retry import Retry
+
+# The number of connections kept alive per host, unless configured.
+DEFAULT_POOL_SIZE = 10
+
+# Retries of the failed requests, as configured for the gql transport
+# (whatever the method, POST included).
+RETRIES = 3
+RETRY_BACKOFF_FACTOR = 0.1
+RETRY_STATUS_FORCELIST = [429, 500, 502, 503, 504]
+
+# The size from which request bodies are compressed, when enabled; smaller
+# ones would not save much.
+DEFAULT_COMPRESSION_MIN_SIZE = 16 * 1024
+
+# The errors returned for automatic persisted queries, when the server does
+# not know the hash yet or does not support them; see
+# PooledRequestsHTTPTransport.execute.
+PERSISTED_QUERY_NOT_FOUND = 'PersistedQueryNotFound'
+PERSISTED_QUERY_NOT_SUPPORTED = 'PersistedQueryNotSupported'
+MISSING_QUERY_PATTERN = re.compile(r'must provide (a )?query|query (string )?(is )?(missing|required)', re.IGNORECASE)
+
+_lock = threading.Lock()
+# The sessions by number of retries and certificate verification, and
+# their pool sizes.
+_sessions: Dict[Tuple[int, bool], Session] = {}
+_sessionsPid: int = None
+_poolSizes: Dict[Tuple[int, bool], int] = {}
+
+# The endpoints found not to support automatic persisted queries.
+_persistedQueriesUnsupported = set()
+
+
+def shared_session(poolSize: int = None, retries: int = RETRIES, verify: bool = True) -> Session:
+    """
+    The HTTP session shared by all the Lagoon API clients of the process
+    (GqlClient, ApiClient, and so the lookups and the inventory), so that
+    the connections to the API are kept alive and reused between calls
+    instead of paying for a TCP and TLS handshake every time.
+
+    The failed requests are retried up to retries times, whatever their
+    method; clients which must not resend their mutations (ApiClient) use
+    the session without retries.
+
+    Without verify, the session does not verify the certificates (for
+    ApiClient's validate_certs); the InsecureRequestWarning urllib3 emits
+    for each of its requests is filtered once, when it is created.
+
+    The pool grows to poolSize connections per host if it is smaller; it
+    should be at least the number of threads making requests. Forked
+    processes (e.g, Ansible workers) get their own session, since
+    connections cannot be shared between processes.
+    """
+
+    global _sessionsPid
+
+    with _lock:
+        if _sessionsPid != os.getpid():
+            _sessions.clear()
+            _poolSizes.clear()
+            _sessionsPid = os.getpid()
+
+        key = (retries, verify)
+        session = _sessions.get(key)
+        if session is None:
+            session = _sessions[key] = Session()
+            # Cookies set for one client are not sent by the others.
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            session.verify = verify
+            if not verify:
+                warnings.filterwarnings('ignore', category=InsecureRequestWarning)
+            _poolSizes[key] = 0
+
+        poolSize = max(poolSize or DEFAULT_POOL_SIZE, 1)
+        if poolSize > _poolSizes[key]:
+            adapter = HTTPAdapter(
+                pool_connections=poolSize,
+                pool_maxsize=poolSize,
+                max_retries=Retry(
+                    total=retries,
+                    backoff_factor=RETRY_BACKOFF_FACTOR,
+                    status_forcelist=RETRY_STATUS_FORCELIST,
+                    allowed_methods=None,
+                ) if retries else Retry(0, read=False))
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _poolSizes[key] = poolSize
+
+        return session
+
+
+class PooledRequestsHTTPTransport(RequestsHTTPTransport):
+    """
+    A gql transport sending its requests through the shared session (see
+    shared_session) rather than its own.
+
+    With persistedQueries, the queries are sent as automatic persisted
+    queries: only the hash of the query first, and the full text only if
+    the server does not know it yet.
+
+    With compressionMinSize, the request bodies of at least that many bytes
+    are gzip-compressed, and the sizes of each request and its response
+    before and after compression are recorded in lastTransfer.
+    """
+
+    def __init__(self, *args, poolSize: int = None,
+                 persistedQueries: bool = False,
+                 compressionMinSize: int = None, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.poolSize = poolSize
+        self.persistedQueries = persistedQueries
+        self.compressionMinSize = compressionMinSize
+        self.lastTransfer: Dict[str, int] = None
+
+    def connect(self):
+        if self.session is not None:
+            raise TransportAlreadyConnected("Transport is already connected")
+        self.session = shared_session(self.poolSize, self.retries)
+
+    def execute(self, document: DocumentNode,
+                variable_values: Optional[Dict[str, Any]] = None,
+                operation_name: Optional[str] = None,
+                timeout: Optional[int] = None,
+                extra_args: Optional[Dict[str, Any]] = None,
+                upload_files: bool = False) -> ExecutionResult:
+
+        if upload_files or (not self.persistedQueries and self.compressionMinSize is None):
+            return super().execute(document, variable_values, operation_name,
+                                   timeout, extra_args, upload_files)
+
+        # See https://www.apollographql.com/docs/apollo-server/performance/apq.
+        query = print_ast(document)
+        persisted = self.persistedQueries and self.url not in _persistedQueriesUnsupported
+        payload = {}
+        if persisted:
+            payload['extensions'] = {'persistedQuery': {
+                'version': 1,
+                'sha256Hash': sha256(query.encode('utf-8')).hexdigest(),
+            }}
+        else:
+            payload['query'] = query
+        if variable_values:
+            payload['variables'] = variable_values
+        if operation_name:
+            payload['operationName'] = operation_name
+
+        # The payload replaces the one built by the parent class.
+        def send() -> ExecutionResult:
+            return super(PooledRequestsHTTPTransport, self).execute(
+                document, variable_values, operation_name, timeout,
+                {**(extra_args or {}), **self.requestArgs(payload)})
+
+        if not persisted:
+            return send()
+
+        try:
+            result = send()
+            if not result.errors or result.data is not None:
+                return result
+            if any(persisted_query_error(e) == PERSISTED_QUERY_NOT_FOUND
+                   for e in result.errors):
+                payload['query'] = query
+                return send()
+            if not any(persisted_query_error(e) for e in result.errors):
+                return result
+        except TransportServerError as e:
+            if e.code is None or e.code >= 500:
+                raise
+
+        # The full text is always sent to the servers rejecting the queries
+        # without it.
+        _persistedQueriesUnsupported.add(self.url)
+        payload['query'] = query
+        return send()
+
+    def requestArgs(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        The arguments of the request sending the payload, compressed if
+        enabled and large enough.
+        """
+
+        body = json.dumps(payload).encode('utf-8')
+        headers = {**(self.headers or {}), 'Content-Type': 'application/json'}
+        transfer = {'requestBytes': len(body)}
+        if self.compressionMinSize is not None and len(body) >= self.compressionMinSize:
+            body = gzip.compress(body)
+            headers['Content-Encoding'] = 'gzip'
+        transfer['sentBytes'] = len(body)
+
+        def recordTransfer(response: Response, *args, **kwargs):
+            # The body is read here rather than right after the hooks, to
+            # know how much of it was received.
+            transfer['responseBytes'] = len(response.content)
+            received = response.raw.tell() if hasattr(response.raw, 'tell') else None
+            if not received:
+                received = int(response.headers.get('Content-Length') or transfer['responseBytes'])
+            transfer['receivedBytes'] = received
+            self.lastTransfer = transfer
+
+        return {
+            'json': None,
+            'data': body,
+            'headers': headers,
+            'hooks': {'response': recordTransfer},
+        }
+
+    def close(self):
+        # The session stays open for the other clients.
+        self.session = None
+
+
+def persisted_query_error(error: Any) -> Optional[str]:
+    """
+    PERSISTED_QUERY_NOT_FOUND if the server does not know the hash yet,
+    PERSISTED_QUERY_NOT_SUPPORTED if it does not support persisted queries
+    (or requires a query), None for other errors.
+    """
+
+    if not isinstance(error, dict):
+        return None
+    message = str(error.get('message'))
+    code = (error.get('extensions') or {}).get('code')
+    if message == PERSISTED_QUERY_NOT_FOUND or code == 'PERSISTED_QUERY_NOT_FOUND':
+        return PERSISTED_QUERY_NOT_FOUND
+    if (message == PERSISTED_QUERY_NOT_SUPPORTED or code == 'PERSISTED_QUERY_NOT_SUPPORTED'
+            or MISSING_QUERY_PATTERN.search(message)):
+        return PERSISTED_QUERY_NOT_SUPPORTED
+    return None
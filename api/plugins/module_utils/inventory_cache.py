@@ -0,0 +1,266 @@
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import time
+import zlib
+
+from collections.abc import Mapping
+from typing import Any, Dict, List, Optional
+
+from .collection import json_default
+
+DEFAULT_CACHE_DIR = os.path.join('~', '.ansible', 'cache', 'lagoon_inventory')
+
+MAGIC = b'LAGOONINV1'
+
+# The length of the compressed index, after the magic bytes.
+HEADER = struct.Struct('>Q')
+
+# Keys of the Lagoon configuration which are not written to the cache.
+SECRET_KEYS = [
+    'api_token',
+    'lagoon_api_token',
+    'ssh_private_key',
+    'lagoon_ssh_private_key',
+]
+
+
+class InventoryCache:
+    """
+    Stores the objects fetched by the inventory plugin in a compact, indexed
+    file: a compressed index of the projects followed by one compressed
+    record per project, with its environments and decoded metadata.
+
+    Loading only reads and decompresses the records of the projects which
+    pass the filters, using the index; the filters the objects were fetched
+    with are stored too, so that the cache is only used when the current
+    filters are the same or narrower.
+    """
+
+    def __init__(self, key: Any, cacheDir: str = None) -> None:
+        self.key = hashlib.sha256(
+            json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+        self.cacheDir = os.path.expanduser(cacheDir or DEFAULT_CACHE_DIR)
+        # Size and load time of the last load, for reporting.
+        self.size = 0
+        self.loadTime = 0.0
+        self.loaded = 0
+        self.total = 0
+
+    def path(self) -> str:
+        return os.path.join(self.cacheDir, f"{self.key}.inventory")
+
+    def save(self, allObjects: List[dict], filters: List[dict]) -> None:
+        """
+        Writes the objects of each Lagoon, fetched with the filters at the
+        same position; failures are ignored since the cache is an
+        optimisation only.
+        """
+
+        records = []
+        offset = 0
+        index = {'saved': time.time(), 'lagoons': []}
+        for objects, lagoonFilters in zip(allObjects, filters):
+            entry = {
+                'lagoon': {k: v for k, v in objects['lagoon'].items()
+                           if k not in SECRET_KEYS},
+                'filters': lagoonFilters,
+                'projects': [],
+            }
+            for project in objects['project_list']:
+                environments = objects['project_environments'].get(project['name']) or []
+                record = zlib.compress(json.dumps({
+                    'project': project,
+                    'environments': environments,
+                    'metadata': objects.get('project_metadata', {}).get(project['name']),
+                }, default=json_default).encode('utf-8'))
+                records.append(record)
+                entry['projects'].append({
+                    'name': project['name'],
+                    'groups': project_groups(project),
+                    'metadata': project_metadata(project),
+                    'types': sorted({(e.get('environmentType') or '').lower()
+                                     for e in environments}),
+                    'clusters': sorted({(e.get('kubernetes') or {}).get('name') or ''
+                                        for e in environments}),
+                    'offset': offset,
+                    'length': len(record),
+                })
+                offset += len(record)
+            index['lagoons'].append(entry)
+
+        try:
+            compressedIndex = zlib.compress(json.dumps(
+                index, default=json_default).encode('utf-8'))
+            os.makedirs(self.cacheDir, mode=0o700, exist_ok=True)
+            fd, tmpPath = tempfile.mkstemp(dir=self.cacheDir, suffix='.tmp')
+        except (OSError, TypeError, ValueError):
+            return
+
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(MAGIC)
+                f.write(HEADER.pack(len(compressedIndex)))
+                f.write(compressedIndex)
+                for record in records:
+                    f.write(record)
+            os.replace(tmpPath, self.path())
+        except OSError:
+            if os.path.exists(tmpPath):
+                os.remove(tmpPath)
+
+    def load(self, filters: List[dict], maxAge: int = 0) -> Optional[List[dict]]:
+        """
+        Returns the objects of each Lagoon, restricted to the filters at the
+        same position, or None if there is no usable cache: missing, older
+        than maxAge seconds (0 for no limit), or fetched with other filters.
+        """
+
+        start = time.monotonic()
+        try:
+            with open(self.path(), 'rb') as f:
+                if f.read(len(MAGIC)) != MAGIC:
+                    return None
+                (indexLength,) = HEADER.unpack(f.read(HEADER.size))
+                index = json.loads(zlib.decompress(f.read(indexLength)))
+                dataStart = f.tell()
+
+                if maxAge > 0 and time.time() - index['saved'] > maxAge:
+                    return None
+                if len(index['lagoons']) != len(filters):
+                    return None
+
+                allObjects = []
+                self.loaded = self.total = 0
+                for entry, lagoonFilters in zip(index['lagoons'], filters):
+                    if not filters_compatible(entry['filters'], lagoonFilters):
+                        return None
+                    objects = {
+                        'lagoon': entry['lagoon'],
+                        'project_list': [],
+                        'project_environments': {},
+                        'project_metadata': {},
+                    }
+                    for project in entry['projects']:
+                        self.total += 1
+                        selected = project_selected(project, lagoonFilters)
+                        if selected is None:
+                            return None
+                        if not selected:
+                            continue
+
+                        f.seek(dataStart + project['offset'])
+                        record = json.loads(zlib.decompress(f.read(project['length'])))
+                        environments = [
+                            e for e in record['environments']
+                            if environment_selected(e, lagoonFilters)]
+                        if lagoonFilters.get('clusters') and not len(environments):
+                            continue
+
+                        self.loaded += 1
+                        name = record['project']['name']
+                        objects['project_list'].append(record['project'])
+                        if len(environments):
+                            objects['project_environments'][name] = environments
+                        objects['project_metadata'][name] = record['metadata']
+                    allObjects.append(objects)
+                self.size = f.seek(0, os.SEEK_END)
+        except (OSError, KeyError, TypeError, ValueError, struct.error, zlib.error):
+            return None
+
+        self.loadTime = time.monotonic() - start
+        return allObjects
+
+
+def project_groups(project: dict) -> Optional[List[str]]:
+    if project.get('groups') is None:
+        return None
+    return [g['name'] for g in project['groups'] if g]
+
+
+def project_metadata(project: dict) -> Optional[Dict[str, Any]]:
+    if project.get('metadata') is None:
+        return None
+    if isinstance(project['metadata'], Mapping):
+        return project['metadata']
+    try:
+        return json.loads(project['metadata'])
+    except ValueError:
+        return None
+
+
+def filters_compatible(cached: dict, current: dict) -> bool:
+    """
+    Whether the objects fetched with the cached filters include all the
+    objects passing the current ones.
+    """
+
+    for key, value in cached.items():
+        if key == 'endpoint':
+            if value != current.get(key):
+                return False
+        elif value and not narrower_filter(value, current.get(key)):
+            return False
+    return True
+
+
+def narrower_filter(cached: Any, current: Any) -> bool:
+    """
+    Whether the current value of a filter selects a subset of what its
+    cached value selects: lists (e.g, groups) select the objects matching
+    any of their items, so any non-empty subset is narrower; metadata
+    selects the projects matching all its keys, so any superset of them
+    (with the same values) is.
+    """
+
+    if not current:
+        return False
+    if isinstance(cached, list) and isinstance(current, list):
+        return set(current) <= set(cached)
+    if isinstance(cached, dict) and isinstance(current, dict):
+        return all(key in current and (value is None or (
+            current[key] is not None and str(current[key]) == str(value)))
+            for key, value in cached.items())
+    return cached == current
+
+
+def project_selected(project: dict, filters: dict) -> Optional[bool]:
+    """
+    Whether the project from the index passes the filters, None if it
+    cannot be determined from the index (e.g, the groups were not fetched).
+    """
+
+    if filters.get('groups'):
+        if project['groups'] is None:
+            return None
+        if not set(project['groups']) & set(filters['groups']):
+            return False
+
+    if filters.get('metadata'):
+        if project['metadata'] is None:
+            return None
+        for key, value in filters['metadata'].items():
+            if key not in project['metadata']:
+                return False
+            if value is not None and str(project['metadata'][key]) != str(value):
+                return False
+
+    # Projects without any environment passing the filters have no host.
+    if filters.get('environment_type') and filters['environment_type'] not in project['types']:
+        return False
+    if filters.get('clusters') and not set(filters['clusters']) & set(project['clusters']):
+        return False
+
+    return True
+
+
+def environment_selected(environment: dict, filters: dict) -> bool:
+    if filters.get('environment_type') and \
+            (environment.get('environmentType') or '').lower() != filters['environment_type']:
+        return False
+    if filters.get('clusters') and \
+            (environment.get('kubernetes') or {}).get('name') not in filters['clusters']:
+        return False
+    return True
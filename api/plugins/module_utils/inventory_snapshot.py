@@ -0,0 +1,68 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from typing import Any, Dict, Optional
+
+from .collection import json_default
+
+DEFAULT_SNAPSHOT_DIR = os.path.join('~', '.ansible', 'cache', 'lagoon_inventory')
+
+
+class InventorySnapshot:
+    """
+    Stores the objects fetched by the inventory plugin for one Lagoon, so
+    that the next refresh only has to fetch what changed since.
+
+    Unlike the inventory cache, the snapshot is kept after it has expired:
+    it is the starting point of the next refresh rather than its result.
+    """
+
+    def __init__(self, key: Any, cacheDir: str = None) -> None:
+        self.key = hashlib.sha256(
+            json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+        self.cacheDir = os.path.expanduser(cacheDir or DEFAULT_SNAPSHOT_DIR)
+
+    def path(self) -> str:
+        return os.path.join(self.cacheDir, f"{self.key}.json")
+
+    def load(self, maxAge: int = 0) -> Optional[Dict[str, Any]]:
+        """
+        Returns the stored objects, or None if there are none or if they are
+        older than maxAge seconds (0 for no limit).
+        """
+
+        try:
+            with open(self.path()) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if not isinstance(snapshot, dict) or 'objects' not in snapshot:
+            return None
+        if maxAge > 0 and time.time() - snapshot.get('saved', 0) > maxAge:
+            return None
+        return snapshot['objects']
+
+    def save(self, objects: Dict[str, Any]) -> None:
+        """
+        Writes the objects atomically; failures are ignored since the
+        snapshot is an optimisation only.
+        """
+
+        try:
+            os.makedirs(self.cacheDir, mode=0o700, exist_ok=True)
+            fd, tmpPath = tempfile.mkstemp(dir=self.cacheDir, suffix='.tmp')
+        except OSError:
+            return
+
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'saved': time.time(), 'objects': objects}, f,
+                          default=json_default)
+            os.replace(tmpPath, self.path())
+        except (OSError, TypeError, ValueError):
+            if os.path.exists(tmpPath):
+                os.remove(tmpPath)
@@ -0,0 +1,205 @@
+import re
+import threading
+
+from .async_engine import Operation
+from copy import copy
+from gql.transport.exceptions import TransportQueryError
+from graphql import (
+    DocumentNode,
+    FieldNode,
+    NameNode,
+    OperationDefinitionNode,
+    OperationType,
+    SelectionSetNode,
+    VariableNode,
+    Visitor,
+    visit,
+)
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+# The aliases given to the fields of the merged operations, e.g b2_projectByName.
+MERGED_ALIAS_PATTERN = re.compile(r'^b(\d+)_(.*)$')
+
+
+def mergeable(document: DocumentNode) -> bool:
+    """
+    Whether the document can be merged with others by merge_operations: a
+    single operation, without directives, selecting fields only.
+    """
+
+    if len(document.definitions) != 1:
+        return False
+    operation = document.definitions[0]
+    return (isinstance(operation, OperationDefinitionNode) and
+            not operation.directives and
+            all(isinstance(s, FieldNode) for s in operation.selection_set.selections))
+
+
+class RenameVariables(Visitor):
+
+    def __init__(self, prefix: str) -> None:
+        super().__init__()
+        self.prefix = prefix
+
+    def enter_variable(self, node: VariableNode, *args):
+        return VariableNode(name=NameNode(value=f"{self.prefix}{node.name.value}"))
+
+
+def merge_operations(operations: List[Operation]) -> Operation:
+    """
+    Merges operations of the same type (see mergeable) into a single one,
+    by prefixing their top-level fields' aliases and their variables with
+    the index of the operation (e.g, b2_); see split_result.
+
+    Since the fields of a mutation are executed one after the other, merged
+    mutations are still applied in order.
+    """
+
+    operationType = operations[0][0].definitions[0].operation
+    variableDefinitions = []
+    selections = []
+    variables = {}
+    for i, (document, values) in enumerate(operations):
+        prefix = f"b{i}_"
+        operation = visit(document, RenameVariables(prefix)).definitions[0]
+        variableDefinitions.extend(operation.variable_definitions or [])
+        for field in operation.selection_set.selections:
+            field = copy(field)
+            field.alias = NameNode(value=f"{prefix}{(field.alias or field.name).value}")
+            selections.append(field)
+        variables.update({f"{prefix}{k}": v for k, v in (values or {}).items()})
+
+    merged = DocumentNode(definitions=(OperationDefinitionNode(
+        operation=operationType,
+        variable_definitions=tuple(variableDefinitions),
+        directives=(),
+        selection_set=SelectionSetNode(selections=tuple(selections)),
+    ),))
+    return merged, variables
+
+
+def split_result(count: int, data: Optional[Dict[str, Any]],
+                 errors: List[Dict[str, Any]] = None) -> List[Union[Dict[str, Any], Exception]]:
+    """
+    Splits the result of merged operations (see merge_operations) into the
+    result of each - or a TransportQueryError with its errors and data, for
+    those which failed. Errors without a path are reported for all.
+    """
+
+    results = [{} for _ in range(count)]
+    for key, value in (data or {}).items():
+        match = MERGED_ALIAS_PATTERN.match(key)
+        if match and int(match.group(1)) < count:
+            results[int(match.group(1))][match.group(2)] = value
+
+    operationErrors = [[] for _ in range(count)]
+    for error in errors or []:
+        path = error.get('path') if isinstance(error, dict) else None
+        match = MERGED_ALIAS_PATTERN.match(str(path[0])) if path else None
+        if match and int(match.group(1)) < count:
+            operationErrors[int(match.group(1))].append(error)
+        else:
+            for e in operationErrors:
+                e.append(error)
+
+    return [TransportQueryError(str(e[0]), errors=e, data=r if data is not None else None)
+            if len(e) else r
+            for r, e in zip(results, operationErrors)]
+
+
+def is_mutation(document: DocumentNode) -> bool:
+    return any(getattr(d, 'operation', None) == OperationType.MUTATION
+               for d in document.definitions)
+
+
+class BatchedOperation:
+    """The pending result of an operation queued in an OperationBatch."""
+
+    def __init__(self, batch: 'OperationBatch') -> None:
+        self.batch = batch
+        self.done = threading.Event()
+        self.value: Union[Dict[str, Any], Exception] = None
+
+    def result(self) -> Dict[str, Any]:
+        """
+        The result of the operation, as returned by GqlClient.execute_query
+        (with the exception under 'error' for GraphQL errors); other
+        exceptions are raised. The batch is flushed if still pending.
+        """
+
+        if not self.done.is_set():
+            self.batch.flush()
+        self.done.wait()
+
+        if isinstance(self.value, TransportQueryError):
+            return {'error': self.value}
+        if isinstance(self.value, Exception):
+            raise self.value
+        return self.value
+
+
+class OperationBatch:
+    """
+    Queues operations to send them together, in as few requests as possible
+    (see GqlClient.execute_batch), when flushed: explicitly, when leaving
+    the with block, when the result of one of them is needed or, if a window
+    is set, that many seconds after the first one was queued.
+
+    The operations of a batch should not depend on each other, except for
+    mutations, which are applied in the order they were queued.
+    """
+
+    def __init__(self, client, window: float = 0) -> None:
+        self.client = client
+        self.window = window
+        self.lock = threading.RLock()
+        self.pending: List[Tuple[Union[str, DocumentNode], Optional[Dict[str, Any]], BatchedOperation]] = []
+        self.timer: threading.Timer = None
+
+    def add(self, query: Union[str, DocumentNode],
+            variables: Optional[Dict[str, Any]] = None) -> BatchedOperation:
+        operation = BatchedOperation(self)
+        with self.lock:
+            self.pending.append((query, variables, operation))
+            if self.window and self.timer is None:
+                self.timer = threading.Timer(self.window, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+        return operation
+
+    def flush(self):
+        with self.lock:
+            self.cancelTimer()
+            pending, self.pending = self.pending, []
+            if not len(pending):
+                return
+
+            try:
+                results = self.client.execute_batch([(q, v) for q, v, _ in pending])
+            except Exception as e:
+                results = [e] * len(pending)
+
+            for (_, _, operation), res in zip(pending, results):
+                operation.value = res
+                operation.done.set()
+
+    def cancelTimer(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+        if exc_type is None:
+            self.flush()
+            return
+
+        # The operations queued before the failure are not sent.
+        with self.lock:
+            self.cancelTimer()
+            pending, self.pending = self.pending, []
+        for _, _, operation in pending:
+            operation.value = RuntimeError("The batch was not sent")
+            operation.done.set()
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from ansible.errors import AnsibleError
+from graphql import (
+    GraphQLSchema,
+    build_ast_schema,
+    build_client_schema,
+    introspection_from_schema,
+    parse,
+)
+from typing import Any, Dict, Optional, Tuple
+
+DEFAULT_SCHEMA_CACHE_DIR = os.path.join('~', '.ansible', 'cache', 'lagoon_schema')
+
+# Schemas loaded from files in this process, keyed by path.
+_fileSchemas: Dict[str, Tuple[str, GraphQLSchema]] = {}
+
+
+class SchemaCache:
+    """
+    Stores the result of the GraphQL introspection query on disk, keyed by
+    endpoint (or schema file), so that new processes (action plugin forks, lookups, inventory
+    parses) can build the schema without a network round trip.
+
+    The introspection result is stored as JSON rather than a pickled
+    GraphQLSchema: schemas built by graphql-core are not picklable, and
+    rebuilding one from the introspection result only takes a few
+    milliseconds.
+    """
+
+    def __init__(self, endpoint: str, cacheDir: str = None, ttl: int = 3600) -> None:
+        self.endpoint = endpoint
+        self.cacheDir = os.path.expanduser(cacheDir or DEFAULT_SCHEMA_CACHE_DIR)
+        self.ttl = ttl
+
+    def path(self) -> str:
+        key = hashlib.sha256(self.endpoint.encode('utf-8')).hexdigest()
+        return os.path.join(self.cacheDir, f"{key}.json")
+
+    def load(self, fingerprint: str = None) -> Optional[Dict[str, Any]]:
+        """
+        Returns the cached introspection result, or None if there is no
+        cached result, if it has expired or if it was saved with a different
+        fingerprint.
+        """
+
+        path = self.path()
+        try:
+            if self.ttl > 0 and time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path) as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if not isinstance(cached, dict) or cached.get('endpoint') != self.endpoint:
+            return None
+        if cached.get('fingerprint') != fingerprint:
+            return None
+        return cached.get('introspection')
+
+    def save(self, introspection: Dict[str, Any], fingerprint: str = None) -> None:
+        """
+        Writes the introspection result to the cache.
+
+        The file is written to a temporary location first and then moved in
+        place, so that concurrent processes never read a partial file.
+        """
+
+        try:
+            os.makedirs(self.cacheDir, mode=0o700, exist_ok=True)
+            fd, tmpPath = tempfile.mkstemp(dir=self.cacheDir, suffix='.tmp')
+        except OSError:
+            # The cache is an optimisation only; failing to write it
+            # should never fail the task.
+            return
+
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({
+                    'endpoint': self.endpoint,
+                    'fingerprint': fingerprint,
+                    'introspection': introspection,
+                }, f)
+            os.replace(tmpPath, self.path())
+        except (OSError, TypeError, ValueError):
+            if os.path.exists(tmpPath):
+                os.remove(tmpPath)
+
+    def invalidate(self) -> None:
+        try:
+            os.remove(self.path())
+        except FileNotFoundError:
+            pass
+
+
+def schema_from_file(path: str, cacheDir: str = None) -> GraphQLSchema:
+    """
+    Loads a schema SDL file, such as the one produced by
+    `gql-cli --print-schema`.
+
+    Parsing the SDL is comparatively slow, so its introspection result is
+    cached alongside the endpoint schemas and only rebuilt when the file
+    changes; the schema is also kept in memory for the rest of the process.
+    """
+
+    path = os.path.abspath(os.path.expanduser(path))
+    try:
+        stat = os.stat(path)
+    except OSError as e:
+        raise AnsibleError(f"Unable to read GraphQL schema file {path}: {e}")
+
+    fingerprint = f"{stat.st_mtime_ns}:{stat.st_size}"
+    if path in _fileSchemas and _fileSchemas[path][0] == fingerprint:
+        return _fileSchemas[path][1]
+
+    cache = SchemaCache(f"file://{path}", cacheDir, ttl=-1)
+    introspection = cache.load(fingerprint)
+    if introspection is not None:
+        schema = build_client_schema(introspection)
+    else:
+        try:
+            with open(path) as f:
+                schema = build_ast_schema(parse(f.read()))
+        except Exception as e:
+            raise AnsibleError(f"Unable to parse GraphQL schema file {path}: {e}")
+        cache.save(introspection_from_schema(schema), fingerprint)
+
+    _fileSchemas[path] = (fingerprint, schema)
+    return schema
@@ -0,0 +1,42 @@
+import threading
+
+from typing import Dict, List, Optional, Tuple
+
+
+class RelationStore:
+    """
+    Records the parents of the resources fetched as subresources (e.g, the
+    project of the environments fetched through Project.withEnvironments),
+    so that later queries for these parents can be answered locally.
+
+    The parents are stored without their own subresources, which avoids
+    circular references between the records.
+    """
+
+    def __init__(self) -> None:
+        self.parents: Dict[Tuple[str, str, str], dict] = {}
+        self.lock = threading.Lock()
+
+    def addParent(self, childType: str, childKey: str, parentType: str, parent: dict):
+        with self.lock:
+            known = self.parents.get((childType, childKey, parentType))
+            if known is not None:
+                parent = {**known, **parent}
+            self.parents[(childType, childKey, parentType)] = parent
+
+    def parent(self, childType: str, childKey: str, parentType: str,
+               fields: List[str]) -> Optional[dict]:
+        """
+        Returns the fields of the recorded parent, or None if the parent is
+        unknown or some of the fields have not been fetched.
+        """
+
+        with self.lock:
+            parent = self.parents.get((childType, childKey, parentType))
+        if parent is None or any(f not in parent for f in fields):
+            return None
+        return {f: parent[f] for f in fields}
+
+    def clear(self):
+        with self.lock:
+            self.parents.clear()
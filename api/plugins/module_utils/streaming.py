@@ -0,0 +1,144 @@
+import codecs
+import json
+
+from typing import Any, Dict, Iterable, Iterator, List
+
+# The size of the chunks read from the response.
+CHUNK_SIZE = 64 * 1024
+
+WHITESPACE = ' \t\n\r'
+
+
+class JsonStream:
+    """
+    Parses a JSON document from chunks of bytes as they are received, and
+    yields the elements of the array at the given path (e.g, data,
+    allEnvironments) as soon as each of them is complete, so that they can
+    be processed while the rest is downloaded.
+
+    Only the elements being parsed are held in memory. The rest of the
+    document is available in document once the elements are consumed, with
+    an empty array in place of the streamed one.
+    """
+
+    def __init__(self, chunks: Iterable[bytes], path: List[str]) -> None:
+        self.chunks = iter(chunks)
+        self.path = path
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.jsonDecoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.document: Dict[str, Any] = None
+
+    def records(self) -> Iterator[Any]:
+        document = {}
+        yield from self.members(document, self.path)
+        if self.peek(required=False) is not None:
+            raise ValueError(f"Extra data at position {self.pos} of the JSON document")
+        self.document = document
+
+    def fill(self, minimum: int = 1) -> bool:
+        """
+        Reads chunks until at least minimum characters are added to the
+        buffer, or the end of the document; returns whether any were added.
+        """
+
+        # Drop what has been parsed already.
+        if self.pos:
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+
+        added = 0
+        while added < minimum and not self.eof:
+            try:
+                text = self.decoder.decode(next(self.chunks))
+            except StopIteration:
+                text = self.decoder.decode(b'', final=True)
+                self.eof = True
+            self.buffer += text
+            added += len(text)
+        return added > 0
+
+    def peek(self, required: bool = True) -> str:
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                if required:
+                    raise ValueError("Unexpected end of the JSON document")
+                return None
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(
+                f"Expecting '{char}' at position {self.pos} of the JSON document")
+        self.pos += 1
+
+    def value(self) -> Any:
+        """
+        Decodes the complete value at the current position, reading more
+        chunks until it is.
+        """
+
+        self.peek()
+        while True:
+            try:
+                value, end = self.jsonDecoder.raw_decode(self.buffer, self.pos)
+                # Numbers may continue in the next chunk.
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # The pending data at least doubles on each attempt, so large
+            # values are not decoded over and over.
+            self.fill(max(len(self.buffer) - self.pos, CHUNK_SIZE))
+
+    def members(self, target: dict, path: List[str]) -> Iterator[Any]:
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise ValueError(f"Expecting a key at position {self.pos} of the JSON document")
+            self.expect(':')
+
+            if len(path) and key == path[0] and len(path) == 1 and self.peek() == '[':
+                target[key] = []
+                yield from self.elements()
+            elif len(path) and key == path[0] and len(path) > 1 and self.peek() == '{':
+                target[key] = {}
+                yield from self.members(target[key], path[1:])
+            else:
+                target[key] = self.value()
+
+            char = self.peek()
+            self.pos += 1
+            if char == '}':
+                return
+            if char != ',':
+                raise ValueError(
+                    f"Expecting ',' or '}}' at position {self.pos - 1} of the JSON document")
+
+    def elements(self) -> Iterator[Any]:
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+
+        while True:
+            yield self.value()
+            char = self.peek()
+            self.pos += 1
+            if char == ']':
+                return
+            if char != ',':
+                raise ValueError(
+                    f"Expecting ',' or ']' at position {self.pos - 1} of the JSON document")
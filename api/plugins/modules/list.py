@@ -18,6 +18,14 @@ options:
       - The resource name.
     type: str
     required: true
+  compact:
+    description:
+      - Hold the fetched projects or environments as compact records
+        (tuples of values sharing their keys) until they are returned,
+        which reduces the memory used when listing large fleets. The
+        result is the same.
+    type: bool
+    default: false
 '''
 
 EXAMPLES = r'''
@@ -29,4 +37,9 @@ EXAMPLES = r'''
   lagoon.api.list:
     resource: environment
   register: environments
+- name: List the environments of a large fleet.
+  lagoon.api.list:
+    resource: environment
+    compact: true
+  register: environments
 '''
@@ -0,0 +1,52 @@
+"""
+Compares the size and load time of the inventory cache formats for a large
+Lagoon inventory.
+
+Run from the directory containing ansible_collections/lagoon/api:
+
+    python -m ansible_collections.lagoon.api.tests.benchmarks.inventory_cache --hosts 20000
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from ...plugins.module_utils.inventory_cache import InventoryCache
+from .inventory_memory import build_objects
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--hosts', type=int, default=20000)
+    parser.add_argument('--envs-per-project', type=int, default=40)
+    parser.add_argument('--variables', type=int, default=50)
+    args = parser.parse_args()
+
+    all_objects = build_objects(args.hosts, args.envs_per_project, args.variables)
+    filters = [{'endpoint': 'http://localhost:4000/graphql'}]
+    cache_dir = tempfile.mkdtemp()
+
+    # A single JSON document, as stored by the jsonfile cache plugin.
+    path = os.path.join(cache_dir, 'inventory.json')
+    with open(path, 'w') as f:
+        json.dump(all_objects, f)
+    start = time.monotonic()
+    with open(path) as f:
+        json.load(f)
+    print(f"json: {os.path.getsize(path) / 1024 / 1024:.1f} MiB, "
+          f"loaded in {(time.monotonic() - start) * 1000:.0f} ms")
+
+    cache = InventoryCache('benchmark', cache_dir)
+    cache.save(all_objects, filters)
+    cache.load(filters)
+    print(f"indexed: {cache.size / 1024 / 1024:.1f} MiB, "
+          f"loaded in {cache.loadTime * 1000:.0f} ms")
+
+    cache.load([{**filters[0], 'groups': ['group-project-0']}])
+    print(f"indexed, one project: loaded in {cache.loadTime * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
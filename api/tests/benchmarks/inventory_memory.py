@@ -0,0 +1,124 @@
+"""
+Measures the memory used by the hostvars of a large Lagoon inventory, with
+and without compact hostvars, and by the fetched objects, with and without
+compact records.
+
+Run from the directory containing ansible_collections/lagoon/api:
+
+    python -m ansible_collections.lagoon.api.tests.benchmarks.inventory_memory --hosts 20000
+"""
+
+import argparse
+import gc
+import json
+import tracemalloc
+
+from ansible.inventory.data import InventoryData
+from unittest.mock import Mock
+
+from ...plugins.inventory.lagoon import InventoryModule
+from ...plugins.module_utils.collection import compact
+
+
+def build_objects(hosts: int, envs_per_project: int, variables: int) -> list:
+    projects = []
+    project_environments = {}
+    for p in range(hosts // envs_per_project):
+        name = f"project-{p}"
+        projects.append({
+            'id': p,
+            'name': name,
+            'gitUrl': f"git@example.com:org/{name}.git",
+            'metadata': json.dumps({
+                f"key{k}": repr({'enabled': True, 'values': list(range(10))})
+                for k in range(10)}),
+            'envVariables': [
+                {'name': f"PROJECT_VAR_{v}", 'value': f"value-{p}-{v}" * 4}
+                for v in range(variables)],
+            'groups': [{'id': 1, 'name': 'group-1'}, {'id': p, 'name': f"group-{name}"}],
+        })
+        project_environments[name] = [{
+            'id': p * envs_per_project + e,
+            'name': f"env-{e}",
+            'kubernetesNamespaceName': f"{name}-env-{e}",
+            'environmentType': 'production' if e == 0 else 'development',
+            'route': f"https://env-{e}.{name}.example.com",
+            'routes': f"https://env-{e}.{name}.example.com",
+            'kubernetes': {'id': 1, 'name': 'cluster'},
+            'envVariables': [{'name': 'ENV_VAR', 'value': f"value-{e}"}],
+            'project': {'name': name},
+        } for e in range(envs_per_project)]
+
+    return [{
+        'lagoon': {'ssh_host': 'ssh.example.com', 'ssh_port': '22'},
+        'project_list': projects,
+        'project_environments': project_environments,
+    }]
+
+
+def compact_objects(all_objects: list) -> list:
+    """
+    The objects as fetched with the compact_records option.
+    """
+
+    return [{
+        **objects,
+        'project_list': compact(objects['project_list']),
+        'project_environments': {
+            name: compact(envs)
+            for name, envs in objects['project_environments'].items()},
+    } for objects in all_objects]
+
+
+def measure_objects(hosts: int, envs_per_project: int, variables: int,
+                    compact_records: bool) -> int:
+    gc.collect()
+    tracemalloc.start()
+    all_objects = build_objects(hosts, envs_per_project, variables)
+    if compact_records:
+        all_objects = compact_objects(all_objects)
+    gc.collect()
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del all_objects
+    return used
+
+
+def measure(all_objects: list, compact_hostvars: bool) -> int:
+    plugin = InventoryModule()
+    plugin.display = Mock()
+    plugin._options = {'compact_hostvars': compact_hostvars, 'group_by': []}
+    plugin.inventory = InventoryData()
+    plugin.all_objects = all_objects
+
+    gc.collect()
+    tracemalloc.start()
+    plugin.populate()
+    gc.collect()
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return used
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--hosts', type=int, default=20000)
+    parser.add_argument('--envs-per-project', type=int, default=40)
+    parser.add_argument('--variables', type=int, default=50)
+    args = parser.parse_args()
+
+    for compact_records in [False, True]:
+        used = measure_objects(args.hosts, args.envs_per_project, args.variables,
+                               compact_records)
+        print(f"compact_records={compact_records}: {used / 1024 / 1024:.1f} MiB "
+              f"of fetched objects for {args.hosts} hosts")
+
+    all_objects = build_objects(args.hosts, args.envs_per_project, args.variables)
+    for compact_hostvars in [False, True]:
+        used = measure(all_objects, compact_hostvars)
+        print(f"compact_hostvars={compact_hostvars}: {used / 1024 / 1024:.1f} MiB "
+              f"for {args.hosts} hosts")
+
+
+if __name__ == '__main__':
+    main()
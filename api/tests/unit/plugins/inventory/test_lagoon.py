@@ -0,0 +1,201 @@
+import unittest
+
+from ansible.errors import AnsibleError
+from ansible.inventory.data import InventoryData
+from unittest.mock import Mock, patch
+
+from .....plugins.inventory import lagoon as lagoon_inventory
+from .....plugins.inventory.lagoon import InventoryModule
+from .....plugins.module_utils.collection import ResourceCollection
+from ....benchmarks.inventory_memory import build_objects, compact_objects
+
+import sys
+sys.modules['ansible.utils.display'] = unittest.mock.Mock()
+
+
+def populate(all_objects: list, **options) -> InventoryModule:
+    plugin = InventoryModule()
+    plugin.display = Mock()
+    plugin._options = {'group_by': [], **options}
+    plugin.inventory = InventoryData()
+    plugin.all_objects = all_objects
+    plugin.populate()
+    return plugin
+
+
+class LagoonInventoryTester(unittest.TestCase):
+
+    def test_populate(self):
+        plugin = populate(build_objects(4, 2, 2), compact_hostvars=False)
+
+        hostvars = plugin.inventory.hosts['project-1-env-0'].get_vars()
+        assert hostvars['project_name'] == 'project-1'
+        assert hostvars['env_name'] == 'env-0'
+        assert hostvars['project_variables'] == {
+            'PROJECT_VAR_0': 'value-1-0' * 4, 'PROJECT_VAR_1': 'value-1-1' * 4}
+        assert hostvars['metadata']['key0'] == {
+            'enabled': True, 'values': list(range(10))}
+        assert hostvars['ansible_host'] == 'ssh.example.com'
+
+    def test_populate_compact_records(self):
+        plugin = populate(build_objects(4, 2, 2), compact_hostvars=False)
+        compact = populate(compact_objects(build_objects(4, 2, 2)), compact_hostvars=False)
+
+        for name, host in compact.inventory.hosts.items():
+            hostvars = host.get_vars()
+            assert hostvars == plugin.inventory.hosts[name].get_vars()
+            # Converted back to dicts for Ansible.
+            assert type(hostvars['lagoon_project']) is dict
+            assert type(hostvars['lagoon_project']['envVariables'][0]) is dict
+            assert type(hostvars['lagoon_environment']['kubernetes']) is dict
+
+        # The project's records are converted once for all its environments.
+        hosts = compact.inventory.hosts
+        assert (hosts['project-1-env-0'].get_vars()['lagoon_project'] is
+                hosts['project-1-env-1'].get_vars()['lagoon_project'])
+
+    def test_populate_compact_hostvars(self):
+        all_objects = build_objects(4, 2, 2)
+        plugin = populate(all_objects, compact_hostvars=False)
+        compact = populate(all_objects, compact_hostvars=True)
+
+        assert set(compact.inventory.hosts) == set(plugin.inventory.hosts)
+        for name, host in compact.inventory.hosts.items():
+            # The project variables are inherited from the project group.
+            hostvars = {}
+            for group in host.get_groups():
+                hostvars.update(group.get_vars())
+            hostvars.update(host.get_vars())
+            expected = plugin.inventory.hosts[name].get_vars()
+            assert hostvars['group_names'] == [f"lagoon_project_{expected['project_name'].replace('-', '_')}"]
+            hostvars['group_names'] = expected['group_names']
+            assert hostvars == expected
+            assert 'project_variables' not in host.get_vars()
+
+        group = compact.inventory.groups['lagoon_project_project_1']
+        assert [h.name for h in group.get_hosts()] == [
+            'project-1-env-0', 'project-1-env-1']
+        # Built once, shared by the project's hosts.
+        assert compact.project_hostvars['project-1-env-0'] is \
+            compact.project_hostvars['project-1-env-1']
+
+    def test_populate_decodes_metadata_once(self):
+        all_objects = build_objects(4, 2, 2)
+        plugin = InventoryModule()
+        all_objects[0]['project_metadata'] = plugin.decode_projects_metadata(
+            all_objects[0]['project_list'])
+
+        with unittest.mock.patch('ast.literal_eval') as literal_eval:
+            plugin = populate(all_objects, compact_hostvars=False)
+            literal_eval.assert_not_called()
+
+        metadata = plugin.inventory.hosts['project-1-env-0'].get_vars()['metadata']
+        assert metadata['key0'] == {'enabled': True, 'values': list(range(10))}
+        assert metadata is plugin.inventory.hosts['project-1-env-1'].get_vars()['metadata']
+
+    def test_populate_decodes_cached_metadata(self):
+        # Objects cached without the decoded metadata.
+        all_objects = build_objects(4, 2, 2)
+        plugin = populate(all_objects, compact_hostvars=False)
+
+        assert all_objects[0]['project_metadata']['project-1']['key0'] == {
+            'enabled': True, 'values': list(range(10))}
+        assert plugin.inventory.hosts['project-1-env-0'].get_vars()['metadata'] == \
+            all_objects[0]['project_metadata']['project-1']
+
+    def test_populate_without_subresources(self):
+        all_objects = build_objects(2, 2, 2)
+        for project in all_objects[0]['project_list']:
+            del project['envVariables'], project['groups']
+        for envs in all_objects[0]['project_environments'].values():
+            for e in envs:
+                del e['envVariables'], e['kubernetes']
+        plugin = populate(all_objects, compact_hostvars=False)
+
+        hostvars = plugin.inventory.hosts['project-0-env-0'].get_vars()
+        assert hostvars['type'] == 'production'
+        for key in ['project_variables', 'lagoon_groups', 'environment_variables',
+                    'cluster_id', 'cluster_name']:
+            assert key not in hostvars
+
+    def test_fields_and_subresources(self):
+        plugin = InventoryModule()
+        plugin._options = {
+            'project_fields': ['gitUrl'],
+            'environment_fields': ['environmentType', 'id'],
+            'project_subresources': [],
+            'environment_subresources': ['variables'],
+            'incremental': False,
+        }
+        assert plugin.project_fields() == ['id', 'name', 'gitUrl']
+        assert plugin.environment_fields() == [
+            'id', 'kubernetesNamespaceName', 'environmentType']
+        assert plugin.subresources_plan('environment_subresources') == {'variables': None}
+        assert plugin.subresources_plan('project_subresources') == {}
+
+        plugin._options['incremental'] = True
+        assert plugin.environment_fields()[-2:] == ['created', 'updated']
+
+    def test_filters(self):
+        plugin = InventoryModule()
+        plugin._vars = {}
+        assert plugin.metadata_filter({}) is None
+        assert plugin.metadata_filter({'filter_metadata': {'foo': 'bar'}}) == {'foo': 'bar'}
+        assert plugin.metadata_filter({'filter_metadata': '{"foo": null}'}) == {'foo': None}
+        with self.assertRaisesRegex(AnsibleError, "JSON object"):
+            plugin.metadata_filter({'filter_metadata': 'foo=bar'})
+
+        assert plugin.environment_type_filter({}) is None
+        assert plugin.environment_type_filter(
+            {'filter_environment_type': 'PRODUCTION'}) == 'production'
+        with self.assertRaisesRegex(AnsibleError, "Unknown environment type"):
+            plugin.environment_type_filter({'filter_environment_type': 'staging'})
+
+    def test_fetch_cluster_objects(self):
+        plugin = InventoryModule()
+        plugin.display = Mock()
+        plugin._vars = {}
+        plugin._options = {
+            'compact_records': False,
+            'environment_fields': None,
+            'environment_subresources': [],
+            'project_subresources': [],
+            'incremental': False,
+        }
+        plugin.lagoon_api = Mock()
+
+        for lagoon, concurrency in [({}, 4), ({'shard_concurrency': 2}, 2)]:
+            with patch.object(lagoon_inventory, 'Kubernetes') as kubernetes, \
+                    patch.object(lagoon_inventory, 'Environment') as environment, \
+                    patch.object(lagoon_inventory, 'Project') as project:
+                kubernetes.return_value.all.return_value.clusters = [{'id': 1, 'name': 'cluster'}]
+                environment.return_value.environments = ResourceCollection([
+                    {'id': 1, 'project': {'name': 'project-1'}},
+                    {'id': 2, 'project': None},
+                ])
+                environment.return_value.errors = []
+                project.return_value.errors = []
+                objects = plugin.fetch_cluster_objects(
+                    lagoon, [{'name': 'project-1'}, {'name': 'project-2'}],
+                    {'environment': 10, 'project': 10})
+
+            # The shards are fetched in parallel by default.
+            assert environment.call_args.args[1]['concurrency'] == concurrency
+            assert objects['project_environments']['project-1'] == [
+                {'id': 1, 'project': {'name': 'project-1'}}]
+            assert [p['name'] for p in objects['project_list']] == ['project-1', 'project-2']
+
+    def test_populate_group_by(self):
+        all_objects = build_objects(4, 2, 2)
+        plugin = populate(all_objects, compact_hostvars=False, group_by=[
+            'project', 'environment_type', 'cluster', 'lagoon_group'])
+
+        groups = plugin.inventory.groups
+        assert [h.name for h in groups['project_project_1'].get_hosts()] == [
+            'project-1-env-0', 'project-1-env-1']
+        assert [h.name for h in groups['environment_type_production'].get_hosts()] == [
+            'project-0-env-0', 'project-1-env-0']
+        assert len(groups['cluster_cluster'].get_hosts()) == 4
+        assert len(groups['lagoon_group_group_1'].get_hosts()) == 4
+        assert [h.name for h in groups['lagoon_group_group_project_0'].get_hosts()] == [
+            'project-0-env-0', 'project-0-env-1']
@@ -0,0 +1,180 @@
+import json
+import threading
+import time
+import unittest
+
+from ....common import get_mock_gql_client, load_schema
+from .....plugins.module_utils import gql as gql_module
+from .....plugins.module_utils.async_engine import HAS_AIOHTTP, AsyncEngine
+from .....plugins.module_utils.gql import GqlClient
+from .....plugins.module_utils.gqlMetadata import Metadata
+from .....plugins.module_utils.gqlResourceBase import ResourceBase
+from .....plugins.module_utils.http_session import PooledRequestsHTTPTransport
+from gql.transport.exceptions import TransportQueryError
+from unittest.mock import MagicMock, patch
+
+import sys
+sys.modules['ansible.utils.display'] = unittest.mock.Mock()
+
+
+def threaded_client(execute, concurrency: int = 4):
+    """A client whose per-thread gql clients execute with the given function."""
+
+    client = get_mock_gql_client()
+    client.options['concurrency'] = concurrency
+    threadClient = MagicMock()
+    threadClient.execute.side_effect = lambda document, variable_values=None: execute(variable_values)
+    client.client = threadClient
+    client.newClient = MagicMock(return_value=threadClient)
+    return client
+
+
+class ExecuteManyTester(unittest.TestCase):
+
+    def test_threads_ordered(self):
+        lock = threading.Lock()
+        inFlight = 0
+        maxInFlight = 0
+        def execute(variables):
+            nonlocal inFlight, maxInFlight
+            with lock:
+                inFlight += 1
+                maxInFlight = max(maxInFlight, inFlight)
+            # The first operations complete last.
+            time.sleep(0.02 * (6 - variables['i']))
+            with lock:
+                inFlight -= 1
+            return {'i': variables['i']}
+
+        client = threaded_client(execute, concurrency=3)
+        results = client.execute_many(
+            [('query Q($i: Int) { projectById(id: $i) { id } }', {'i': i}) for i in range(6)])
+        assert results == [{'i': i} for i in range(6)]
+        assert 1 < maxInFlight <= 3
+
+    def test_errors(self):
+        def execute(variables):
+            if variables['i'] == 1:
+                raise TransportQueryError('Project not found', data={'projectById': None})
+            if variables['i'] == 2:
+                raise TransportQueryError('Unauthorized', data={'projectById': None})
+            if variables['i'] == 3:
+                raise ConnectionError('refused')
+            return {'projectById': {'id': variables['i']}}
+
+        client = threaded_client(execute, concurrency=1)
+        results = client.execute_many(
+            [('query Q($i: Int) { projectById(id: $i) { id } }', {'i': i}) for i in range(4)])
+        assert results[0] == {'projectById': {'id': 0}}
+        assert results[1] == {'projectById': None}
+        assert isinstance(results[2], TransportQueryError)
+        assert isinstance(results[3], ConnectionError)
+
+    def test_check_mode(self):
+        client = threaded_client(lambda variables: {})
+        client.checkMode = True
+        assert client.execute_many(['mutation { deleteAll }']) == [{'checkMode': True}]
+        client.client.execute.assert_not_called()
+
+    def test_engine(self):
+        client = get_mock_gql_client()
+        assert client.engine() is None
+
+        client.options['async'] = True
+        with patch.object(gql_module, 'HAS_AIOHTTP', False):
+            assert client.engine() is None
+
+        engine = MagicMock()
+        engine.execute_many.return_value = [{'id': 1}]
+        with patch.object(gql_module, 'HAS_AIOHTTP', True), \
+                patch.object(gql_module, 'AsyncEngine', return_value=engine) as engineClass:
+            assert client.engine() is engine
+            assert client.engine() is engine
+            assert engineClass.call_count == 1
+
+            assert client.execute_many(['{ allProjects { id } }'], 5) == [{'id': 1}]
+            assert engine.execute_many.call_args.args[1] == 5
+
+
+    def test_fetch_in_batches_through_engine(self):
+        client = GqlClient('foo', 'bar', options={'async': True, 'concurrency': 2})
+        client.mainClient.schema = load_schema()
+
+        lock = threading.Lock()
+        inFlight = 0
+        maxInFlight = 0
+        def execute(document, variables=None):
+            nonlocal inFlight, maxInFlight
+            with lock:
+                inFlight += 1
+                maxInFlight = max(maxInFlight, inFlight)
+            time.sleep(0.05)
+            with lock:
+                inFlight -= 1
+            return {}
+
+        engine = MagicMock()
+        engine.execute.side_effect = execute
+        with patch.object(gql_module, 'HAS_AIOHTTP', True), \
+                patch.object(gql_module, 'AsyncEngine', return_value=engine), \
+                patch.object(PooledRequestsHTTPTransport, 'execute') as transportExecute:
+            resource = ResourceBase(client, {})
+            res = resource.fetchInBatches(
+                [f"p{i}" for i in range(6)],
+                lambda batch: resource.queryByAlias(
+                    'projectByName', 'name', batch, lambda ds: [ds.Project.id]),
+                2, "projects")
+
+        # The batches' requests are all sent on the engine, concurrently.
+        assert res == {f"p{i}": None for i in range(6)}
+        assert engine.execute.call_count == 3
+        assert maxInFlight == 2
+        transportExecute.assert_not_called()
+
+
+class MetadataManyTester(unittest.TestCase):
+
+    def test_update_and_remove_many(self):
+        def execute(variables):
+            if variables['key'] == 'broken':
+                raise ConnectionError('refused')
+            return {'updateProjectMetadata': {
+                'metadata': json.dumps({variables['key']: variables.get('value')})}}
+
+        client = threaded_client(execute)
+        lagoonMetadata = Metadata(client)
+        results = lagoonMetadata.updateMany(1, {'version': '1.0', 'tags': ['a'], 'broken': 'x'})
+        assert results['version'] == 'version:1.0'
+        assert results['tags'] == "tags:['a']"
+        assert isinstance(results['broken'], ConnectionError)
+
+        results = lagoonMetadata.removeMany(1, ['version', 'broken'])
+        assert results['version'] == 'version'
+        assert isinstance(results['broken'], ConnectionError)
+        assert lagoonMetadata.updateMany(1, {}) == {}
+
+
+@unittest.skipUnless(HAS_AIOHTTP, "aiohttp is not installed")
+class AsyncEngineTester(unittest.TestCase):
+
+    def test_execute_many(self):
+        from gql import gql
+
+        engine = AsyncEngine('https://api.example.com', {}, poolSize=2)
+        session = engine.session
+        try:
+            engine.session = MagicMock()
+            async def execute(document, variable_values=None):
+                if variable_values['i'] == 1:
+                    raise ConnectionError('refused')
+                return {'i': variable_values['i']}
+            engine.session.execute = execute
+
+            results = engine.execute_many(
+                [(gql('{ allProjects { id } }'), {'i': i}) for i in range(3)], 2)
+            assert results[0] == {'i': 0}
+            assert isinstance(results[1], ConnectionError)
+            assert results[2] == {'i': 2}
+        finally:
+            engine.session = session
+            engine.close()
@@ -0,0 +1,59 @@
+import unittest
+
+from .....plugins.module_utils.batching import BatchSizer, MAX_BATCH_SIZE
+
+
+class BatchSizerTester(unittest.TestCase):
+
+    def test_fixed(self):
+        sizer = BatchSizer(100)
+        assert sizer.next(100) == 100
+        assert sizer.next(20) == 20
+
+        # Latency is ignored without a target.
+        sizer.record(100, 60)
+        assert sizer.next(100) == 100
+
+        sizer.failed(50)
+        assert sizer.next(100) == 50
+        assert sizer.next(20) == 20
+
+        # Never grows back.
+        sizer.failed(80)
+        assert sizer.next(100) == 50
+
+    def test_aimd(self):
+        sizer = BatchSizer(100, targetLatency=2)
+        # The requested size is replaced by the adapted one, unless pinned.
+        assert sizer.next(20) == 100
+        assert sizer.next(20, pinned=True) == 20
+
+        sizer.record(100, 1)
+        assert sizer.size == 110
+        assert sizer.next(100) == 110
+        assert sizer.next(500, pinned=True) == 110
+        sizer.record(110, 1.5)
+        assert sizer.size == 120
+
+        # Partial batches don't grow the size.
+        sizer.record(30, 0.1)
+        assert sizer.size == 120
+
+        sizer.record(120, 3)
+        assert sizer.size == 60
+        sizer.record(60, 2.5)
+        assert sizer.size == 30
+
+        sizer.failed(10)
+        assert sizer.size == 10
+
+        for _ in range(100):
+            sizer.record(sizer.size, 0.1)
+        assert sizer.size == MAX_BATCH_SIZE
+
+    def test_aimd_minimum(self):
+        sizer = BatchSizer(1, targetLatency=1)
+        sizer.record(1, 5)
+        assert sizer.size == 1
+        sizer.record(1, 0.5)
+        assert sizer.size == 2
@@ -0,0 +1,150 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from .....plugins.module_utils import http_session
+from .....plugins.module_utils.broker import (
+    BROKER_POOL_SIZE, BrokerServer, BrokerTransport, RateLimiter, broker_alive,
+    broker_socket_dir, check_socket_dir
+)
+from .....plugins.module_utils.http_session import PooledRequestsHTTPTransport, shared_session
+from gql import Client, gql
+from gql.transport.exceptions import TransportClosed, TransportQueryError, TransportServerError
+from graphql import ExecutionResult
+from unittest.mock import MagicMock, patch
+
+import sys
+sys.modules['ansible.utils.display'] = unittest.mock.Mock()
+
+
+class BrokerTester(unittest.TestCase):
+
+    def setUp(self):
+        self.address = os.path.join(tempfile.mkdtemp(), 'broker.sock')
+        self.authkey = b'secret'
+        self.server = BrokerServer(
+            self.address, self.authkey, 'http://foo/graphql', {},
+            {'brokerCacheTtl': 60, 'brokerIdleTimeout': 1})
+        self.apiTransport = MagicMock()
+        self.server.newTransport = MagicMock(return_value=self.apiTransport)
+        self.apiTransport.execute.return_value = ExecutionResult(
+            data={'projectByName': {'id': 1}})
+        self.thread = threading.Thread(target=self.server.serve, daemon=True)
+        self.thread.start()
+        while not broker_alive(self.address, self.authkey):
+            time.sleep(0.01)
+
+        self.transport = self.clientTransport()
+
+    def clientTransport(self) -> BrokerTransport:
+        transport = BrokerTransport.__new__(BrokerTransport)
+        transport.address = self.address
+        transport.authkey = self.authkey
+        transport.conn = None
+        return transport
+
+    def test_execute_and_cache(self):
+        client = Client(transport=self.transport)
+        query = gql('{ projectByName(name: "foo") { id } }')
+        assert client.execute(query) == {'projectByName': {'id': 1}}
+        assert client.execute(query) == {'projectByName': {'id': 1}}
+        assert self.apiTransport.execute.call_count == 1
+
+        # Mutations are never cached and clear the read cache.
+        mutation = gql('mutation { deleteProject(input: {project: "foo"}) }')
+        client.execute(mutation)
+        client.execute(mutation)
+        client.execute(query)
+        assert self.apiTransport.execute.call_count == 4
+
+    def test_errors(self):
+        client = Client(transport=self.transport)
+        self.apiTransport.execute.return_value = ExecutionResult(
+            errors=[{'message': 'Unauthorized'}])
+        with self.assertRaises(TransportQueryError):
+            client.execute(gql('{ allProjects { id } }'))
+
+        self.apiTransport.execute.side_effect = TransportServerError('Bad gateway', 502)
+        with self.assertRaises(TransportServerError) as e:
+            client.execute(gql('{ allEnvironments { id } }'))
+        assert e.exception.code == 502
+
+    def test_transport_shared(self):
+        clients = [Client(transport=self.transport), Client(transport=self.clientTransport())]
+        for i, client in enumerate(clients):
+            with client as session:
+                session.execute(gql(f"{{ projectByName(name: \"p{i}\") {{ id }} }}"))
+        assert self.server.newTransport.call_count == 1
+        assert self.apiTransport.connect.call_count == 1
+        self.apiTransport.close.assert_not_called()
+
+    def test_session_shared(self):
+        http_session._sessions.clear()
+        del self.server.newTransport
+        sessions = []
+        def execute(transport, *args, **kwargs):
+            sessions.append(transport.session)
+            return ExecutionResult(data={'projectByName': {'id': 1}})
+
+        with patch.object(PooledRequestsHTTPTransport, 'execute', autospec=True, side_effect=execute):
+            for i, transport in enumerate([self.transport, self.clientTransport()]):
+                with Client(transport=transport) as session:
+                    session.execute(gql(f"{{ projectByName(name: \"p{i}\") {{ id }} }}"))
+        # Both connections went through the same pooled session.
+        assert len(sessions) == 2
+        assert sessions[0] is sessions[1] is shared_session(BROKER_POOL_SIZE)
+        assert sessions[0].get_adapter('http://foo/graphql')._pool_maxsize == BROKER_POOL_SIZE
+
+    def test_wrong_key(self):
+        assert not broker_alive(self.address, b'wrong')
+
+    def test_idle_shutdown(self):
+        self.thread.join(5)
+        assert not self.thread.is_alive()
+        assert not os.path.exists(self.address)
+
+
+class SocketDirTester(unittest.TestCase):
+
+    def test_runtime_dir(self):
+        with patch.dict(os.environ, {'XDG_RUNTIME_DIR': '/run/user/1000'}):
+            assert broker_socket_dir() == f"/run/user/1000/lagoon-api-broker-{os.getuid()}"
+        with patch.dict(os.environ, {'XDG_RUNTIME_DIR': ''}):
+            assert broker_socket_dir().startswith(tempfile.gettempdir())
+
+    def test_check_socket_dir(self):
+        socketDir = tempfile.mkdtemp()
+        os.chmod(socketDir, 0o700)
+        check_socket_dir(socketDir)
+
+        os.chmod(socketDir, 0o755)
+        with self.assertRaises(TransportClosed):
+            check_socket_dir(socketDir)
+
+        os.chmod(socketDir, 0o700)
+        link = f"{socketDir}-link"
+        os.symlink(socketDir, link)
+        with self.assertRaises(TransportClosed):
+            check_socket_dir(link)
+
+        with patch('os.getuid', return_value=os.getuid() + 1):
+            with self.assertRaises(TransportClosed):
+                check_socket_dir(socketDir)
+
+
+class RateLimiterTester(unittest.TestCase):
+
+    def test_wait(self):
+        limiter = RateLimiter(20)
+        start = time.monotonic()
+        for _ in range(5):
+            limiter.wait()
+        assert time.monotonic() - start >= 0.2
+
+        limiter = RateLimiter(0)
+        start = time.monotonic()
+        for _ in range(5):
+            limiter.wait()
+        assert time.monotonic() - start < 0.05
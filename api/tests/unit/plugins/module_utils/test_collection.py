@@ -0,0 +1,174 @@
+import json
+import pickle
+import unittest
+
+from ....common import get_mock_gql_client
+from .....plugins.module_utils.collection import CompactRecord, ResourceCollection, compact, json_default, plain
+from .....plugins.module_utils.gqlEnvironment import Environment
+from .....plugins.module_utils.gqlProject import Project
+
+import sys
+sys.modules['ansible.utils.display'] = unittest.mock.Mock()
+
+
+class ResourceCollectionTester(unittest.TestCase):
+
+    def test_lookups(self):
+        collection = ResourceCollection([
+            {'id': 1, 'name': 'p1', 'kubernetesNamespaceName': 'p1-main'},
+            {'id': 2, 'name': 'p2', 'kubernetesNamespaceName': 'p2-main'},
+            {'id': 3, 'name': 'p1'},
+            None,
+        ])
+        assert collection.byId(2)['name'] == 'p2'
+        assert collection.byName('p1')['id'] == 1
+        assert collection.byNamespace('p2-main')['id'] == 2
+        assert collection.byName('p3') is None
+        assert collection.get('name', 'p3', {}) == {}
+
+    def test_list_methods(self):
+        collection = ResourceCollection([{'id': 1, 'name': 'p1'}, {'id': 2, 'name': 'p2'}])
+        assert collection.index({'id': 2, 'name': 'p2'}) == 1
+        assert collection.indexBy('id') == {1: collection[0], 2: collection[1]}
+
+    def test_indexes_kept_up_to_date(self):
+        collection = ResourceCollection([{'id': 1, 'name': 'p1'}])
+        assert collection.byName('p2') is None
+
+        collection.append({'id': 2, 'name': 'p2'})
+        collection += [{'id': 3, 'name': 'p3'}]
+        assert collection.byName('p2')['id'] == 2
+        assert collection.byName('p3')['id'] == 3
+
+        collection.pop(0)
+        assert collection.byName('p1') is None
+        collection[0] = {'id': 4, 'name': 'p4'}
+        assert collection.byName('p2') is None
+        assert collection.byName('p4')['id'] == 4
+
+    def test_unhashable_values(self):
+        collection = ResourceCollection([{'name': ['p1']}, {'name': 'p2'}])
+        assert collection.byName('p2') == {'name': 'p2'}
+
+    def test_unique(self):
+        collection = ResourceCollection([
+            {'id': 1, 'name': 'p1'},
+            {'id': 2, 'name': 'p2'},
+            {'id': 3, 'name': 'p1'},
+        ])
+        unique = collection.unique('name')
+        assert unique == [{'id': 1, 'name': 'p1'}, {'id': 2, 'name': 'p2'}]
+
+        unique.extendUnique([{'id': 4, 'name': 'p2'}, {'id': 5, 'name': 'p3'}])
+        assert [p['id'] for p in unique] == [1, 2, 5]
+
+    def test_group_by(self):
+        collection = ResourceCollection([
+            {'name': 'main', 'project': {'name': 'p1'}},
+            {'name': 'main', 'project': {'name': 'p2'}},
+            {'name': 'dev', 'project': {'name': 'p1'}},
+        ])
+        groups = collection.groupBy(lambda e: e['project']['name'])
+        assert list(groups.keys()) == ['p1', 'p2']
+        assert [e['name'] for e in groups['p1']] == ['main', 'dev']
+        assert type(groups['p1']) is list
+
+    def test_resources_wrapped(self):
+        client = get_mock_gql_client()
+        lagoonProject = Project(client)
+        lagoonProject.projects = [{'id': 1, 'name': 'p1'}]
+        assert isinstance(lagoonProject.projects, ResourceCollection)
+        assert lagoonProject.projects.byId(1)['name'] == 'p1'
+
+        lagoonEnvironment = Environment(client)
+        assert isinstance(lagoonEnvironment.environments, ResourceCollection)
+        lagoonEnvironment.environments = [{'kubernetesNamespaceName': 'p1-main'}]
+        assert lagoonEnvironment.environments.byNamespace('p1-main') is not None
+
+    def test_compact_collection(self):
+        collection = ResourceCollection([{'id': 1, 'name': 'p1'}], compactRecords=True)
+        collection.append({'id': 2, 'name': 'p2'})
+        collection.extend([{'id': 3, 'name': 'p3'}])
+        assert all(isinstance(p, CompactRecord) for p in collection)
+        assert collection.byName('p3')['id'] == 3
+        assert collection.unique('name').compactRecords
+
+
+class CompactRecordTester(unittest.TestCase):
+
+    def test_mapping(self):
+        record = compact({
+            'id': 1,
+            'name': 'p1',
+            'kubernetes': {'id': 2, 'name': 'cluster'},
+            'envVariables': [{'name': 'FOO', 'value': 'bar'}],
+        })
+        assert isinstance(record, CompactRecord)
+        assert isinstance(record['kubernetes'], CompactRecord)
+        assert isinstance(record['envVariables'][0], CompactRecord)
+        assert record['name'] == 'p1'
+        assert record.get('gitUrl') is None
+        assert 'kubernetes' in record
+        assert list(record) == ['id', 'name', 'kubernetes', 'envVariables']
+        assert list(record.keys()) == ['id', 'name', 'kubernetes', 'envVariables']
+        assert list(record.values())[:2] == [1, 'p1']
+        assert list(record.items())[:2] == [('id', 1), ('name', 'p1')]
+        assert list(CompactRecord({'a': 1}).values()) == [1]
+        assert record == {
+            'id': 1,
+            'name': 'p1',
+            'kubernetes': {'id': 2, 'name': 'cluster'},
+            'envVariables': [{'name': 'FOO', 'value': 'bar'}],
+        }
+        assert {**record}['id'] == 1
+
+    def test_shared_schema(self):
+        records = compact([{'id': 1, 'name': 'p1'}, {'id': 2, 'name': 'p2'}])
+        assert records[0]._schema is records[1]._schema
+
+        records[0]['environments'] = [{'name': 'main'}]
+        records[1]['environments'] = []
+        assert records[0]._schema is records[1]._schema
+        assert isinstance(records[0]['environments'][0], CompactRecord)
+
+        records[0]['name'] = 'p3'
+        assert records[0] == {'id': 1, 'name': 'p3', 'environments': [{'name': 'main'}]}
+
+        del records[0]['environments']
+        assert records[0]._schema is compact({'id': 1, 'name': 'p1'})._schema
+        with self.assertRaises(KeyError):
+            records[0]['environments']
+
+    def test_plain(self):
+        cluster = compact({'id': 2, 'name': 'cluster'})
+        environment = compact({'name': 'main'})
+        environment['kubernetes'] = cluster
+        environment['openshift'] = cluster
+        value = plain({'environments': ResourceCollection([environment])})
+        assert type(value['environments']) is list
+        assert type(value['environments'][0]) is dict
+        assert type(value['environments'][0]['kubernetes']) is dict
+        # Shared records stay shared.
+        assert value['environments'][0]['kubernetes'] is value['environments'][0]['openshift']
+
+        # Plain values are not copied.
+        plainValue = {'environments': [{'name': 'main'}]}
+        assert plain(plainValue) is plainValue
+
+        assert json.dumps(environment, default=json_default) == \
+            '{"name": "main", "kubernetes": {"id": 2, "name": "cluster"}, ' \
+            '"openshift": {"id": 2, "name": "cluster"}}'
+        assert pickle.loads(pickle.dumps(environment)) == environment
+
+    def test_resources_compact(self):
+        client = get_mock_gql_client(query_dynamic_return_value={
+            'project1': {'environments': [{'id': 1, 'name': 'main'}]},
+        })
+        lagoonProject = Project(client, {'compactRecords': True})
+        lagoonProject.projects = [{'id': 1, 'name': 'project1'}]
+        lagoonProject.withEnvironments(['id', 'name'])
+        project = lagoonProject.projects[0]
+        assert isinstance(project, CompactRecord)
+        assert isinstance(project['environments'][0], CompactRecord)
+        assert plain(lagoonProject.projects) == [
+            {'id': 1, 'name': 'project1', 'environments': [{'id': 1, 'name': 'main'}]}]
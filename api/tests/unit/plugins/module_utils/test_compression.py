@@ -0,0 +1,116 @@
+import gzip
+import json
+import threading
+import unittest
+
+from .....plugins.module_utils import http_session
+from .....plugins.module_utils.gql import GqlClient
+from .....plugins.module_utils.http_session import PooledRequestsHTTPTransport
+from gql import gql
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock
+
+import sys
+sys.modules['ansible.utils.display'] = unittest.mock.Mock()
+
+RESULT = {'data': {'allProjects': [{'id': i, 'name': f"project-{i}"} for i in range(500)]}}
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+
+    requests = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        ApiHandler.requests.append((dict(self.headers), json.loads(body)))
+
+        content = json.dumps(RESULT).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            content = gzip.compress(content)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class CompressionTester(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), ApiHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}/graphql"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        http_session._sessions.clear()
+        ApiHandler.requests = []
+
+    def test_compressed_request_and_response(self):
+        transport = PooledRequestsHTTPTransport(
+            url=self.url, headers={'Accept-Encoding': 'gzip'}, compressionMinSize=100)
+        transport.connect()
+        names = [f"project-{i}" for i in range(50)]
+        query = gql('query q($names: [String]) { allProjects { id name } }')
+
+        result = transport.execute(query, {'names': names})
+        assert result.data == RESULT['data']
+        headers, payload = ApiHandler.requests[0]
+        assert headers['Content-Encoding'] == 'gzip'
+        assert payload['variables'] == {'names': names}
+
+        transfer = transport.lastTransfer
+        assert transfer['sentBytes'] < transfer['requestBytes']
+        assert transfer['receivedBytes'] < transfer['responseBytes']
+        assert transfer['responseBytes'] == len(json.dumps(RESULT))
+
+    def test_small_request(self):
+        transport = PooledRequestsHTTPTransport(
+            url=self.url, headers={'Accept-Encoding': 'identity'}, compressionMinSize=100000)
+        transport.connect()
+        transport.execute(gql('{ allProjects { id name } }'))
+
+        headers, _ = ApiHandler.requests[0]
+        assert 'Content-Encoding' not in headers
+        transfer = transport.lastTransfer
+        assert transfer['sentBytes'] == transfer['requestBytes']
+        assert transfer['receivedBytes'] == transfer['responseBytes']
+
+    def test_client_options(self):
+        client = GqlClient(self.url, 'token', options={'compression': True})
+        assert 'gzip' in client.headers['Accept-Encoding']
+        assert client.client.transport.compressionMinSize == 16 * 1024
+
+        client = GqlClient(self.url, 'token', options={'compression': False})
+        assert client.headers['Accept-Encoding'] == 'identity'
+        assert client.client.transport.compressionMinSize is None
+
+        client = GqlClient(self.url, 'token', options={'compression': True, 'compressionMinSize': 0})
+        assert client.client.transport.compressionMinSize == 0
+
+        # Left to the default of the requests library.
+        assert 'Accept-Encoding' not in GqlClient(self.url, 'token').headers
+
+    def test_log_transfer(self):
+        client = GqlClient(self.url, 'token', options={'compression': True})
+        client.vvv = MagicMock()
+        client.client.transport.lastTransfer = {
+            'requestBytes': 20000, 'sentBytes': 5000,
+            'responseBytes': 100000, 'receivedBytes': 10000,
+        }
+        client.logTransfer()
+        assert client.vvv.call_args.args[0] == (
+            "GraphQL transfer: sent 5000 bytes for 20000, 15000 bytes (75%) saved; "
+            "received 10000 bytes for 100000, 90000 bytes (90%) saved")
+        assert client.client.transport.lastTransfer is None
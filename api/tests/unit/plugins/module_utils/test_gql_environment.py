@@ -0,0 +1,84 @@
+import unittest
+
+from ....common import dsl_exes_to_str, get_mock_gql_client, load_schema
+from .....plugins.module_utils.gqlEnvironment import Environment
+from gql import gql
+from graphql import validate
+
+import sys
+sys.modules['ansible.utils.display'] = unittest.mock.Mock()
+
+
+class GqlEnvironmentTester(unittest.TestCase):
+
+    def test_all_created_after(self):
+        client = get_mock_gql_client(query_dynamic_return_value={
+            'allEnvironments': [{'id': 2, 'project': {'name': 'project1'}}],
+        })
+        lagoonEnvironment = Environment(client)
+        lagoonEnvironment.allCreatedAfter('2024-01-01 00:00:00', ['id'])
+
+        resulting_query = "\n" + dsl_exes_to_str(
+            *client.execute_query_dynamic.call_args.args)
+        assert resulting_query == """
+{
+  allEnvironments(createdAfter: "2024-01-01 00:00:00") {
+    id
+    project {
+      name
+    }
+  }
+}""", f"got {resulting_query}"
+        assert lagoonEnvironment.environments == [
+            {'id': 2, 'project': {'name': 'project1'}}]
+
+    def test_by_kubernetes(self):
+        client = get_mock_gql_client()
+        queries = []
+        def execute(*operations):
+            query = dsl_exes_to_str(*operations)
+            queries.append(query)
+            cluster = 1 if '{id: 1}' in query else 2
+            return {'environmentsByKubernetes': [
+                {'id': cluster * 10, 'project': {'name': f"project{cluster}"}},
+            ]}
+        client.execute_query_dynamic.side_effect = execute
+
+        shards = {}
+        lagoonEnvironment = Environment(client, {'concurrency': 2})
+        lagoonEnvironment.byKubernetes(
+            [1, 2], ['id'], environmentType='production',
+            shard=lambda cluster, envs: shards.update({cluster: envs}))
+
+        assert len(queries) == 2
+        assert """
+{
+  environmentsByKubernetes(kubernetes: {id: 1}, type: PRODUCTION) {
+    id
+    project {
+      name
+    }
+  }
+}""" in ["\n" + q for q in queries], f"got {queries}"
+        assert lagoonEnvironment.environments == [
+            {'id': 10, 'project': {'name': 'project1'}},
+            {'id': 20, 'project': {'name': 'project2'}},
+        ]
+        assert shards == {
+            1: [{'id': 10, 'project': {'name': 'project1'}}],
+            2: [{'id': 20, 'project': {'name': 'project2'}}],
+        }
+
+    def test_all_of_type(self):
+        client = get_mock_gql_client(query_return_value={
+            'allEnvironments': [{'id': 1}],
+        })
+        lagoonEnvironment = Environment(client)
+        lagoonEnvironment.all(['id'], environmentType='development')
+
+        query, variables = client.execute_query.call_args.args
+        assert "query ($type: EnvType)" in query
+        assert "allEnvironments(type: $type)" in query
+        assert variables == {'type': 'DEVELOPMENT'}
+        assert validate(load_schema(), gql(query)) == []
+        assert lagoonEnvironment.environments == [{'id': 1}]
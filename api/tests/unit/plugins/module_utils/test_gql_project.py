@@ -0,0 +1,193 @@
+import unittest
+
+from ....common import dsl_exes_to_str, get_mock_gql_client
+from .....plugins.module_utils.gqlEnvironment import Environment
+from .....plugins.module_utils.gqlError import ResourceError
+from .....plugins.module_utils.gqlProject import Project
+from ansible.module_utils.errors import AnsibleValidationError
+from gql.transport.exceptions import TransportQueryError, TransportServerError
+
+import sys
+sys.modules['ansible.utils.display'] = unittest.mock.Mock()
+
+
+class GqlProjectTester(unittest.TestCase):
+
+    def test_with_subresources(self):
+        client = get_mock_gql_client(query_dynamic_return_value={
+            'project1': {
+                'environments': [{'id': 1, 'name': 'main'}],
+                'envVariables': [{'name': 'FOO'}],
+            },
+            'project_2': None,
+        })
+        lagoonProject = Project(client)
+        lagoonProject.projects = [{'name': 'project1'}, {'name': 'project-2'}]
+        lagoonProject.withSubresources({
+            'environments': ['id', 'name'],
+            'variables': ['name'],
+        })
+
+        assert client.execute_query_dynamic.call_count == 1
+        resulting_query = "\n" + dsl_exes_to_str(
+            *client.execute_query_dynamic.call_args.args)
+        assert resulting_query == """
+{
+  project1: projectByName(name: "project1") {
+    environments {
+      id
+      name
+    }
+    envVariables {
+      name
+    }
+  }
+  project_2: projectByName(name: "project-2") {
+    environments {
+      id
+      name
+    }
+    envVariables {
+      name
+    }
+  }
+}""", f"got {resulting_query}"
+
+        assert lagoonProject.projects == [
+            {
+                'name': 'project1',
+                'environments': [{'id': 1, 'name': 'main'}],
+                'envVariables': [{'name': 'FOO'}],
+            },
+            {'name': 'project-2', 'environments': None, 'envVariables': None},
+        ]
+
+    def test_with_subresources_fallback(self):
+        client = get_mock_gql_client()
+
+        queries = []
+        def execute(*operations):
+            query = dsl_exes_to_str(*operations)
+            queries.append(query)
+            if 'environments' in query and 'envVariables' in query:
+                raise TransportServerError("Gateway timeout", 504)
+            if 'environments' in query:
+                return {'project1': {'environments': [{'name': 'main'}]}}
+            return {'project1': {'envVariables': [{'name': 'FOO'}]}}
+        client.execute_query_dynamic.side_effect = execute
+
+        lagoonProject = Project(client)
+        lagoonProject.projects = [{'name': 'project1'}]
+        lagoonProject.withSubresources({
+            'environments': ['name'],
+            'variables': ['name'],
+        })
+
+        # The combined query, then one per subresource.
+        assert len(queries) == 3
+        assert lagoonProject.projects == [{
+            'name': 'project1',
+            'environments': [{'name': 'main'}],
+            'envVariables': [{'name': 'FOO'}],
+        }]
+
+    def test_with_cluster(self):
+        client = get_mock_gql_client(query_dynamic_return_value={
+            'project1': {'kubernetes': {'id': 1, 'name': 'cluster'}},
+        })
+        lagoonProject = Project(client)
+        lagoonProject.projects = [{'name': 'project1'}]
+        lagoonProject.withCluster(['id', 'name'])
+
+        assert lagoonProject.projects[0]['kubernetes'] == {'id': 1, 'name': 'cluster'}
+        assert lagoonProject.projects[0]['openshift'] == {'id': 1, 'name': 'cluster'}
+
+    def test_with_subresources_error_messages(self):
+        client = get_mock_gql_client()
+        client.execute_query_dynamic.side_effect = TransportQueryError(
+            'Unauthorized', errors=[{'message': 'Unauthorized'}], data={'project1': None})
+        lagoonProject = Project(client, {'exitOnError': True})
+        lagoonProject.projects = [{'name': 'project1'}]
+
+        for method, message in [
+                (lagoonProject.withCluster, "Error fetching project cluster"),
+                (lagoonProject.withEnvironments, "Error fetching environments"),
+                (lagoonProject.withDeployTargetConfigs, "Error fetching deploy target configs")]:
+            with self.assertRaises(ResourceError) as e:
+                method()
+            assert e.exception.message == message
+
+    def test_with_subresources_unknown(self):
+        client = get_mock_gql_client()
+        lagoonProject = Project(client)
+        lagoonProject.projects = [{'name': 'project1'}]
+        with self.assertRaisesRegex(AnsibleValidationError, "Unknown subresources: foo"):
+            lagoonProject.withSubresources({'foo': None})
+
+    def test_environments_project_stitched(self):
+        client = get_mock_gql_client(query_dynamic_return_value={
+            'project1': {'environments': [
+                {'name': 'main', 'kubernetesNamespaceName': 'project1-main'},
+            ]},
+        })
+        lagoonProject = Project(client)
+        lagoonProject.projects = [{'id': 1, 'name': 'project1'}]
+        lagoonProject.withEnvironments(['name', 'kubernetesNamespaceName'])
+        assert client.execute_query_dynamic.call_count == 1
+
+        lagoonEnvironment = Environment(client)
+        lagoonEnvironment.environments = lagoonProject.projects[0]['environments']
+        lagoonEnvironment.withProject(['id', 'name'])
+
+        # Answered from the projects already fetched.
+        assert client.execute_query_dynamic.call_count == 1
+        assert lagoonEnvironment.environments[0]['project'] == {
+            'id': 1, 'name': 'project1'}
+
+        # Fields not fetched yet are queried.
+        client.execute_query_dynamic.return_value = {
+            'project1_main': {'project': {'name': 'project1', 'gitUrl': 'git@foo'}},
+        }
+        lagoonEnvironment.withProject(['name', 'gitUrl'])
+        assert client.execute_query_dynamic.call_count == 2
+        assert lagoonEnvironment.environments[0]['project'] == {
+            'name': 'project1', 'gitUrl': 'git@foo'}
+
+    def test_by_metadata(self):
+        client = get_mock_gql_client(query_dynamic_return_value={
+            'projectsByMetadata': [{'id': 1, 'name': 'project1'}],
+        })
+        lagoonProject = Project(client)
+        lagoonProject.byMetadata({'solr-version': 6, 'enabled': None}, ['id', 'name'])
+
+        resulting_query = "\n" + dsl_exes_to_str(
+            *client.execute_query_dynamic.call_args.args)
+        assert resulting_query == """
+{
+  projectsByMetadata(
+    metadata: [{key: "solr-version", value: "6"}, {key: "enabled"}]
+  ) {
+    id
+    name
+  }
+}""", f"got {resulting_query}"
+        assert lagoonProject.projects == [{'id': 1, 'name': 'project1'}]
+
+    def test_with_environments_of_type(self):
+        client = get_mock_gql_client(query_dynamic_return_value={
+            'project1': {'environments': [{'name': 'main'}]},
+        })
+        lagoonProject = Project(client, {'environmentType': 'production'})
+        lagoonProject.projects = [{'name': 'project1'}]
+        lagoonProject.withEnvironments(['name'])
+
+        resulting_query = "\n" + dsl_exes_to_str(
+            *client.execute_query_dynamic.call_args.args)
+        assert resulting_query == """
+{
+  project1: projectByName(name: "project1") {
+    environments(type: PRODUCTION) {
+      name
+    }
+  }
+}""", f"got {resulting_query}"
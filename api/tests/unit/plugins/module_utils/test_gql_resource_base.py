@@ -0,0 +1,210 @@
+import threading
+import time
+import unittest
+
+from ....common import load_schema
+from .....plugins.module_utils.gql import GqlClient
+from .....plugins.module_utils.gqlResourceBase import ResourceBase, batch_too_large
+from gql.client import SyncClientSession
+from gql.transport.exceptions import TransportQueryError, TransportServerError
+from requests.exceptions import ReadTimeout
+from unittest.mock import patch
+
+import sys
+sys.modules['ansible.utils.display'] = unittest.mock.Mock()
+
+
+class GqlResourceBaseTester(unittest.TestCase):
+
+    def test_fetch_in_batches_serial(self):
+        client = GqlClient('foo', 'bar')
+        resource = ResourceBase(client, {})
+
+        calls = []
+        def fetcher(batch):
+            calls.append(batch)
+            return {n: n.upper() for n in batch}
+
+        res = resource.fetchInBatches(
+            ['a', 'b', 'c', 'd', 'e'], fetcher, 2, "things")
+        assert calls == [['a', 'b'], ['c', 'd'], ['e']]
+        assert res == {'a': 'A', 'b': 'B', 'c': 'C', 'd': 'D', 'e': 'E'}
+
+    def test_fetch_in_batches_concurrent(self):
+        client = GqlClient('foo', 'bar', options={'concurrency': 3})
+        resource = ResourceBase(client, {})
+        assert resource.concurrency() == 3
+
+        lock = threading.Lock()
+        inFlight = [0, 0]
+        def fetcher(batch):
+            with lock:
+                inFlight[0] += 1
+                inFlight[1] = max(inFlight[0], inFlight[1])
+            # Later batches complete first.
+            time.sleep(0.05 / (ord(batch[0]) - ord('a') + 1))
+            with lock:
+                inFlight[0] -= 1
+            # Duplicate keys are resolved in batch order.
+            return {n: n.upper() for n in batch} | {'last': batch[0]}
+
+        names = [chr(ord('a') + i) for i in range(10)]
+        res = resource.fetchInBatches(names, fetcher, 1, "things")
+        assert list(res.keys()) == ['a', 'last'] + names[1:]
+        assert res['last'] == 'j'
+        assert 1 < inFlight[1] <= 3
+
+    def test_schema_fetched_once(self):
+        client = GqlClient('foo', 'bar', options={'concurrency': 4})
+        resource = ResourceBase(client, {})
+        schema = load_schema()
+
+        def fetch_schema(session):
+            time.sleep(0.02)
+            session.client.schema = schema
+        with patch.object(SyncClientSession, 'fetch_schema', autospec=True,
+                          side_effect=fetch_schema) as fetch:
+            res = resource.fetchInBatches(
+                ['a', 'b', 'c', 'd'], lambda batch: {n: client.client.schema for n in batch}, 1, "things")
+        assert fetch.call_count == 1
+        assert all(s is schema for s in res.values())
+        assert client.mainClient.schema is schema
+
+    def test_fetch_in_batches_concurrent_error(self):
+        client = GqlClient('foo', 'bar')
+        resource = ResourceBase(client, {'concurrency': 2})
+
+        def fetcher(batch):
+            if batch == ['b']:
+                raise Exception("failed")
+            return {n: n for n in batch}
+
+        with self.assertRaisesRegex(Exception, "failed"):
+            resource.fetchInBatches(['a', 'b', 'c'], fetcher, 1, "things")
+
+    def test_fetch_in_batches_exit_on_error(self):
+        client = GqlClient('foo', 'bar', options={'concurrency': 2})
+        resource = ResourceBase(client, {'exitOnError': True})
+
+        def fetcher(batch):
+            resource.errors.append(f"error for {batch[0]}")
+            return {}
+
+        with self.assertRaisesRegex(Exception, "Error fetching things"):
+            resource.fetchInBatches(
+                ['a', 'b'], fetcher, 1, "things", "Error fetching things")
+
+    def test_batch_too_large(self):
+        assert batch_too_large(ReadTimeout())
+        assert batch_too_large(TransportServerError("Too large", 413))
+        assert batch_too_large(TransportServerError("Bad gateway", 502))
+        assert not batch_too_large(TransportServerError("Unauthorized", 401))
+        assert batch_too_large(TransportQueryError(
+            "error", errors=[{'message': 'Query is too complex: 1200 > 1000'}]))
+        assert not batch_too_large(TransportQueryError(
+            "error", errors=[{'message': 'Unauthorized: You don\'t have permission'}]))
+        assert not batch_too_large(Exception("failed"))
+
+    def test_fetch_in_batches_bisect(self):
+        client = GqlClient('foo', 'bar')
+        resource = ResourceBase(client, {})
+
+        calls = []
+        def fetcher(batch):
+            calls.append(batch)
+            if len(batch) > 2:
+                raise TransportServerError("Payload too large", 413)
+            return {n: n.upper() for n in batch}
+
+        names = ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h']
+        res = resource.fetchInBatches(names, fetcher, 5, "things")
+        assert res == {n: n.upper() for n in names}
+        assert calls == [
+            ['a', 'b', 'c', 'd', 'e'], ['a', 'b', 'c'], ['a', 'b'], ['c'],
+            ['d', 'e'],
+            # The reduced size is used for the following batches.
+            ['f', 'g'], ['h'],
+        ]
+        assert client.batchSizers['ResourceBase.things'].size == 2
+
+        # And remembered for later calls.
+        calls.clear()
+        resource.fetchInBatches(names[:4], fetcher, 5, "things")
+        assert calls == [['a', 'b'], ['c', 'd']]
+
+    def test_fetch_in_batches_bisect_single_failure(self):
+        client = GqlClient('foo', 'bar')
+        resource = ResourceBase(client, {})
+
+        def fetcher(batch):
+            if 'c' in batch:
+                raise TransportServerError("Internal server error", 500)
+            return {n: n for n in batch}
+
+        with self.assertRaisesRegex(TransportServerError, "Internal server error"):
+            resource.fetchInBatches(['a', 'b', 'c', 'd'], fetcher, 4, "things")
+        assert client.batchSizers['ResourceBase.things'].size == 1
+
+    def test_fetch_in_batches_no_bisect(self):
+        client = GqlClient('foo', 'bar')
+        resource = ResourceBase(client, {})
+
+        calls = []
+        def fetcher(batch):
+            calls.append(batch)
+            raise TransportServerError("Unauthorized", 401)
+
+        with self.assertRaisesRegex(TransportServerError, "Unauthorized"):
+            resource.fetchInBatches(['a', 'b', 'c', 'd'], fetcher, 4, "things")
+        assert calls == [['a', 'b', 'c', 'd']]
+        assert client.batchSizers['ResourceBase.things'].size == 4
+
+    def test_query_resources_complexity_error(self):
+        client = GqlClient('foo', 'bar')
+        resource = ResourceBase(client, {})
+
+        def execute(*args):
+            if len(args) > 1:
+                raise TransportQueryError(
+                    "error", errors=[{'message': 'Query complexity exceeded'}],
+                    data={})
+            return {'res': True}
+        client.execute_query_dynamic = execute
+
+        calls = []
+        def fetcher(batch):
+            calls.append(batch)
+            resource.queryResources(*batch)
+            return {n: n for n in batch}
+
+        res = resource.fetchInBatches(['a', 'b', 'c'], fetcher, 3, "things")
+        assert res == {'a': 'a', 'b': 'b', 'c': 'c'}
+        assert calls == [['a', 'b', 'c'], ['a', 'b'], ['a'], ['b'], ['c']]
+        # The errors of the split batches are not recorded.
+        assert resource.errors == []
+
+    def test_fetch_in_batches_target_latency(self):
+        client = GqlClient('foo', 'bar', options={'batchTargetLatency': 1})
+        resource = ResourceBase(client, {})
+
+        calls = []
+        def fetcher(batch):
+            calls.append(len(batch))
+            return {n: n for n in batch}
+
+        names = [str(i) for i in range(100)]
+        resource.batchSizer("ResourceBase.things", 10).failed(5)
+        res = resource.fetchInBatches(names, fetcher, 10, "things")
+        assert list(res.keys()) == names
+        # Fast responses grow the batches, beyond the requested size.
+        assert calls == [5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 5]
+
+        calls.clear()
+        names = [str(i) for i in range(250)]
+        resource.fetchInBatches(names, fetcher, 100, "more things")
+        assert calls == [100, 110, 40]
+
+        # Pinned batches never grow.
+        calls.clear()
+        resource.fetchInBatches(names[:5], fetcher, 1, "single things", pinned=True)
+        assert calls == [1, 1, 1, 1, 1]
@@ -0,0 +1,129 @@
+import unittest
+import warnings
+
+from .....plugins.module_utils import http_session
+from .....plugins.module_utils.api_client import ApiClient
+from .....plugins.module_utils.gql import GqlClient
+from .....plugins.module_utils.http_session import PooledRequestsHTTPTransport, shared_session
+from ansible.errors import AnsibleError
+from requests.exceptions import ConnectionError
+from unittest.mock import MagicMock, patch
+from urllib3.exceptions import InsecureRequestWarning
+
+import sys
+sys.modules['ansible.utils.display'] = unittest.mock.Mock()
+
+
+class SharedSessionTester(unittest.TestCase):
+
+    def setUp(self):
+        http_session._sessions.clear()
+
+    def test_shared(self):
+        session = shared_session()
+        assert shared_session() is session
+        assert session.get_adapter('https://api.example.com')._pool_maxsize == 10
+
+        # The pool only grows.
+        assert shared_session(20) is session
+        assert session.get_adapter('https://api.example.com')._pool_maxsize == 20
+        shared_session(5)
+        assert session.get_adapter('https://api.example.com')._pool_maxsize == 20
+
+    def test_retries(self):
+        session = shared_session()
+        retry = session.get_adapter('https://api.example.com').max_retries
+        assert retry.total == 3
+        # POST requests included.
+        assert retry.is_retry('POST', 502)
+
+        noRetries = shared_session(retries=0)
+        assert noRetries is not session
+        assert shared_session(retries=0) is noRetries
+        retry = noRetries.get_adapter('https://api.example.com').max_retries
+        assert not retry.is_retry('POST', 502)
+        assert retry.total == 0 and retry.read is False
+
+    def test_verify(self):
+        session = shared_session()
+        assert session.verify is True
+        unverified = shared_session(verify=False)
+        assert unverified is not session
+        assert unverified.verify is False
+        assert shared_session(verify=False) is unverified
+        # The warnings of the unverified requests are filtered once.
+        assert any(action == 'ignore' and category is InsecureRequestWarning
+                   for action, _, category, _, _ in warnings.filters)
+
+    def test_forked(self):
+        session = shared_session()
+        with patch('os.getpid', return_value=-1):
+            assert shared_session() is not session
+
+    def test_transport(self):
+        transport = PooledRequestsHTTPTransport(url='https://api.example.com', poolSize=12, retries=3)
+        transport.connect()
+        assert transport.session is shared_session()
+        transport.close()
+        assert transport.session is None
+
+        other = PooledRequestsHTTPTransport(url='https://api.example.com', retries=3)
+        other.connect()
+        assert other.session is shared_session()
+
+        # The retries argument is honoured.
+        noRetries = PooledRequestsHTTPTransport(url='https://api.example.com')
+        noRetries.connect()
+        assert noRetries.session is shared_session(retries=0)
+
+    def test_gql_clients(self):
+        client = GqlClient('https://api.example.com', 'token', options={'concurrency': 16})
+        other = GqlClient('https://api.example.com', 'other-token')
+        assert isinstance(client.client.transport, PooledRequestsHTTPTransport)
+        assert client.client.transport.poolSize == 16
+        assert other.client.transport.poolSize == 10
+        assert client.session() is other.session()
+        assert client.client.transport.retries == 3
+
+
+class ApiClientTester(unittest.TestCase):
+
+    def setUp(self):
+        http_session._sessions.clear()
+
+    def test_make_api_call(self):
+        # Without retries, not to resend the mutations.
+        session = shared_session(retries=0, verify=False)
+        response = MagicMock()
+        response.content = b'{"data": {"projectByName": {"id": 1}}}'
+        with patch.object(session, 'post', return_value=response) as post:
+            client = ApiClient('https://api.example.com', 'token')
+            assert client.make_api_call('{}') == {'data': {'projectByName': {'id': 1}}}
+            assert client.make_api_call('{}') == {'data': {'projectByName': {'id': 1}}}
+
+        assert post.call_count == 2
+        assert post.call_args.args == ('https://api.example.com',)
+        assert post.call_args.kwargs['headers']['Authorization'] == 'Bearer token'
+        assert post.call_args.kwargs['timeout'] == 30
+        assert 'verify' not in post.call_args.kwargs
+
+        # Verified through another session.
+        verified = shared_session(retries=0)
+        with patch.object(verified, 'post', return_value=response) as post:
+            client = ApiClient('https://api.example.com', 'token', {'validate_certs': True})
+            client.make_api_call('{}')
+        post.assert_called_once()
+        assert verified.verify is True
+
+    def test_make_api_call_errors(self):
+        session = shared_session(retries=0, verify=False)
+        client = ApiClient('https://api.example.com', 'token')
+        with patch.object(session, 'post', side_effect=ConnectionError('refused')):
+            with self.assertRaisesRegex(AnsibleError, 'Error connecting: refused'):
+                client.make_api_call('{}')
+
+        response = MagicMock()
+        response.content = b'{"errors": [{"message": "Unauthorized"}]}'
+        with patch.object(session, 'post', return_value=response):
+            with self.assertRaisesRegex(AnsibleError, 'GraphQL error'):
+                client.make_api_call('{}')
@@ -0,0 +1,116 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from ....benchmarks.inventory_memory import build_objects
+from .....plugins.module_utils.inventory_cache import InventoryCache
+
+import sys
+sys.modules['ansible.utils.display'] = unittest.mock.Mock()
+
+
+def lagoon_filters(**filters) -> list:
+    return [{
+        'endpoint': 'http://foo/graphql',
+        'groups': None,
+        'metadata': None,
+        'environment_type': None,
+        'clusters': None,
+        **filters,
+    }]
+
+
+class InventoryCacheTester(unittest.TestCase):
+
+    def setUp(self):
+        self.cacheDir = tempfile.mkdtemp()
+        self.allObjects = build_objects(6, 2, 2)
+        self.allObjects[0]['lagoon']['api_token'] = 'secret'
+        self.allObjects[0]['project_metadata'] = {
+            p['name']: {'decoded': True} for p in self.allObjects[0]['project_list']}
+
+    def test_load_missing(self):
+        cache = InventoryCache('foo', self.cacheDir)
+        assert cache.load(lagoon_filters()) is None
+
+    def test_save_load(self):
+        cache = InventoryCache('foo', self.cacheDir)
+        cache.save(self.allObjects, lagoon_filters())
+
+        loaded = cache.load(lagoon_filters())
+        assert loaded[0]['project_list'] == self.allObjects[0]['project_list']
+        assert loaded[0]['project_environments'] == self.allObjects[0]['project_environments']
+        assert loaded[0]['project_metadata'] == self.allObjects[0]['project_metadata']
+        assert 'api_token' not in loaded[0]['lagoon']
+        assert loaded[0]['lagoon']['ssh_host'] == 'ssh.example.com'
+        assert cache.loaded == cache.total == 3
+        assert cache.size == os.path.getsize(cache.path())
+
+        # Keyed.
+        assert InventoryCache('bar', self.cacheDir).load(lagoon_filters()) is None
+
+    def test_load_narrower_filters(self):
+        cache = InventoryCache('foo', self.cacheDir)
+        cache.save(self.allObjects, lagoon_filters())
+
+        loaded = cache.load(lagoon_filters(groups=['group-project-1']))
+        assert [p['name'] for p in loaded[0]['project_list']] == ['project-1']
+        assert cache.loaded == 1
+
+        loaded = cache.load(lagoon_filters(
+            environment_type='production', metadata={'key0': None}))
+        assert [e['kubernetesNamespaceName'] for envs in loaded[0]['project_environments'].values()
+                for e in envs] == ['project-0-env-0', 'project-1-env-0', 'project-2-env-0']
+
+        loaded = cache.load(lagoon_filters(clusters=['other']))
+        assert loaded[0]['project_list'] == []
+
+    def test_load_other_filters(self):
+        cache = InventoryCache('foo', self.cacheDir)
+        cache.save(self.allObjects, lagoon_filters(environment_type='production'))
+
+        assert cache.load(lagoon_filters(environment_type='production')) is not None
+        # The development environments were not fetched.
+        assert cache.load(lagoon_filters()) is None
+        assert cache.load(lagoon_filters(environment_type='development')) is None
+        assert cache.load(lagoon_filters(endpoint='http://bar/graphql')) is None
+
+    def test_load_narrower_cached_filters(self):
+        cache = InventoryCache('foo', self.cacheDir)
+        cache.save(self.allObjects, lagoon_filters(
+            groups=['group-project-0', 'group-project-1'], metadata={'key0': None}))
+
+        loaded = cache.load(lagoon_filters(groups=['group-project-1'], metadata={'key0': None}))
+        assert [p['name'] for p in loaded[0]['project_list']] == ['project-1']
+        # Metadata filters narrow with more keys or a value.
+        assert cache.load(lagoon_filters(
+            groups=['group-project-0'], metadata={'key0': 'value0', 'key1': None})) is not None
+
+        # Wider ones miss.
+        assert cache.load(lagoon_filters(groups=['group-project-0', 'group-project-2'],
+                                         metadata={'key0': None})) is None
+        assert cache.load(lagoon_filters(groups=['group-project-0'])) is None
+        assert cache.load(lagoon_filters(metadata={'key0': None})) is None
+
+    def test_load_filter_not_in_index(self):
+        for project in self.allObjects[0]['project_list']:
+            del project['groups']
+        cache = InventoryCache('foo', self.cacheDir)
+        cache.save(self.allObjects, lagoon_filters())
+        assert cache.load(lagoon_filters(groups=['group-1'])) is None
+
+    def test_max_age(self):
+        cache = InventoryCache('foo', self.cacheDir)
+        cache.save(self.allObjects, lagoon_filters())
+        assert cache.load(lagoon_filters(), 60) is not None
+
+        with unittest.mock.patch('time.time', return_value=time.time() + 120):
+            assert cache.load(lagoon_filters(), 60) is None
+
+    def test_invalid(self):
+        cache = InventoryCache('foo', self.cacheDir)
+        with open(cache.path(), 'w') as f:
+            json.dump({'foo': 'bar'}, f)
+        assert cache.load(lagoon_filters()) is None
@@ -0,0 +1,65 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from .....plugins.module_utils.inventory_snapshot import InventorySnapshot
+
+import sys
+sys.modules['ansible.utils.display'] = unittest.mock.Mock()
+
+
+class InventorySnapshotTester(unittest.TestCase):
+
+    def setUp(self):
+        self.cacheDir = tempfile.mkdtemp()
+        self.objects = {
+            'project_list': [{'name': 'project1'}],
+            'project_environments': {'project1': [{'id': 1, 'name': 'main'}]},
+        }
+
+    def test_load_missing(self):
+        snapshot = InventorySnapshot(['http://foo/graphql', []], self.cacheDir)
+        assert snapshot.load() is None
+
+    def test_save_load(self):
+        snapshot = InventorySnapshot(['http://foo/graphql', []], self.cacheDir)
+        snapshot.save(self.objects)
+        assert snapshot.load() == self.objects
+
+        # Keyed by endpoint and groups.
+        assert InventorySnapshot(
+            ['http://foo/graphql', ['group1']], self.cacheDir).load() is None
+
+        # No temporary file left behind.
+        assert os.listdir(self.cacheDir) == [os.path.basename(snapshot.path())]
+
+    def test_max_age(self):
+        snapshot = InventorySnapshot('foo', self.cacheDir)
+        snapshot.save(self.objects)
+        assert snapshot.load(60) == self.objects
+
+        with open(snapshot.path()) as f:
+            saved = json.load(f)
+        saved['saved'] = time.time() - 120
+        with open(snapshot.path(), 'w') as f:
+            json.dump(saved, f)
+        assert snapshot.load(60) is None
+        # No limit.
+        assert snapshot.load() == self.objects
+
+    def test_invalid(self):
+        snapshot = InventorySnapshot('foo', self.cacheDir)
+        with open(snapshot.path(), 'w') as f:
+            f.write("{invalid")
+        assert snapshot.load() is None
+
+    def test_save_unserializable(self):
+        snapshot = InventorySnapshot('foo', self.cacheDir)
+        snapshot.save(self.objects)
+        snapshot.save({'foo': object()})
+
+        # The previous snapshot is kept.
+        assert snapshot.load() == self.objects
+        assert len(os.listdir(self.cacheDir)) == 1
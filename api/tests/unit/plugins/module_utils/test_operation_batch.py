@@ -0,0 +1,222 @@
+import threading
+import unittest
+
+from ....common import get_mock_gql_client
+from .....plugins.action.fact import replace_fact
+from .....plugins.module_utils.gqlMetadata import Metadata
+from .....plugins.module_utils.operation_batch import merge_operations, split_result
+from ansible.errors import AnsibleError
+from gql import gql
+from gql.transport.exceptions import TransportProtocolError, TransportQueryError
+from graphql import ExecutionResult, print_ast
+from unittest.mock import MagicMock, patch
+
+import sys
+sys.modules['ansible.utils.display'] = unittest.mock.Mock()
+
+PROJECT_QUERY = 'query p($name: String!) { projectByName(name: $name) { id } }'
+DELETE_MUTATION = 'mutation d($id: Int!) { deleteFact(input: {environment: $id, name: "a"}) }'
+ADD_MUTATION = 'mutation a($id: Int!) { fact: addFact(input: {environment: $id, name: "a"}) { id } }'
+
+
+def batching_client(arrays: bool = True):
+    client = get_mock_gql_client()
+    client.options['operationBatching'] = True
+    client.supportsArrayBatching = MagicMock(return_value=arrays)
+    client.client = MagicMock()
+    client.execute_document = MagicMock()
+    return client
+
+
+class MergeTester(unittest.TestCase):
+
+    def test_merge_operations(self):
+        document, variables = merge_operations([
+            (gql(DELETE_MUTATION), {'id': 1}),
+            (gql(ADD_MUTATION), {'id': 2}),
+        ])
+        assert print_ast(document) == (
+            'mutation ($b0_id: Int!, $b1_id: Int!) {\n'
+            '  b0_deleteFact: deleteFact(input: {environment: $b0_id, name: "a"})\n'
+            '  b1_fact: addFact(input: {environment: $b1_id, name: "a"}) {\n'
+            '    id\n'
+            '  }\n'
+            '}')
+        assert variables == {'b0_id': 1, 'b1_id': 2}
+
+    def test_split_result(self):
+        results = split_result(3, {
+            'b0_deleteFact': 'success',
+            'b1_fact': None,
+            'b2_projectByName': {'id': 1},
+        }, [{'message': 'Duplicate', 'path': ['b1_fact']}])
+        assert results[0] == {'deleteFact': 'success'}
+        assert isinstance(results[1], TransportQueryError)
+        assert results[1].data == {'fact': None}
+        assert results[2] == {'projectByName': {'id': 1}}
+
+        results = split_result(2, None, [{'message': 'Invalid'}])
+        assert all(isinstance(r, TransportQueryError) and r.data is None for r in results)
+
+
+class ExecuteBatchTester(unittest.TestCase):
+
+    def test_supports_array_batching(self):
+        assert get_mock_gql_client().supportsArrayBatching()
+
+    def test_disabled(self):
+        client = batching_client()
+        client.options['operationBatching'] = False
+        client.execute_document.side_effect = [{'deleteFact': 'success'}, {'fact': {'id': 1}}]
+        results = client.execute_batch([(DELETE_MUTATION, {'id': 1}), (ADD_MUTATION, {'id': 1})])
+        assert results == [{'deleteFact': 'success'}, {'fact': {'id': 1}}]
+        assert client.execute_document.call_count == 2
+        client.client.transport.execute_batch.assert_not_called()
+
+    def test_array(self):
+        client = batching_client()
+        client.client.transport.execute_batch.return_value = [
+            ExecutionResult(data={'b0_deleteFact': 'success', 'b1_fact': {'id': 3}}),
+            ExecutionResult(data={'projectByName': None},
+                            errors=[{'message': 'Unauthorized', 'path': ['projectByName']}]),
+        ]
+        results = client.execute_batch([
+            (DELETE_MUTATION, {'id': 1}),
+            (PROJECT_QUERY, {'name': 'p1'}),
+            (ADD_MUTATION, {'id': 1}),
+        ])
+
+        # The mutations are merged, the query sent alongside in the array.
+        requests = client.client.transport.execute_batch.call_args.args[0]
+        assert len(requests) == 2
+        assert requests[0].variable_values == {'b0_id': 1, 'b1_id': 1}
+        assert requests[1].variable_values == {'name': 'p1'}
+        assert results[0] == {'deleteFact': 'success'}
+        assert isinstance(results[1], TransportQueryError)
+        assert results[2] == {'fact': {'id': 3}}
+        client.execute_document.assert_not_called()
+
+    def test_merged_without_arrays(self):
+        client = batching_client()
+        client.client.transport.execute_batch.side_effect = TransportProtocolError(
+            'Server did not return a valid GraphQL result: Answer is not a list')
+        client.execute_document.return_value = {
+            'b0_projectByName': {'id': 1}, 'b1_projectByName': {'id': 2}}
+
+        for _ in range(2):
+            results = client.execute_batch([
+                (PROJECT_QUERY, {'name': 'p1'}), (PROJECT_QUERY, {'name': 'p2'})])
+            assert results == [{'projectByName': {'id': 1}}, {'projectByName': {'id': 2}}]
+
+        # Not attempted again once known to be unsupported.
+        assert client.client.transport.execute_batch.call_count == 1
+        assert client.arrayBatching is False
+        assert client.execute_document.call_count == 2
+        assert client.execute_document.call_args.args[1] == {'b0_name': 'p1', 'b1_name': 'p2'}
+
+    def test_invalid_merged_query(self):
+        client = batching_client(arrays=False)
+        client.execute_document.side_effect = [
+            TransportQueryError('Cannot query field', errors=[{'message': 'Cannot query field'}]),
+            {'projectByName': {'id': 1}},
+            TransportQueryError('Cannot query field', errors=[{'message': 'Cannot query field'}]),
+        ]
+        results = client.execute_batch([
+            (PROJECT_QUERY, {'name': 'p1'}), (PROJECT_QUERY, {'name': 'p2'})])
+        assert results[0] == {'projectByName': {'id': 1}}
+        assert isinstance(results[1], TransportQueryError)
+
+    def test_check_mode(self):
+        client = batching_client()
+        client.checkMode = True
+        assert client.execute_batch([DELETE_MUTATION, ADD_MUTATION]) == [
+            {'checkMode': True}, {'checkMode': True}]
+
+    def test_array_in_open_client(self):
+        client = get_mock_gql_client()
+        client.options['operationBatching'] = True
+        del client.client.connect_sync
+        transport = client.client.transport
+        answers = [ExecutionResult(data={'b0_deleteFact': 'success', 'b1_fact': {'id': 3}})]
+        with client.client:
+            with patch.object(transport, 'execute_batch', return_value=answers) as execute_batch:
+                # The open session is reused rather than connected again.
+                results = client.execute_batch([(DELETE_MUTATION, {'id': 1}), (ADD_MUTATION, {'id': 1})])
+            assert transport.session is not None
+        assert results == [{'deleteFact': 'success'}, {'fact': {'id': 3}}]
+        execute_batch.assert_called_once()
+        assert transport.session is None
+
+
+class OperationBatchTester(unittest.TestCase):
+
+    def test_flushed_when_needed(self):
+        client = batching_client(arrays=False)
+        client.execute_document.return_value = {
+            'b0_deleteFact': 'success', 'b1_fact': {'id': 3}}
+
+        batch = client.batch()
+        deleted = batch.add(DELETE_MUTATION, {'id': 1})
+        added = batch.add(ADD_MUTATION, {'id': 1})
+        client.execute_document.assert_not_called()
+        assert added.result() == {'fact': {'id': 3}}
+        assert deleted.result() == {'deleteFact': 'success'}
+        assert client.execute_document.call_count == 1
+
+    def test_window(self):
+        client = batching_client(arrays=False)
+        client.options['operationBatchWindow'] = 0.01
+        sent = threading.Event()
+        client.execute_document.side_effect = lambda *args: sent.set() or {'projectByName': {'id': 1}}
+
+        operation = client.batch().add(PROJECT_QUERY, {'name': 'p1'})
+        assert sent.wait(5)
+        assert operation.result() == {'projectByName': {'id': 1}}
+
+    def test_not_sent_on_error(self):
+        client = batching_client()
+        with self.assertRaises(ValueError):
+            with client.batch() as batch:
+                operation = batch.add(DELETE_MUTATION, {'id': 1})
+                raise ValueError()
+        with self.assertRaises(RuntimeError):
+            operation.result()
+        client.execute_document.assert_not_called()
+        client.client.transport.execute_batch.assert_not_called()
+
+    def test_metadata_many(self):
+        client = batching_client()
+        client.client.transport.execute_batch.return_value = [ExecutionResult(
+            data={'b0_updateProjectMetadata': {'metadata': '{"version": "1.0"}'},
+                  'b1_updateProjectMetadata': None},
+            errors=[{'message': 'Unauthorized', 'path': ['b1_updateProjectMetadata']}])]
+        lagoonMetadata = Metadata(client)
+        results = lagoonMetadata.updateMany(1, {'version': '1.0', 'tags': 'a'})
+
+        # The updates are merged into a single request.
+        requests = client.client.transport.execute_batch.call_args.args[0]
+        assert len(requests) == 1
+        assert requests[0].variable_values['b1_key'] == 'tags'
+        assert results == {'version': 'version:1.0', 'tags': 'tags:null'}
+        assert lagoonMetadata.errors == [
+            {'message': 'Unauthorized', 'path': ['b1_updateProjectMetadata']}]
+        client.execute_document.assert_not_called()
+
+    def test_replace_fact(self):
+        client = batching_client(arrays=False)
+        client.execute_query.side_effect = [{'deleteFact': 'success'}, {'addFact': {'id': 3}}]
+        assert replace_fact(client, 1, 'drupal', 'Framework', '10.2') == {'id': 3}
+        # Sent one after the other, not merged.
+        assert client.execute_query.call_count == 2
+        (delete, _), (add, variables) = [c.args for c in client.execute_query.call_args_list]
+        assert 'deleteFact' in delete and 'addFact' in add
+        assert variables['value'] == '10.2'
+        client.execute_document.assert_not_called()
+
+    def test_replace_fact_delete_failed(self):
+        client = batching_client(arrays=False)
+        client.execute_query.return_value = {'deleteFact': None}
+        with self.assertRaisesRegex(AnsibleError, 'Unable to delete fact drupal'):
+            replace_fact(client, 1, 'drupal', 'Framework', '10.2')
+        # The fact is not added.
+        assert client.execute_query.call_count == 1
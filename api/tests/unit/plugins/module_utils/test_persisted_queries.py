@@ -0,0 +1,121 @@
+import json
+import unittest
+
+from ....common import dsl_exes_to_str, get_mock_gql_client
+from .....plugins.module_utils import http_session
+from .....plugins.module_utils.gqlProject import Project
+from .....plugins.module_utils.http_session import PooledRequestsHTTPTransport
+from gql import gql
+from gql.dsl import print_ast
+from hashlib import sha256
+from unittest.mock import MagicMock
+
+import sys
+sys.modules['ansible.utils.display'] = unittest.mock.Mock()
+
+QUERY = gql('query p($name: String!) { projectByName(name: $name) { id } }')
+
+
+def transport_with_answers(*answers):
+    transport = PooledRequestsHTTPTransport(
+        url='https://api.example.com', persistedQueries=True)
+    transport.session = MagicMock()
+    responses = []
+    for answer in answers:
+        response = MagicMock()
+        response.json.return_value = answer
+        response.headers = {}
+        responses.append(response)
+    transport.session.request.side_effect = responses
+    return transport
+
+
+class PersistedQueriesTester(unittest.TestCase):
+
+    def setUp(self):
+        http_session._persistedQueriesUnsupported.clear()
+
+    def payloads(self, transport) -> list:
+        return [json.loads(c.kwargs['data']) if c.kwargs.get('data') else c.kwargs['json']
+                for c in transport.session.request.call_args_list]
+
+    def test_hash_only(self):
+        transport = transport_with_answers({'data': {'projectByName': {'id': 1}}})
+        result = transport.execute(QUERY, {'name': 'p1'})
+        assert result.data == {'projectByName': {'id': 1}}
+
+        payload = self.payloads(transport)[0]
+        assert 'query' not in payload
+        assert payload['variables'] == {'name': 'p1'}
+        assert payload['extensions']['persistedQuery'] == {
+            'version': 1,
+            'sha256Hash': sha256(print_ast(QUERY).encode('utf-8')).hexdigest(),
+        }
+
+    def test_not_found(self):
+        transport = transport_with_answers(
+            {'errors': [{'message': 'PersistedQueryNotFound',
+                         'extensions': {'code': 'PERSISTED_QUERY_NOT_FOUND'}}]},
+            {'data': {'projectByName': {'id': 1}}},
+            {'data': {'projectByName': {'id': 2}}})
+        assert transport.execute(QUERY, {'name': 'p1'}).data == {'projectByName': {'id': 1}}
+        payloads = self.payloads(transport)
+        assert payloads[1]['query'] == print_ast(QUERY)
+        assert 'persistedQuery' in payloads[1]['extensions']
+
+        # Still sent by hash next time.
+        transport.execute(QUERY, {'name': 'p2'})
+        assert 'query' not in self.payloads(transport)[2]
+
+    def test_not_supported(self):
+        transport = transport_with_answers(
+            {'errors': [{'message': 'Must provide query string.'}]},
+            {'data': {'projectByName': {'id': 1}}},
+            {'data': {'projectByName': {'id': 2}}})
+        assert transport.execute(QUERY, {'name': 'p1'}).data == {'projectByName': {'id': 1}}
+        transport.execute(QUERY, {'name': 'p2'})
+
+        payloads = self.payloads(transport)
+        assert 'query' in payloads[1]
+        # The full query only, from then on.
+        assert payloads[2]['query'] == print_ast(QUERY)
+        assert 'extensions' not in payloads[2]
+
+    def test_query_errors(self):
+        transport = transport_with_answers(
+            {'data': None, 'errors': [{'message': 'Unauthorized'}]})
+        result = transport.execute(QUERY, {'name': 'p1'})
+        assert result.errors == [{'message': 'Unauthorized'}]
+        assert transport.session.request.call_count == 1
+
+    def test_disabled(self):
+        transport = transport_with_answers({'data': {'projectByName': {'id': 1}}})
+        transport.persistedQueries = False
+        transport.execute(QUERY, {'name': 'p1'})
+        payload = self.payloads(transport)[0]
+        assert payload['query'] == print_ast(QUERY)
+        assert 'extensions' not in payload
+
+
+class ParameterizedQueriesTester(unittest.TestCase):
+
+    def test_stable_text(self):
+        client = get_mock_gql_client(query_dynamic_return_value={
+            'r0': {'id': 1, 'name': 'project-1'},
+            'r1': None,
+        })
+        client.options['persistedQueries'] = True
+        lagoonProject = Project(client)
+
+        documents = []
+        for names in [['project-1', 'project-2'], ['project-3', 'project-4']]:
+            resources = lagoonProject.queryByAlias(
+                'projectByName', 'name', names, lambda ds: [ds.Project.id])
+            call = client.execute_query_dynamic.call_args
+            documents.append(dsl_exes_to_str(call.args[0]))
+            assert call.kwargs['variables'] == {'r0': names[0], 'r1': names[1]}
+            assert resources == {names[0]: {'id': 1, 'name': 'project-1'}, names[1]: None}
+
+        assert documents[0] == documents[1]
+        assert '$r0: String!' in documents[0]
+        assert 'project' not in documents[0].replace('projectByName', '')
@@ -0,0 +1,88 @@
+import os
+import tempfile
+import time
+import unittest
+
+from ....common import load_schema, script_dir
+from .....plugins.module_utils.gql import GqlClient, client_options
+from .....plugins.module_utils.schema_cache import SchemaCache, schema_from_file
+from ansible.errors import AnsibleError
+from graphql import introspection_from_schema
+
+import sys
+sys.modules['ansible.utils.display'] = unittest.mock.Mock()
+
+
+class SchemaCacheTester(unittest.TestCase):
+
+    def setUp(self):
+        self.cacheDir = tempfile.mkdtemp()
+        self.introspection = introspection_from_schema(load_schema())
+
+    def test_load_missing(self):
+        cache = SchemaCache('http://foo/graphql', self.cacheDir)
+        assert cache.load() is None
+
+    def test_save_load(self):
+        cache = SchemaCache('http://foo/graphql', self.cacheDir)
+        cache.save(self.introspection)
+        assert cache.load() == self.introspection
+
+        # Keyed by endpoint.
+        assert SchemaCache('http://bar/graphql', self.cacheDir).load() is None
+
+    def test_expired(self):
+        cache = SchemaCache('http://foo/graphql', self.cacheDir, ttl=60)
+        cache.save(self.introspection)
+        past = time.time() - 120
+        os.utime(cache.path(), (past, past))
+        assert cache.load() is None
+
+        # Negative TTL never expires.
+        cache.ttl = -1
+        assert cache.load() == self.introspection
+
+    def test_invalidate(self):
+        cache = SchemaCache('http://foo/graphql', self.cacheDir)
+        cache.save(self.introspection)
+        cache.invalidate()
+        assert cache.load() is None
+        # Invalidating a missing cache is a no-op.
+        cache.invalidate()
+
+    def test_client_uses_cache(self):
+        SchemaCache('http://foo/graphql', self.cacheDir).save(self.introspection)
+
+        client = GqlClient('http://foo/graphql', 'bar', options={
+            'schemaCacheTtl': 3600, 'schemaCacheDir': self.cacheDir})
+        assert client.client.schema is not None
+        assert client.client.fetch_schema_from_transport == False
+
+        client = GqlClient('http://foo/graphql', 'bar', options={
+            'schemaCacheTtl': 3600, 'schemaCacheDir': self.cacheDir,
+            'schemaCacheRefresh': True})
+        assert client.client.schema is None
+        assert client.client.fetch_schema_from_transport == True
+
+    def test_schema_from_file(self):
+        schemaFile = f"{script_dir}/schema.graphql"
+        schema = schema_from_file(schemaFile, self.cacheDir)
+        assert schema.query_type.fields.get('projectByName') is not None
+
+        # The parsed schema is cached on disk and in memory.
+        assert len(os.listdir(self.cacheDir)) == 1
+        assert schema_from_file(schemaFile, self.cacheDir) is schema
+
+        client = GqlClient('http://foo/graphql', 'bar', options={
+            'schemaFile': schemaFile, 'schemaCacheDir': self.cacheDir})
+        assert client.client.schema is schema
+        assert client.client.fetch_schema_from_transport == False
+
+    def test_schema_from_missing_file(self):
+        with self.assertRaises(AnsibleError):
+            schema_from_file(f"{self.cacheDir}/missing.graphql", self.cacheDir)
+
+    def test_client_options(self):
+        values = {'api_schema_cache_ttl': '300', 'api_schema_cache_refresh': 'yes'}
+        options = client_options(lambda name: values.get(name))
+        assert options == {'schemaCacheTtl': 300, 'schemaCacheRefresh': True}
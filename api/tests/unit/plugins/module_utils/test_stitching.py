@@ -0,0 +1,40 @@
+import unittest
+
+from ....common import get_mock_gql_client
+from .....plugins.module_utils.gql import GqlClient
+from .....plugins.module_utils.stitching import RelationStore
+from gql.dsl import DSLMutation
+
+import sys
+sys.modules['ansible.utils.display'] = unittest.mock.Mock()
+
+
+class RelationStoreTester(unittest.TestCase):
+
+    def test_parent(self):
+        store = RelationStore()
+        assert store.parent('Environment', 'p1-main', 'Project', ['name']) is None
+
+        store.addParent('Environment', 'p1-main', 'Project', {'id': 1, 'name': 'p1'})
+        assert store.parent('Environment', 'p1-main', 'Project', ['name']) == {'name': 'p1'}
+        assert store.parent('Environment', 'p1-main', 'Project', ['name', 'gitUrl']) is None
+
+        # Fields are merged.
+        store.addParent('Environment', 'p1-main', 'Project', {'name': 'p1', 'gitUrl': 'git@foo'})
+        assert store.parent('Environment', 'p1-main', 'Project', ['id', 'gitUrl']) == {
+            'id': 1, 'gitUrl': 'git@foo'}
+
+        store.clear()
+        assert store.parent('Environment', 'p1-main', 'Project', ['name']) is None
+
+    def test_cleared_on_mutation(self):
+        client = get_mock_gql_client()
+        client.relations.addParent('Environment', 'p1-main', 'Project', {'name': 'p1'})
+
+        client.client.session.execute = unittest.mock.MagicMock(
+            return_value={'deleteEnvironment': 'success'})
+        with client as (_, ds):
+            GqlClient.execute_query_dynamic(client, DSLMutation(
+                ds.Mutation.deleteEnvironment.args(input={'name': 'main', 'project': 'p1'})))
+
+        assert client.relations.parent('Environment', 'p1-main', 'Project', ['name']) is None
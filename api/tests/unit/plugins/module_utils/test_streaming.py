@@ -0,0 +1,118 @@
+import json
+import unittest
+
+from ....common import get_mock_gql_client
+from .....plugins.module_utils.gqlEnvironment import Environment
+from .....plugins.module_utils.gqlProject import Project
+from .....plugins.module_utils.streaming import JsonStream
+from gql import gql
+from gql.transport.exceptions import TransportProtocolError, TransportQueryError
+from unittest.mock import MagicMock
+
+import sys
+sys.modules['ansible.utils.display'] = unittest.mock.Mock()
+
+
+def chunked(document: str, size: int) -> list:
+    data = document.encode('utf-8')
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def streaming_client(document: str, chunkSize: int = 7):
+    client = get_mock_gql_client()
+    client.options['streaming'] = True
+
+    response = MagicMock()
+    response.status_code = 200
+    response.iter_content.return_value = chunked(document, chunkSize)
+    response.__enter__.return_value = response
+    session = MagicMock()
+    session.post.return_value = response
+    client.session = MagicMock(return_value=session)
+    return client
+
+
+class JsonStreamTester(unittest.TestCase):
+
+    def test_records(self):
+        document = json.dumps({
+            'data': {
+                'other': {'allEnvironments': [1]},
+                'allEnvironments': [
+                    {'id': 12345, 'name': 'mäin', 'routes': None},
+                    {'id': 2, 'name': 'dev', 'nested': [{'a': [1, 2]}]},
+                    1.5e10,
+                ],
+            },
+            'extensions': {'cost': 3},
+        }, indent=2)
+
+        # Whatever the chunks' boundaries, including within numbers and
+        # multi-byte characters.
+        for size in [1, 2, 3, 5, 64, 100000]:
+            stream = JsonStream(chunked(document, size), ['data', 'allEnvironments'])
+            records = list(stream.records())
+            assert records == json.loads(document)['data']['allEnvironments'], size
+            assert stream.document == {
+                'data': {'other': {'allEnvironments': [1]}, 'allEnvironments': []},
+                'extensions': {'cost': 3},
+            }
+
+    def test_records_as_received(self):
+        chunks = [b'{"data": {"all": [{"id": 1}, ', b'{"id": 2}]}}']
+        received = []
+        def receive():
+            for chunk in chunks:
+                received.append(chunk)
+                yield chunk
+
+        records = JsonStream(receive(), ['data', 'all']).records()
+        assert next(records) == {'id': 1}
+        assert len(received) == 1
+        assert next(records) == {'id': 2}
+
+    def test_not_streamed(self):
+        stream = JsonStream([b'{"errors": [{"message": "no"}], "data": {"all": null}}'],
+                            ['data', 'all'])
+        assert list(stream.records()) == []
+        assert stream.document == {'errors': [{'message': 'no'}], 'data': {'all': None}}
+
+    def test_invalid(self):
+        for document in ['{"data": {"all": [1, 2}}', '{"data": {"all": [1', '<html>', '{} {}']:
+            with self.assertRaises(ValueError, msg=document):
+                list(JsonStream(chunked(document, 3), ['data', 'all']).records())
+
+
+class StreamQueryTester(unittest.TestCase):
+
+    def test_environments_all(self):
+        client = streaming_client(json.dumps({'data': {'allEnvironments': [
+            {'id': 1, 'name': 'main'}, {'id': 2, 'name': 'dev'}]}}))
+        lagoonEnvironment = Environment(client).all(['id', 'name'])
+
+        assert lagoonEnvironment.environments == [
+            {'id': 1, 'name': 'main'}, {'id': 2, 'name': 'dev'}]
+        client.execute_query.assert_not_called()
+        payload = client.session().post.call_args.kwargs['json']
+        assert 'allEnvironments' in payload['query']
+
+    def test_projects_all_partial(self):
+        client = streaming_client(json.dumps({
+            'data': {'allProjects': [{'id': 1, 'name': 'project1'}]},
+            'errors': [{'message': 'Unable to fetch some projects'}],
+        }))
+        lagoonProject = Project(client, {'compactRecords': True}).all(['id', 'name'])
+
+        assert lagoonProject.projects.byName('project1')['id'] == 1
+        assert lagoonProject.errors == [{'message': 'Unable to fetch some projects'}]
+        client.execute_query_dynamic.assert_not_called()
+
+    def test_errors(self):
+        client = streaming_client(json.dumps({
+            'data': None, 'errors': [{'message': 'Unauthorized'}]}))
+        with self.assertRaisesRegex(TransportQueryError, 'Unauthorized'):
+            list(client.stream_query(gql('{ allProjects { id } }'), 'allProjects'))
+
+        client = streaming_client('<html>Bad gateway</html>')
+        with self.assertRaises(TransportProtocolError):
+            list(client.stream_query(gql('{ allProjects { id } }'), 'allProjects'))